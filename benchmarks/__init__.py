@@ -0,0 +1,7 @@
+# Benchmarks package
+import os
+
+# Бенчмарки не ходят в настоящий Telegram, поэтому подставляем фиктивные данные,
+# чтобы config.Config не падал без .env
+os.environ.setdefault("BOT_TOKEN", "123456:BENCHMARK-TOKEN")
+os.environ.setdefault("MAIN_ADMIN_ID", "1")
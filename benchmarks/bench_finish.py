@@ -0,0 +1,242 @@
+"""
+Бенчмарк завершения на больших розыгрышах: finish_giveaway_task (с finish_giveaway внутри)
+и очистка delete_finished_older_than на 100k, 1M и 5M участников.
+
+Каждый размер прогоняется в отдельном процессе с новой временной базой SQLite, чтобы пик RSS
+и кэши одного размера не влияли на другой. Участники вставляются напрямую через sqlite3; Bot - FakeBotSession.
+По каждой фазе записываются время, запросы к БД (число и время), время функций database.database
+и пик памяти: RSS процесса (ru_maxrss) и, с --tracemalloc, пик выделений Python.
+
+Запуск:
+    python -m benchmarks.bench_finish --sizes 100000 1000000 5000000 --output bench_finish.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from benchmarks.sandbox import (
+    BENCHMARK_ADMIN_ID, BENCHMARK_TOKEN, database_size, remove_temp_database, use_temp_database
+)
+
+CHANNEL_ID = -1001234567890
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+class Phase:
+    """Замер одной фазы: время, запросы к БД и память"""
+
+    def __init__(self, name: str, results: Dict[str, dict]):
+        self.name = name
+        self.results = results
+
+    async def __aenter__(self):
+        from database.query_log import QueryStats, current_query_stats
+        from utils.metrics import db_seconds
+
+        self._db_before = {labels[0]: (series.count, series.sum) for labels, series in db_seconds.series().items()}
+        self.stats = QueryStats()
+        self._token = current_query_stats.set(self.stats)
+        if tracemalloc.is_tracing():
+            tracemalloc.reset_peak()
+        self._started = time.perf_counter()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        from database.query_log import current_query_stats
+        from utils.metrics import db_seconds
+
+        elapsed = time.perf_counter() - self._started
+        current_query_stats.reset(self._token)
+        functions = {}
+        for labels, series in db_seconds.series().items():
+            count, total = self._db_before.get(labels[0], (0, 0.0))
+            if series.count > count:
+                functions[labels[0]] = {"calls": series.count - count, "seconds": round(series.sum - total, 3)}
+        result = {
+            "seconds": round(elapsed, 3),
+            "queries": self.stats.count,
+            "query_seconds": round(self.stats.seconds, 3),
+            "db_functions": functions,
+            "peak_rss_mb": _peak_rss_mb(),
+        }
+        if tracemalloc.is_tracing():
+            result["tracemalloc_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 1)
+        self.results[self.name] = result
+        return False
+
+
+def fill_participants(db_path: str, giveaway_id: int, size: int, bonus_ratio: float, seed: int):
+    """
+    Вставка синтетических участников напрямую через sqlite3 из генератора: память не растет
+    с размером, и пик RSS следующих фаз не перекрывается пиком заполнения
+    """
+    rnd = random.Random(seed)
+    joined_at = (datetime.utcnow() - timedelta(hours=1)).isoformat(sep=" ")
+    rows = (
+        (
+            giveaway_id, 10_000_000 + index, f"user{index}", f"User{index}", joined_at,
+            rnd.randint(2, 10) if bonus_ratio and rnd.random() < bonus_ratio else 1
+        )
+        for index in range(size)
+    )
+    with sqlite3.connect(db_path) as conn:
+        conn.executemany(
+            "INSERT INTO participants (giveaway_id, user_id, username, first_name, joined_at, tickets) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+
+
+async def run_size(args, db_path: str) -> dict:
+    # Модули бота импортируются после use_temp_database()
+    from aiogram import Bot
+    from sqlalchemy import func, select
+
+    from benchmarks.fake_bot_api import FakeBotSession, FakeTelegramServer
+    from database.database import (
+        async_session, create_giveaway, delete_finished_older_than, engine, get_giveaway, init_db
+    )
+    from database.models import GiveawayStatus, Winner
+    from utils.scheduler import finish_giveaway_task
+
+    results: Dict[str, dict] = {}
+    await init_db()
+    # Завершенный розыгрыш должен попасть под очистку сразу после завершения
+    giveaway = await create_giveaway(
+        "Бенчмарк завершения", "Большой розыгрыш", datetime.utcnow() - timedelta(days=args.cleanup_days + 1),
+        CHANNEL_ID, BENCHMARK_ADMIN_ID, winner_places=args.places, require_subscription=args.require_subscription
+    )
+
+    async with Phase("fill", results):
+        await asyncio.to_thread(fill_participants, db_path, giveaway.id, args.size, args.bonus_ratio, args.seed)
+    db_bytes = database_size(db_path)
+
+    server = FakeTelegramServer(latency_ms=args.latency_ms, non_member_ratio=args.non_member_ratio, seed=args.seed)
+    bot = Bot(token=BENCHMARK_TOKEN, session=FakeBotSession(server))
+    async with Phase("finish_giveaway_task", results):
+        await finish_giveaway_task(bot, giveaway.id)
+
+    finished = await get_giveaway(giveaway.id, with_participants=False)
+    async with async_session() as session:
+        winners = (await session.execute(
+            select(func.count()).select_from(Winner).where(Winner.giveaway_id == giveaway.id)
+        )).scalar_one()
+    if finished.status != GiveawayStatus.FINISHED.value:
+        raise RuntimeError(f"Розыгрыш не завершен (статус {finished.status}), смотрите лог")
+
+    async with Phase("delete_finished_older_than", results):
+        deleted = await delete_finished_older_than(args.cleanup_days)
+
+    await bot.session.close()
+    await engine.dispose()
+    return {
+        "participants": args.size,
+        "winner_places": args.places,
+        "winners": winners,
+        "bonus_ratio": args.bonus_ratio,
+        "require_subscription": args.require_subscription,
+        "db_bytes": db_bytes,
+        "deleted_giveaways": deleted,
+        "api_calls": dict(server.calls),
+        "phases": results,
+    }
+
+
+def child_main(args):
+    """Один размер в текущем процессе; результат - строка JSON в stdout"""
+    if args.tracemalloc:
+        tracemalloc.start()
+    db_path = use_temp_database("bench_finish_")
+    try:
+        result = asyncio.run(run_size(args, db_path))
+    finally:
+        remove_temp_database(db_path)
+    print(json.dumps(result, ensure_ascii=False))
+
+
+def _child_command(args, size: int) -> List[str]:
+    command = [
+        sys.executable, "-m", "benchmarks.bench_finish", "--child", "--size", str(size),
+        "--places", str(args.places), "--bonus-ratio", str(args.bonus_ratio),
+        "--cleanup-days", str(args.cleanup_days), "--latency-ms", str(args.latency_ms),
+        "--non-member-ratio", str(args.non_member_ratio), "--seed", str(args.seed),
+    ]
+    if args.require_subscription:
+        command.append("--require-subscription")
+    if args.tracemalloc:
+        command.append("--tracemalloc")
+    return command
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--places", type=int, default=10, help="Призовых мест")
+    parser.add_argument("--bonus-ratio", type=float, default=0.0, help="Доля участников с бонусными билетами")
+    parser.add_argument("--require-subscription", action="store_true", help="Проверять подписку победителей")
+    parser.add_argument("--non-member-ratio", type=float, default=0.0, help="Доля неподписанных в фейковом API")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Задержка фейкового Bot API, мс")
+    parser.add_argument("--cleanup-days", type=int, default=30)
+    parser.add_argument("--tracemalloc", action="store_true",
+                        help="Пик выделений Python по фазам (замедляет прогон в разы)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Файл для результатов JSON (по умолчанию stdout)")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child_main(args)
+        return
+
+    runs = []
+    for size in args.sizes:
+        print(f"Участников: {size}...", file=sys.stderr)
+        completed = subprocess.run(
+            _child_command(args, size), stdout=subprocess.PIPE, text=True, env=os.environ.copy()
+        )
+        if completed.returncode != 0:
+            raise SystemExit(f"Прогон на {size} участников завершился с кодом {completed.returncode}")
+        run = json.loads(completed.stdout.strip().splitlines()[-1])
+        runs.append(run)
+        for name, phase in run["phases"].items():
+            print(
+                f"  {name:<28} {phase['seconds']:>9.3f} с, запросов {phase['queries']:>4}, "
+                f"RSS {phase['peak_rss_mb']} МБ", file=sys.stderr
+            )
+
+    report = json.dumps({
+        "created_at": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "runs": runs,
+    }, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(report + "\n")
+    else:
+        print(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+Бенчмарк HTTP-сессии Bot API: запросы в секунду против локального фейкового Bot API.
+
+Запуск:
+    python -m benchmarks.bench_http_session --requests 5000 --concurrency 50
+"""
+import argparse
+import asyncio
+import time
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+from benchmarks.fake_bot_api import FakeTelegramServer
+from utils.http_session import create_bot_session
+from utils.json_codec import JSON_CODEC_NAME
+
+CHAT_ID = -1001234567890
+
+
+async def run_load(session, base_url: str, total: int, concurrency: int) -> float:
+    """Отправляет total запросов sendMessage и возвращает RPS"""
+    session.api = TelegramAPIServer.from_base(base_url)
+    bot = Bot(token="123456:BENCHMARK-TOKEN", session=session)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            await bot.send_message(
+                chat_id=CHAT_ID,
+                text=f"Сообщение #{i}",
+                reply_markup={"inline_keyboard": [[{"text": "🎯 Участвовать", "callback_data": f"participate_{i}"}]]},
+            )
+
+    # Прогрев соединений
+    await asyncio.gather(*(one(i) for i in range(concurrency)))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    elapsed = time.perf_counter() - started
+    await bot.session.close()
+    return total / elapsed
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=3000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Задержка фейкового Bot API, мс")
+    args = parser.parse_args()
+
+    server = FakeTelegramServer(latency_ms=args.latency_ms)
+    base_url = await server.start()
+    try:
+        default_rps = await run_load(AiohttpSession(), base_url, args.requests, args.concurrency)
+        tuned_rps = await run_load(create_bot_session(), base_url, args.requests, args.concurrency)
+    finally:
+        await server.stop()
+
+    print(f"Запросов: {args.requests}, параллельно: {args.concurrency}")
+    print(f"AiohttpSession по умолчанию (json):  {default_rps:8.0f} RPS")
+    print(f"TunedAiohttpSession ({JSON_CODEC_NAME}): {tuned_rps:8.0f} RPS")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
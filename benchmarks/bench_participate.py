@@ -0,0 +1,142 @@
+"""
+Бенчмарк горячего пути: шторм нажатий «Участвовать» через настоящий Dispatcher.
+
+Dispatcher собирается так же, как в main.py (хранилище FSM, AdminMiddleware, setup_handlers),
+база - временный файл SQLite, Bot - FakeBotSession без сети. Апдейты participate_<id>
+подаются в Dispatcher.feed_update с заданной параллельностью.
+Отчет: участий в секунду, p50/p99 времени обработки апдейта и прирост размера базы.
+
+Запуск:
+    python -m benchmarks.bench_participate --users 20000 --repeat 0.1 --concurrency 50
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from benchmarks.sandbox import (
+    BENCHMARK_ADMIN_ID, BENCHMARK_TOKEN, create_dispatcher, database_size, remove_temp_database, use_temp_database
+)
+
+CHANNEL_ID = -1001234567890
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def run(args, db_path: str) -> dict:
+    # Модули бота импортируются после use_temp_database()
+    from aiogram import Bot
+    from aiogram.types import Update
+
+    from benchmarks.fake_bot_api import FakeBotSession, FakeTelegramServer
+    from database.database import create_giveaway, engine, get_participants_count, init_db
+
+    await init_db()
+    giveaway_ids = []
+    for index in range(args.giveaways):
+        giveaway = await create_giveaway(
+            f"Бенчмарк {index + 1}", "Шторм участий", datetime.utcnow() + timedelta(days=1),
+            CHANNEL_ID, BENCHMARK_ADMIN_ID, require_subscription=args.require_subscription
+        )
+        giveaway_ids.append(giveaway.id)
+
+    server = FakeTelegramServer(latency_ms=args.latency_ms, seed=args.seed)
+    bot = Bot(token=BENCHMARK_TOKEN, session=FakeBotSession(server))
+    dp = create_dispatcher()
+
+    # Апдейты разбираются заранее: измеряется обработка, а не валидация JSON.
+    # Доля --repeat - повторные нажатия уже участвующих пользователей.
+    rnd = random.Random(args.seed)
+    user_ids = [10_000_000 + index for index in range(args.users)]
+    presses = [(rnd.choice(giveaway_ids), user_id) for user_id in user_ids]
+    presses += [rnd.choice(presses) for _ in range(int(len(presses) * args.repeat))]
+    rnd.shuffle(presses)
+    updates = [
+        Update.model_validate(server.make_participate_update(giveaway_id, user_id), context={"bot": bot})
+        for giveaway_id, user_id in presses
+    ]
+
+    size_before = database_size(db_path)
+    latencies: List[float] = []
+    pending = iter(updates)
+
+    async def worker():
+        for update in pending:
+            started = time.perf_counter()
+            await dp.feed_update(bot, update)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    joins = 0
+    for giveaway_id in giveaway_ids:
+        joins += await get_participants_count(giveaway_id)
+    await dp.storage.close()
+    await bot.session.close()
+    await engine.dispose()
+    size_after = database_size(db_path)
+
+    latencies.sort()
+    return {
+        "updates": len(updates),
+        "joins": joins,
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 3),
+        "updates_per_sec": round(len(updates) / elapsed, 1),
+        "joins_per_sec": round(joins / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2) if latencies else 0.0,
+        "db_bytes_before": size_before,
+        "db_bytes_after": size_after,
+        "db_bytes_per_join": round((size_after - size_before) / joins, 1) if joins else 0.0,
+        "api_calls": dict(server.calls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10_000, help="Число разных пользователей")
+    parser.add_argument("--repeat", type=float, default=0.1, help="Доля повторных нажатий от --users")
+    parser.add_argument("--giveaways", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=50, help="Апдейтов в обработке одновременно")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Задержка фейкового Bot API, мс")
+    parser.add_argument("--require-subscription", action="store_true", help="Розыгрыши только для подписчиков")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="Вывести результат одной строкой JSON")
+    parser.add_argument("--keep-db", action="store_true", help="Не удалять временную базу")
+    args = parser.parse_args()
+
+    db_path = use_temp_database("bench_participate_")
+    try:
+        result = asyncio.run(run(args, db_path))
+    finally:
+        if not args.keep_db:
+            remove_temp_database(db_path)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+        return
+    print(f"Апдейтов: {result['updates']}, участий: {result['joins']}, параллельно: {result['concurrency']}")
+    print(f"Время: {result['seconds']} с, {result['updates_per_sec']} апдейтов/с, {result['joins_per_sec']} участий/с")
+    print(f"Обработка апдейта: p50 {result['p50_ms']} мс, p99 {result['p99_ms']} мс, max {result['max_ms']} мс")
+    print(
+        f"База: {result['db_bytes_before']} -> {result['db_bytes_after']} байт "
+        f"({result['db_bytes_per_join']} байт на участие)"
+    )
+    print(f"Вызовы Bot API: {result['api_calls']}")
+    if args.keep_db:
+        print(f"База сохранена: {db_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Бенчмарк взвешенного розыгрыша: NumPy против чистого Python на 10k, 1M и 10M билетов.
+
+Запуск:
+    python -m benchmarks.bench_weighted_draw --sizes 10000 1000000 10000000 --places 10
+"""
+import argparse
+import random
+import time
+from array import array
+
+import utils.draw as draw
+
+
+def make_weights(size: int) -> array:
+    """Синтетические веса: у большинства 1 билет, у части - бонусные"""
+    rnd = random.Random(size)
+    weights = array("q", [1]) * size
+    for index in rnd.sample(range(size), size // 10):
+        weights[index] = rnd.randint(2, 10)
+    return weights
+
+
+def measure(weights: array, places: int, use_numpy: bool) -> float:
+    numpy_module = draw.np
+    if not use_numpy:
+        draw.np = None
+    try:
+        started = time.perf_counter()
+        draw.weighted_sample(weights, places, draw.new_seed())
+        return time.perf_counter() - started
+    finally:
+        draw.np = numpy_module
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 1_000_000, 10_000_000])
+    parser.add_argument("--places", type=int, default=10)
+    parser.add_argument("--python-max", type=int, default=1_000_000,
+                        help="Не гонять чистый Python на размерах больше этого")
+    args = parser.parse_args()
+
+    print(f"NumPy: {'есть' if draw.np is not None else 'нет'}, мест: {args.places}")
+    print(f"{'билетов':>12} | {'NumPy, с':>10} | {'Python, с':>10}")
+    for size in args.sizes:
+        weights = make_weights(size)
+        numpy_time = f"{measure(weights, args.places, True):10.3f}" if draw.np is not None else f"{'-':>10}"
+        python_time = f"{measure(weights, args.places, False):10.3f}" if size <= args.python_max else f"{'-':>10}"
+        print(f"{size:>12} | {numpy_time} | {python_time}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+"""
+Локальный фейковый Telegram Bot API для нагрузочных end-to-end тестов без сети.
+
+Реализует методы, которые вызывает бот: getMe, getUpdates, sendMessage,
+sendPhoto/Video/Animation/Document, editMessageReplyMarkup, deleteMessage,
+answerCallbackQuery, getChat, getChatMember, setMyCommands.
+Умеет добавлять задержку, отвечать 429 Too Many Requests и генерировать
+синтетические нажатия «Участвовать» для getUpdates.
+
+Запуск:
+    python -m benchmarks.fake_bot_api --port 8081 --latency-ms 30 --rate-429 0.01 \\
+        --updates-per-sec 200 --giveaway 1:-1001234567890:1
+
+Затем бот запускается против заглушки:
+    TELEGRAM_API_URL=http://127.0.0.1:8081 python main.py
+"""
+import argparse
+import asyncio
+import itertools
+import logging
+import random
+import re
+import time
+from collections import Counter, deque
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from aiohttp import web
+from aiogram.client.session.base import BaseSession
+
+from utils.json_codec import json_dumps, json_loads
+
+PARTICIPATE_RE = re.compile(r"participate_(\d+)")
+DEFAULT_CHANNEL_ID = -1001234567890
+
+
+class FakeTelegramServer:
+    """In-memory реализация Bot API на aiohttp"""
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        rate_429: float = 0.0,
+        retry_after: int = 1,
+        updates_per_sec: float = 0.0,
+        users_pool: int = 100_000,
+        non_member_ratio: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.rate_429 = rate_429
+        self.retry_after = retry_after
+        self.updates_per_sec = updates_per_sec
+        self.users_pool = users_pool
+        self.non_member_ratio = non_member_ratio
+        self.random = random.Random(seed)
+
+        self.calls: Counter = Counter()
+        self.throttled: Counter = Counter()
+        self.sent_messages: Dict[int, Dict[int, dict]] = {}
+        self.participate_posts: Dict[int, Tuple[int, int]] = {}  # giveaway_id -> (chat_id, message_id)
+
+        self._message_ids = itertools.count(1)
+        self._update_ids = itertools.count(1)
+        self._callback_ids = itertools.count(1)
+        self._updates: deque = deque()
+        self._updates_event = asyncio.Event()
+        self._generator_task: Optional[asyncio.Task] = None
+        self._runner: Optional[web.AppRunner] = None
+        self.base_url: Optional[str] = None
+
+        self._methods = {
+            "getme": self.get_me,
+            "getupdates": self.get_updates,
+            "sendmessage": self.send_message,
+            "sendphoto": self.send_photo,
+            "sendvideo": self.send_video,
+            "sendanimation": self.send_animation,
+            "senddocument": self.send_document,
+            "editmessagereplymarkup": self.edit_message_reply_markup,
+            "deletemessage": self.ok_true,
+            "answercallbackquery": self.ok_true,
+            "setmycommands": self.ok_true,
+            "deletewebhook": self.ok_true,
+            "getchat": self.get_chat,
+            "getchatmember": self.get_chat_member,
+        }
+
+    # Жизненный цикл
+    def build_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_route("*", "/bot{token}/{method}", self._dispatch)
+        app.router.add_get("/stats", self._stats)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Запускает сервер и возвращает базовый URL для TELEGRAM_API_URL"""
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        real_port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://{host}:{real_port}"
+        if self.updates_per_sec > 0:
+            self._generator_task = asyncio.create_task(self._generate_updates())
+        return self.base_url
+
+    async def stop(self):
+        if self._generator_task:
+            self._generator_task.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+
+    def add_giveaway(self, giveaway_id: int, chat_id: int = DEFAULT_CHANNEL_ID, message_id: int = 1):
+        """Регистрирует пост розыгрыша как цель синтетической нагрузки"""
+        self.participate_posts[giveaway_id] = (chat_id, message_id)
+
+    def push_update(self, update: dict):
+        """Кладет готовый update в очередь getUpdates"""
+        update.setdefault("update_id", next(self._update_ids))
+        self._updates.append(update)
+        self._updates_event.set()
+
+    # Разбор запроса
+    async def _dispatch(self, request: web.Request) -> web.Response:
+        params = await self._read_params(request)
+        status, payload = await self.call(request.match_info["token"], request.match_info["method"], params)
+        return web.json_response(payload, status=status)
+
+    async def call(self, token: str, method: str, params: Dict[str, Any]) -> Tuple[int, dict]:
+        """Выполняет метод Bot API и возвращает (HTTP-статус, тело ответа)"""
+        method = method.lower()
+        self.calls[method] += 1
+
+        handler = self._methods.get(method)
+        if handler is None:
+            return self._error(404, "Not Found: method not found")
+
+        if method != "getupdates":
+            if self.rate_429 and self.random.random() < self.rate_429:
+                self.throttled[method] += 1
+                return self._error(
+                    429,
+                    f"Too Many Requests: retry after {self.retry_after}",
+                    parameters={"retry_after": self.retry_after},
+                )
+            await self._sleep_latency()
+
+        try:
+            result = await handler(token, params)
+        except KeyError as e:
+            return self._error(400, f"Bad Request: parameter {e} is required")
+        return 200, {"ok": True, "result": result}
+
+    async def _read_params(self, request: web.Request) -> Dict[str, Any]:
+        if request.content_type == "application/json":
+            return await request.json(loads=json_loads)
+        params: Dict[str, Any] = {}
+        for key, value in (await request.post()).items():
+            params[key] = value if isinstance(value, str) else value.file.read()
+        for key, value in request.query.items():
+            params.setdefault(key, value)
+        return params
+
+    async def _sleep_latency(self):
+        if not self.latency_ms and not self.jitter_ms:
+            return
+        delay = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        await asyncio.sleep(max(0.0, delay) / 1000)
+
+    @staticmethod
+    def _error(code: int, description: str, parameters: Optional[dict] = None) -> Tuple[int, dict]:
+        payload = {"ok": False, "error_code": code, "description": description}
+        if parameters:
+            payload["parameters"] = parameters
+        return code, payload
+
+    async def _stats(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "calls": dict(self.calls),
+            "throttled": dict(self.throttled),
+            "pending_updates": len(self._updates),
+            "giveaways": sorted(self.participate_posts),
+        })
+
+    # Объекты Telegram
+    @staticmethod
+    def _bot_user(token: str) -> dict:
+        bot_id = int(token.split(":", 1)[0]) if token.split(":", 1)[0].isdigit() else 1
+        return {"id": bot_id, "is_bot": True, "first_name": "Fake Giveaway Bot", "username": "fake_giveaway_bot"}
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user{user_id}"}
+
+    @staticmethod
+    def _chat(chat_id) -> dict:
+        if isinstance(chat_id, str) and not chat_id.lstrip("-").isdigit():
+            username = chat_id.lstrip("@")
+            return {
+                "id": -1000000000000 - (abs(hash(username)) % 10**9),
+                "type": "channel",
+                "title": username,
+                "username": username,
+            }
+        chat_id = int(chat_id)
+        return {"id": chat_id, "type": "channel" if chat_id < 0 else "private", "title": f"Chat {chat_id}"}
+
+    def _store_message(self, params: Dict[str, Any], **content) -> dict:
+        chat = self._chat(params["chat_id"])
+        message = {
+            "message_id": next(self._message_ids),
+            "date": int(time.time()),
+            "chat": chat,
+            **content,
+        }
+        reply_markup = params.get("reply_markup")
+        if reply_markup:
+            markup = json_loads(reply_markup) if isinstance(reply_markup, str) else reply_markup
+            message["reply_markup"] = markup
+            self._register_participate_post(chat["id"], message["message_id"], markup)
+        self.sent_messages.setdefault(chat["id"], {})[message["message_id"]] = message
+        return message
+
+    def _register_participate_post(self, chat_id: int, message_id: int, markup: dict):
+        for row in markup.get("inline_keyboard", []):
+            for button in row:
+                match = PARTICIPATE_RE.fullmatch(button.get("callback_data") or "")
+                if match:
+                    self.participate_posts[int(match.group(1))] = (chat_id, message_id)
+
+    @staticmethod
+    def _file(file_id: str, **extra) -> dict:
+        return {"file_id": file_id, "file_unique_id": file_id[-16:] or "unique", **extra}
+
+    # Методы Bot API
+    async def ok_true(self, token: str, params: Dict[str, Any]):
+        return True
+
+    async def get_me(self, token: str, params: Dict[str, Any]):
+        return self._bot_user(token)
+
+    async def send_message(self, token: str, params: Dict[str, Any]):
+        return self._store_message(params, text=params["text"])
+
+    async def send_photo(self, token: str, params: Dict[str, Any]):
+        photo = self._file(str(params["photo"]), width=1280, height=720)
+        return self._store_message(params, photo=[photo], caption=params.get("caption"))
+
+    async def send_video(self, token: str, params: Dict[str, Any]):
+        video = self._file(str(params["video"]), width=1280, height=720, duration=10)
+        return self._store_message(params, video=video, caption=params.get("caption"))
+
+    async def send_animation(self, token: str, params: Dict[str, Any]):
+        animation = self._file(str(params["animation"]), width=480, height=270, duration=3)
+        return self._store_message(params, animation=animation, caption=params.get("caption"))
+
+    async def send_document(self, token: str, params: Dict[str, Any]):
+        document = self._file(str(params["document"]))
+        return self._store_message(params, document=document, caption=params.get("caption"))
+
+    async def edit_message_reply_markup(self, token: str, params: Dict[str, Any]):
+        if "chat_id" in params and "message_id" in params:
+            chat_id = self._chat(params["chat_id"])["id"]
+            message = self.sent_messages.get(chat_id, {}).get(int(params["message_id"]))
+            if message is not None and params.get("reply_markup"):
+                message["reply_markup"] = json_loads(params["reply_markup"])
+        return True
+
+    async def get_chat(self, token: str, params: Dict[str, Any]):
+        return self._chat(params["chat_id"])
+
+    async def get_chat_member(self, token: str, params: Dict[str, Any]):
+        user_id = int(params["user_id"])
+        bot = self._bot_user(token)
+        if user_id == bot["id"]:
+            return {
+                "status": "administrator",
+                "user": bot,
+                "can_be_edited": False,
+                "is_anonymous": False,
+                "can_manage_chat": True,
+                "can_delete_messages": True,
+                "can_manage_video_chats": False,
+                "can_restrict_members": False,
+                "can_promote_members": False,
+                "can_change_info": False,
+                "can_invite_users": True,
+                "can_post_messages": True,
+                "can_edit_messages": True,
+            }
+        if self.non_member_ratio and self.random.random() < self.non_member_ratio:
+            return {"status": "left", "user": self._user(user_id)}
+        return {"status": "member", "user": self._user(user_id)}
+
+    async def get_updates(self, token: str, params: Dict[str, Any]):
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        timeout = float(params.get("timeout") or 0)
+
+        while self._updates and self._updates[0]["update_id"] < offset:
+            self._updates.popleft()
+
+        if not self._updates and timeout > 0:
+            self._updates_event.clear()
+            try:
+                await asyncio.wait_for(self._updates_event.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        return list(itertools.islice(self._updates, 0, limit))
+
+    # Синтетическая нагрузка
+    def make_participate_update(self, giveaway_id: int, user_id: int) -> dict:
+        chat_id, message_id = self.participate_posts.get(giveaway_id, (DEFAULT_CHANNEL_ID, 1))
+        return {
+            "update_id": next(self._update_ids),
+            "callback_query": {
+                "id": str(next(self._callback_ids)),
+                "from": self._user(user_id),
+                "chat_instance": str(chat_id),
+                "data": f"participate_{giveaway_id}",
+                "message": {
+                    "message_id": message_id,
+                    "date": int(time.time()),
+                    "chat": self._chat(chat_id),
+                    "text": "Розыгрыш",
+                },
+            },
+        }
+
+    async def _generate_updates(self):
+        """Генерирует нажатия «Участвовать» с заданной частотой"""
+        interval = 1.0 / self.updates_per_sec
+        next_at = time.monotonic()
+        while True:
+            if self.participate_posts:
+                giveaway_id = self.random.choice(list(self.participate_posts))
+                user_id = 10_000_000 + self.random.randrange(self.users_pool)
+                self.push_update(self.make_participate_update(giveaway_id, user_id))
+            next_at += interval
+            await asyncio.sleep(max(0.0, next_at - time.monotonic()))
+
+
+class FakeBotSession(BaseSession):
+    """
+    Сессия Bot, которая вызывает методы FakeTelegramServer в том же процессе, без HTTP.
+    Для бенчмарков хендлеров и БД: сетевой стек не добавляет шума, а ответы те же, что у заглушки.
+    Сервер при этом запускать не нужно.
+    """
+
+    def __init__(self, server: Optional[FakeTelegramServer] = None, **kwargs):
+        super().__init__(**kwargs)
+        self.server = server or FakeTelegramServer()
+
+    async def make_request(self, bot, method, timeout: Optional[int] = None):
+        params: Dict[str, Any] = {}
+        files: Dict[str, Any] = {}
+        for key, value in method.model_dump(warnings=False).items():
+            value = self.prepare_value(value, bot=bot, files=files)
+            if value:
+                params[key] = value
+        for key, value in files.items():
+            params[key] = value.filename or key
+        status, payload = await self.server.call(bot.token, method.__api_method__, params)
+        response = self.check_response(bot=bot, method=method, status_code=status, content=json_dumps(payload))
+        return response.result
+
+    async def stream_content(self, url: str, headers: Optional[Dict[str, Any]] = None, timeout: int = 30,
+                             chunk_size: int = 65536, raise_for_status: bool = True) -> AsyncGenerator[bytes, None]:
+        yield b""
+
+    async def close(self):
+        pass
+
+
+def _parse_giveaway(value: str) -> List[int]:
+    parts = [int(part) for part in value.split(":")]
+    if len(parts) == 1:
+        parts += [DEFAULT_CHANNEL_ID, 1]
+    if len(parts) != 3:
+        raise argparse.ArgumentTypeError("Формат: ID[:CHAT_ID:MESSAGE_ID]")
+    return parts
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Задержка ответа, мс")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Разброс задержки, мс")
+    parser.add_argument("--rate-429", type=float, default=0.0, help="Доля ответов 429 (0..1)")
+    parser.add_argument("--retry-after", type=int, default=1, help="retry_after в ответах 429, сек")
+    parser.add_argument("--updates-per-sec", type=float, default=0.0, help="Частота синтетических нажатий")
+    parser.add_argument("--users", type=int, default=100_000, help="Размер пула синтетических пользователей")
+    parser.add_argument("--non-member-ratio", type=float, default=0.0, help="Доля пользователей, не подписанных на канал")
+    parser.add_argument("--giveaway", type=_parse_giveaway, action="append", default=[],
+                        help="Розыгрыш для нагрузки: ID[:CHAT_ID:MESSAGE_ID]")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = FakeTelegramServer(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+        updates_per_sec=args.updates_per_sec,
+        users_pool=args.users,
+        non_member_ratio=args.non_member_ratio,
+    )
+    for giveaway_id, chat_id, message_id in args.giveaway:
+        server.add_giveaway(giveaway_id, chat_id, message_id)
+
+    base_url = await server.start(args.host, args.port)
+    logging.info(f"Фейковый Bot API запущен: {base_url} (статистика: {base_url}/stats)")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        logging.info(f"Вызовы методов: {dict(server.calls)}; ответов 429: {dict(server.throttled)}")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
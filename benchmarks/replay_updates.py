@@ -0,0 +1,250 @@
+"""
+Воспроизведение записанных апдейтов (UPDATE_RECORD_FILE) через настоящий Dispatcher.
+
+По умолчанию база - временный файл SQLite, Bot - FakeBotSession без сети. Для каждого розыгрыша,
+в котором в записи нажимали «Участвовать», создается локальный активный розыгрыш, и callback_data
+переписывается на его id. Авторы админских действий и псевдонимы из callback_data
+(remove_admin_, select_channel_, remove_channel_) добавляются в базу как админы и каналы. С --database-url можно играть против копии рабочей базы (--no-remap).
+
+Режимы: в реальном времени (--speed 1, паузы длиннее --max-gap сжимаются) или
+как можно быстрее (--fast) с заданной параллельностью.
+Отчет: апдейтов в секунду, p50/p99 обработки в целом и по действиям, отставание от расписания.
+
+Запуск:
+    python -m benchmarks.replay_updates updates.jsonl.gz --speed 2
+    python -m benchmarks.replay_updates updates.jsonl.gz --fast --concurrency 50 --json
+"""
+import argparse
+import asyncio
+import json
+import re
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from benchmarks.sandbox import (
+    BENCHMARK_ADMIN_ID, BENCHMARK_TOKEN, create_dispatcher, remove_temp_database, use_database,
+    use_temp_database
+)
+
+PARTICIPATE_RE = re.compile(r"participate_(\d+)")
+CHANNEL_ID = -1001234567890
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def update_action(data: dict) -> str:
+    """Тип апдейта и действие для группировки в отчете"""
+    from utils.metrics import callback_action
+
+    callback = data.get("callback_query")
+    if callback:
+        return f"callback_query {callback_action(callback.get('data'))}"
+    message = data.get("message")
+    if message:
+        text = message.get("text") or ""
+        return f"message {text.split()[0]}" if text.startswith("/") else "message"
+    return next((key for key in data if key != "update_id"), "unknown")
+
+
+async def remap_giveaways(path: str) -> Dict[str, str]:
+    """Создает локальный розыгрыш для каждого розыгрыша из записи: {старый id: новый id}"""
+    from database.database import create_giveaway
+    from middlewares.update_recorder import read_recording
+
+    recorded_ids = set()
+    for _, data in read_recording(path):
+        match = PARTICIPATE_RE.fullmatch((data.get("callback_query") or {}).get("data") or "")
+        if match:
+            recorded_ids.add(match.group(1))
+
+    mapping = {}
+    for recorded_id in sorted(recorded_ids, key=int):
+        giveaway = await create_giveaway(
+            f"Воспроизведение #{recorded_id}", "Розыгрыш из записи", datetime.utcnow() + timedelta(days=1),
+            CHANNEL_ID, BENCHMARK_ADMIN_ID
+        )
+        mapping[recorded_id] = str(giveaway.id)
+    return mapping
+
+
+async def seed_recorded_ids(path: str) -> dict:
+    """
+    Псевдонимы из записи, без которых хендлеры не пройдут дальше проверок: авторы админских
+    действий становятся админами, а id из remove_admin_/select_channel_/remove_channel_ - админами
+    и каналами локальной базы. Псевдонимы те же, что в апдейтах, поэтому callback_data не переписывается.
+    """
+    from database.database import add_admin, add_channel
+    from middlewares.auth import ADMIN_COMMANDS
+    from middlewares.update_recorder import CHAT_ID_CALLBACKS, USER_ID_CALLBACKS, read_recording
+
+    admins, channels = set(), set()
+    for _, data in read_recording(path):
+        callback = data.get("callback_query") or {}
+        message = data.get("message") or {}
+        callback_data = callback.get("data") or ""
+        text = message.get("text") or ""
+        if callback and not PARTICIPATE_RE.fullmatch(callback_data):
+            admins.add(callback["from"]["id"])
+        elif text and text.split()[0].split("@")[0] in ADMIN_COMMANDS:
+            admins.add(message["from"]["id"])
+        for prefixes, ids in ((USER_ID_CALLBACKS, admins), (CHAT_ID_CALLBACKS, channels)):
+            for prefix in prefixes:
+                if callback_data.startswith(prefix):
+                    ids.add(int(callback_data[len(prefix):]))
+
+    for user_id in admins:
+        await add_admin(user_id, first_name="User")
+    for channel_id in channels:
+        await add_channel(channel_id, f"Канал {channel_id}", added_by=BENCHMARK_ADMIN_ID)
+    return {"admins": len(admins), "channels": len(channels)}
+
+
+def _apply_mapping(data: dict, mapping: Dict[str, str]):
+    callback = data.get("callback_query")
+    if not callback or not mapping:
+        return
+    match = PARTICIPATE_RE.fullmatch(callback.get("data") or "")
+    if match and match.group(1) in mapping:
+        callback["data"] = f"participate_{mapping[match.group(1)]}"
+
+
+async def replay(args) -> dict:
+    # Модули бота импортируются после выбора базы
+    from aiogram import Bot
+    from aiogram.types import Update
+
+    from benchmarks.fake_bot_api import FakeBotSession, FakeTelegramServer
+    from database.database import engine, init_db
+    from middlewares.update_recorder import read_recording
+
+    await init_db()
+    mapping = {} if args.no_remap else await remap_giveaways(args.recording)
+    seeded = {} if args.no_remap else await seed_recorded_ids(args.recording)
+
+    server = FakeTelegramServer(latency_ms=args.latency_ms)
+    bot = Bot(token=BENCHMARK_TOKEN, session=FakeBotSession(server))
+    dp = create_dispatcher()
+
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    lags: List[float] = []
+    errors = 0
+
+    async def feed(data: dict):
+        nonlocal errors
+        _apply_mapping(data, mapping)
+        action = update_action(data)
+        started = time.perf_counter()
+        try:
+            await dp.feed_update(bot, Update.model_validate(data, context={"bot": bot}))
+        except Exception:
+            errors += 1
+        latencies[action].append(time.perf_counter() - started)
+
+    entries = read_recording(args.recording)
+    recorded_span = 0.0
+    started = time.perf_counter()
+    if args.fast:
+        async def worker():
+            for _, data in entries:
+                await feed(data)
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    else:
+        # Расписание по времени получения; длинные паузы сжимаются до max_gap
+        tasks = set()
+        previous_ts: Optional[float] = None
+        offset = 0.0
+        for ts, data in entries:
+            if previous_ts is not None:
+                gap = max(0.0, ts - previous_ts)
+                offset += min(gap, args.max_gap) if args.max_gap > 0 else gap
+                recorded_span += gap
+            previous_ts = ts
+            due = started + offset / args.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lags.append(max(0.0, -delay))
+            task = asyncio.create_task(feed(data))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+        if tasks:
+            await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    await dp.storage.close()
+    await bot.session.close()
+    await engine.dispose()
+
+    all_latencies = sorted(value for values in latencies.values() for value in values)
+    actions = {}
+    for action, values in sorted(latencies.items(), key=lambda item: -len(item[1])):
+        values.sort()
+        actions[action] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+        }
+    lags.sort()
+    return {
+        "mode": "fast" if args.fast else f"speed x{args.speed}",
+        "updates": len(all_latencies),
+        "errors": errors,
+        "recorded_seconds": round(recorded_span, 3) if not args.fast else None,
+        "seconds": round(elapsed, 3),
+        "updates_per_sec": round(len(all_latencies) / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(percentile(all_latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(all_latencies, 0.99) * 1000, 2),
+        "schedule_lag_p99_ms": round(percentile(lags, 0.99) * 1000, 2) if lags else None,
+        "remapped_giveaways": mapping,
+        "seeded": seeded,
+        "actions": actions,
+        "api_calls": dict(server.calls),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("recording", help="Файл записи (UPDATE_RECORD_FILE)")
+    parser.add_argument("--fast", action="store_true", help="Как можно быстрее, без пауз из записи")
+    parser.add_argument("--concurrency", type=int, default=50, help="Параллельность в режиме --fast")
+    parser.add_argument("--speed", type=float, default=1.0, help="Ускорение реального времени")
+    parser.add_argument("--max-gap", type=float, default=5.0, help="Паузы длиннее, сек, сжимаются (0 - нет)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Задержка фейкового Bot API, мс")
+    parser.add_argument("--database-url", help="База вместо временной (например, копия рабочей)")
+    parser.add_argument("--no-remap", action="store_true", help="Не создавать розыгрыши и не менять callback_data")
+    parser.add_argument("--json", action="store_true", help="Вывести результат одной строкой JSON")
+    args = parser.parse_args()
+    if args.speed <= 0:
+        parser.error("--speed должен быть больше 0")
+
+    db_path = None
+    if args.database_url:
+        use_database(args.database_url)
+    else:
+        db_path = use_temp_database("replay_updates_")
+    try:
+        result = asyncio.run(replay(args))
+    finally:
+        if db_path:
+            remove_temp_database(db_path)
+
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+        return
+    print(f"Режим: {result['mode']}, апдейтов: {result['updates']}, ошибок: {result['errors']}")
+    if result["recorded_seconds"] is not None:
+        print(f"В записи: {result['recorded_seconds']} с, отставание от расписания p99: {result['schedule_lag_p99_ms']} мс")
+    print(f"Время: {result['seconds']} с, {result['updates_per_sec']} апдейтов/с")
+    print(f"Обработка апдейта: p50 {result['p50_ms']} мс, p99 {result['p99_ms']} мс")
+    for action, stats in list(result["actions"].items())[:15]:
+        print(f"  {action:<40} {stats['count']:>7}  p50 {stats['p50_ms']:>8} мс  p99 {stats['p99_ms']:>8} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Временная SQLite-база для бенчмарков.
+
+Движок БД создается при импорте database.database, а config проверяет BOT_TOKEN при импорте,
+поэтому use_temp_database() вызывается до импорта модулей бота.
+"""
+import os
+import shutil
+import tempfile
+
+BENCHMARK_TOKEN = "123456:BENCHMARK-TOKEN"
+BENCHMARK_ADMIN_ID = 1
+
+
+def use_database(url: str):
+    """Направляет бота на базу url; токен и главный админ нужны config, но не используются"""
+    os.environ["DATABASE_URL"] = url
+    os.environ.setdefault("BOT_TOKEN", BENCHMARK_TOKEN)
+    os.environ.setdefault("MAIN_ADMIN_ID", str(BENCHMARK_ADMIN_ID))
+
+
+def use_temp_database(prefix: str) -> str:
+    """Направляет бота на новую базу во временном каталоге и возвращает путь к файлу базы"""
+    directory = tempfile.mkdtemp(prefix=prefix)
+    path = os.path.join(directory, "bench.db")
+    use_database(f"sqlite:///{path}")
+    return path
+
+
+def create_dispatcher():
+    """Dispatcher, собранный как в main.py: хранилище FSM, AdminMiddleware и хендлеры"""
+    from aiogram import Dispatcher
+
+    from handlers import setup_handlers
+    from middlewares.auth import AdminMiddleware
+    from utils.fsm_storage import create_fsm_storage
+
+    dp = Dispatcher(storage=create_fsm_storage())
+    dp.message.middleware(AdminMiddleware())
+    dp.callback_query.middleware(AdminMiddleware())
+    setup_handlers(dp)
+    return dp
+
+
+def database_size(path: str) -> int:
+    """Размер базы в байтах вместе с WAL"""
+    return sum(
+        os.path.getsize(path + suffix)
+        for suffix in ("", "-wal", "-shm")
+        if os.path.exists(path + suffix)
+    )
+
+
+def remove_temp_database(path: str):
+    shutil.rmtree(os.path.dirname(path), ignore_errors=True)
@@ -17,6 +17,111 @@ class Config:
         self.DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///giveaway_bot.db")
         self.TIMEZONE = os.getenv("TIMEZONE", "Europe/Moscow")
         
+        # Адрес Bot API (пусто - официальный api.telegram.org)
+        self.TELEGRAM_API_URL = os.getenv("TELEGRAM_API_URL", "").rstrip("/")
+        
+        # HTTP-сессия для Bot API
+        self.HTTP_CONNECTION_LIMIT = int(os.getenv("HTTP_CONNECTION_LIMIT", 100))
+        self.HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", 3600))
+        self.HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", 60))
+        self.HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 10))
+        self.HTTP_REQUEST_TIMEOUT = float(os.getenv("HTTP_REQUEST_TIMEOUT", 60))
+        self.JSON_CODEC = os.getenv("JSON_CODEC", "auto")  # auto, orjson, ujson, json
+        
+        # Завершение розыгрышей
+        self.FINISH_CONCURRENCY = int(os.getenv("FINISH_CONCURRENCY", 5))  # Параллельных завершений всего (пачки по дедлайнам и догоняющий проход)
+        self.CATCHUP_CONCURRENCY = int(os.getenv("CATCHUP_CONCURRENCY", 3))  # Параллельных завершений после простоя
+        self.FINISH_CLAIM_TIMEOUT = int(os.getenv("FINISH_CLAIM_TIMEOUT", 300))  # Через сколько секунд зависший захват завершения можно перехватить
+        self.PREFINISH_LEAD_SECONDS = float(os.getenv("PREFINISH_LEAD_SECONDS", 10))  # За сколько секунд до конца готовить снимок участников (0 - не готовить)
+        self.ANNOUNCE_RATE_PER_SEC = float(os.getenv("ANNOUNCE_RATE_PER_SEC", 1))  # Публикаций итогов в секунду
+        self.ANNOUNCE_BURST = int(os.getenv("ANNOUNCE_BURST", 3))
+        
+        # Исходящая очередь (outbox) для публикаций в каналы
+        self.OUTBOX_CONCURRENCY = int(os.getenv("OUTBOX_CONCURRENCY", 4))
+        self.OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 50))
+        self.OUTBOX_POLL_SECONDS = float(os.getenv("OUTBOX_POLL_SECONDS", 2))
+        self.OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", 8))
+        self.OUTBOX_RETRY_BASE = float(os.getenv("OUTBOX_RETRY_BASE", 5))  # Первая задержка повтора, секунд
+        self.OUTBOX_RETRY_MAX = float(os.getenv("OUTBOX_RETRY_MAX", 900))
+        
+        # Личные уведомления победителям
+        self.WINNER_DM_ENABLED = os.getenv("WINNER_DM_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.DM_RATE_PER_SEC = float(os.getenv("DM_RATE_PER_SEC", 20))
+        self.DM_CONCURRENCY = int(os.getenv("DM_CONCURRENCY", 8))
+        
+        # Рассылки участникам (используют общий с личными уведомлениями лимит DM_RATE_PER_SEC)
+        self.BROADCAST_CONCURRENCY = int(os.getenv("BROADCAST_CONCURRENCY", 8))
+        self.BROADCAST_CHUNK_SIZE = int(os.getenv("BROADCAST_CHUNK_SIZE", 500))  # Участников между контрольными точками
+        
+        # Не давать побеждать тем, кто уже выигрывал за последние N дней (0 - без ограничения)
+        self.WINNER_COOLDOWN_DAYS = int(os.getenv("WINNER_COOLDOWN_DAYS", 0))
+        
+        # Проверка подписки на канал для розыгрышей «только для подписчиков»
+        self.MEMBERSHIP_CACHE_TTL = float(os.getenv("MEMBERSHIP_CACHE_TTL", 600))  # Сколько помнить, что пользователь подписан
+        self.MEMBERSHIP_NEGATIVE_TTL = float(os.getenv("MEMBERSHIP_NEGATIVE_TTL", 30))  # ...и что не подписан
+        self.MEMBERSHIP_CACHE_SIZE = int(os.getenv("MEMBERSHIP_CACHE_SIZE", 100000))
+        self.MEMBERSHIP_CHECK_CONCURRENCY = int(os.getenv("MEMBERSHIP_CHECK_CONCURRENCY", 10))  # Проверка победителей
+        
+        # Хранилище FSM: database (по умолчанию), redis или memory
+        self.FSM_STORAGE = os.getenv("FSM_STORAGE", "database").lower()
+        self.FSM_STATE_TTL = int(os.getenv("FSM_STATE_TTL", 86400))  # Через сколько секунд без действий состояние сбрасывается
+        self.FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", 1000))  # Состояний в памяти (0 - всегда читать из БД; в режиме webhook по умолчанию 0)
+        self.REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+        
+        # Журнал медленных запросов и бюджет запросов к БД на один апдейт (0 - выключено)
+        self.SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+        self.UPDATE_QUERY_BUDGET = int(os.getenv("UPDATE_QUERY_BUDGET", 15))
+        self.UPDATE_DB_TIME_BUDGET_MS = float(os.getenv("UPDATE_DB_TIME_BUDGET_MS", 300))
+        
+        # Логи: запись в фоновом потоке, ротация по размеру, ограничение повторяющихся предупреждений
+        self.LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+        self.LOG_FILE = os.getenv("LOG_FILE", "bot.log")  # Пусто - только консоль
+        self.LOG_FILE_MAX_BYTES = int(os.getenv("LOG_FILE_MAX_BYTES", 10 * 1024 * 1024))
+        self.LOG_FILE_BACKUPS = int(os.getenv("LOG_FILE_BACKUPS", 5))
+        self.LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()  # text или json
+        self.LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+        self.LOG_RATE_LIMIT_SECONDS = float(os.getenv("LOG_RATE_LIMIT_SECONDS", 60))  # 0 - без ограничения
+        self.LOG_RATE_LIMIT_BURST = int(os.getenv("LOG_RATE_LIMIT_BURST", 5))
+        
+        # Профилирование по запросу админа (/profile): длительность по умолчанию, предел, интервал выборок
+        self.PROFILE_SECONDS = int(os.getenv("PROFILE_SECONDS", 30))
+        self.PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", 300))
+        self.PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", 5))
+        self.PROFILE_TOP_ALLOCATIONS = int(os.getenv("PROFILE_TOP_ALLOCATIONS", 15))
+        
+        # Трассировка апдейтов в JSONL (OTLP/JSON): доля записываемых апдейтов, 0 - выключено
+        self.TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0))
+        self.TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+        self.TRACE_FILE_MAX_BYTES = int(os.getenv("TRACE_FILE_MAX_BYTES", 10 * 1024 * 1024))
+        self.TRACE_FILE_BACKUPS = int(os.getenv("TRACE_FILE_BACKUPS", 3))
+        
+        # Запись входящих апдейтов для воспроизведения (пусто - выключено).
+        # Пользователи обезличиваются; соль задает стабильные псевдонимы между перезапусками
+        self.UPDATE_RECORD_FILE = os.getenv("UPDATE_RECORD_FILE", "")
+        self.UPDATE_RECORD_MAX_UPDATES = int(os.getenv("UPDATE_RECORD_MAX_UPDATES", 1000000))
+        self.UPDATE_RECORD_SALT = os.getenv("UPDATE_RECORD_SALT", "")  # Пусто - новая случайная соль при запуске
+        
+        # HTTP-эндпоинт метрик Prometheus (0 - выключен, метрики все равно собираются)
+        self.METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+        self.METRICS_PORT = int(os.getenv("METRICS_PORT", 0))
+        
+        # Несколько экземпляров бота на одной БД: планировщик работает только у лидера
+        self.INSTANCE_ID = os.getenv("INSTANCE_ID", "")  # Пусто - hostname:pid
+        self.LEADER_LEASE_TTL = float(os.getenv("LEADER_LEASE_TTL", 30))  # Секунд без продления до смены лидера
+        self.LEADER_HEARTBEAT = float(os.getenv("LEADER_HEARTBEAT", 10))  # Интервал продления аренды
+        
+        # Режим webhook (пусто - polling). Для нескольких экземпляров нужен webhook за балансировщиком
+        self.WEBHOOK_URL = os.getenv("WEBHOOK_URL", "").rstrip("/")
+        self.WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/webhook")
+        self.WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+        self.WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", 8080))
+        self.WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+        
+        # За балансировщиком апдейты одного пользователя приходят на разные экземпляры:
+        # кэш FSM в памяти вернул бы устаревший шаг мастера, поэтому по умолчанию он выключен
+        if self.WEBHOOK_URL and os.getenv("FSM_CACHE_SIZE") is None:
+            self.FSM_CACHE_SIZE = 0
+        
         # Проверяем, что все необходимые переменные заданы
         if not self.BOT_TOKEN:
             raise ValueError("BOT_TOKEN не найден в переменных окружения!")
@@ -1,13 +1,23 @@
 import logging
-from typing import Optional, List
+from typing import Optional, List, Set
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import selectinload
-from sqlalchemy import select, delete, update, func
+from sqlalchemy import select, insert, delete, update, func, inspect, text, or_, and_, event, exists, literal
+from sqlalchemy import String, Integer, BigInteger, DateTime
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.schema import CreateColumn
+from array import array
+import uuid
 from datetime import datetime, timedelta
 
 from config import config
-from database.models import Base, Admin, Channel, Giveaway, Participant, Winner, GiveawayStatus
+from database.query_log import setup_query_log
+from database.models import (
+    Base, Admin, Channel, Giveaway, Participant, Winner, GiveawayStatus, JoinResult, Lease,
+    OutboxMessage, OutboxStatus, Broadcast, BroadcastStatus, FSMRecord
+)
+from utils.json_codec import json_dumps
+from utils.metrics import giveaway_joins, instrument_db_module
 
 # Создаем асинхронный движок БД
 engine = create_async_engine(
@@ -15,16 +25,49 @@ engine = create_async_engine(
     echo=False  # Установите True для отладки SQL запросов
 )
 
+# Медленные запросы в лог и подсчет запросов на апдейт (SLOW_QUERY_MS, UPDATE_QUERY_BUDGET)
+setup_query_log(engine.sync_engine)
+
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragma(dbapi_connection, connection_record):
+        """WAL и ожидание блокировки: параллельные завершения ждут друг друга, а не падают с database is locked"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=30000")
+        cursor.close()
+
 # Создаем фабрику сессий
 async_session = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
 
 
+def _migrate_schema(connection):
+    """Добавляет колонки и индексы, появившиеся в моделях после создания таблиц, и удаляет устаревшие таблицы"""
+    # Хранилище задач APScheduler больше не используется: задачи держатся в памяти
+    connection.execute(text("DROP TABLE IF EXISTS apscheduler_jobs"))
+    inspector = inspect(connection)
+    for table in Base.metadata.sorted_tables:
+        existing_columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing_columns:
+                column_ddl = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column_ddl}"))
+                logging.info(f"Добавлена колонка {table.name}.{column.name}")
+        for index in table.indexes:
+            try:
+                index.create(connection, checkfirst=True)
+            except IntegrityError as e:
+                # Уникальный индекс не строится, пока в таблице есть дубликаты
+                logging.error(f"Не удалось создать индекс {index.name}: {e.orig}")
+
+
 async def init_db():
     """Инициализация базы данных - создание таблиц"""
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_migrate_schema)
         logging.info("База данных инициализирована")
     
     # Добавляем главного админа, если его нет
@@ -217,7 +260,8 @@ async def remove_channel(channel_id: int) -> bool:
 # Функции для работы с розыгрышами
 async def create_giveaway(title: str, description: str, end_time, 
                          channel_id: int, created_by: int, winner_places: int = 1,
-                         media_type: str = None, media_file_id: str = None) -> Optional[Giveaway]:
+                         media_type: str = None, media_file_id: str = None,
+                         require_subscription: bool = False) -> Optional[Giveaway]:
     """Создание нового розыгрыша"""
     async with async_session() as session:
         giveaway = Giveaway(
@@ -228,7 +272,8 @@ async def create_giveaway(title: str, description: str, end_time,
             created_by=created_by,
             winner_places=winner_places,
             media_type=media_type,
-            media_file_id=media_file_id
+            media_file_id=media_file_id,
+            require_subscription=require_subscription
         )
         session.add(giveaway)
         await session.commit()
@@ -236,12 +281,15 @@ async def create_giveaway(title: str, description: str, end_time,
         return giveaway
 
 
-async def get_giveaway(giveaway_id: int) -> Optional[Giveaway]:
-    """Получение розыгрыша по ID"""
+async def get_giveaway(giveaway_id: int, with_participants: bool = True) -> Optional[Giveaway]:
+    """Получение розыгрыша по ID (with_participants=False - без загрузки участников)"""
+    options = [selectinload(Giveaway.channel)]
+    if with_participants:
+        options.append(selectinload(Giveaway.participants))
     async with async_session() as session:
         result = await session.execute(
             select(Giveaway)
-            .options(selectinload(Giveaway.channel), selectinload(Giveaway.participants))
+            .options(*options)
             .where(Giveaway.id == giveaway_id)
         )
         return result.scalar_one_or_none()
@@ -261,6 +309,46 @@ async def get_active_giveaways() -> List[Giveaway]:
         return result.scalars().all()
 
 
+async def get_active_giveaway_schedule() -> List[tuple]:
+    """Пары (id, end_time) активных розыгрышей без загрузки связей"""
+    async with async_session() as session:
+        result = await session.execute(
+            select(Giveaway.id, Giveaway.end_time)
+            .where(Giveaway.status == GiveawayStatus.ACTIVE.value)
+        )
+        return [tuple(row) for row in result.all()]
+
+
+async def get_overdue_giveaway_ids(before: datetime, stale_claim_before: datetime = None) -> List[int]:
+    """
+    ID активных розыгрышей, у которых end_time <= before (индекс status, end_time).
+    Если задан stale_claim_before - также розыгрыши, чей захват завершения старше этого момента.
+    """
+    condition = Giveaway.status == GiveawayStatus.ACTIVE.value
+    if stale_claim_before is not None:
+        condition = or_(condition, and_(
+            Giveaway.status == GiveawayStatus.FINISHING.value,
+            Giveaway.finish_claimed_at < stale_claim_before
+        ))
+    async with async_session() as session:
+        result = await session.execute(
+            select(Giveaway.id)
+            .where(condition, Giveaway.end_time <= before)
+            .order_by(Giveaway.end_time)
+        )
+        return [gid for (gid,) in result.all()]
+
+
+async def get_giveaway_schedule_changes(since: datetime) -> List[tuple]:
+    """Тройки (id, end_time, status) розыгрышей, измененных начиная с since"""
+    async with async_session() as session:
+        result = await session.execute(
+            select(Giveaway.id, Giveaway.end_time, Giveaway.status)
+            .where(Giveaway.updated_at >= since)
+        )
+        return [tuple(row) for row in result.all()]
+
+
 async def get_finished_giveaways() -> List[Giveaway]:
     """Получение завершенных розыгрышей"""
     async with async_session() as session:
@@ -295,6 +383,15 @@ async def get_finished_giveaways_page(page: int, page_size: int) -> List[Giveawa
         return result.scalars().all()
 
 
+async def count_giveaways_by_status() -> dict:
+    """Количество розыгрышей по статусам (по индексу статуса, без чтения участников)"""
+    async with async_session() as session:
+        result = await session.execute(
+            select(Giveaway.status, func.count(Giveaway.id)).group_by(Giveaway.status)
+        )
+        return {status: count for status, count in result.all()}
+
+
 async def count_finished_giveaways() -> int:
     """Количество завершенных розыгрышей."""
     async with async_session() as session:
@@ -304,9 +401,31 @@ async def count_finished_giveaways() -> int:
         return int(result.scalar() or 0)
 
 
+def _forget_giveaway_metrics(ids: List[int]):
+    """Серии метрик удаленных розыгрышей больше не нужны - иначе число меток в /metrics растет без конца"""
+    for giveaway_id in ids:
+        giveaway_joins.remove(str(giveaway_id))
+
+
+async def _delete_giveaway_dependents(session: AsyncSession, ids: List[int]):
+    """
+    Удаляет все, что ссылается на розыгрыши: участников, победителей, рассылки и неотправленные операции outbox.
+    Рассылку, которая сейчас идет, BroadcastRunner остановит на следующей контрольной точке - ее строки уже нет.
+    """
+    await session.execute(delete(Participant).where(Participant.giveaway_id.in_(ids)))
+    await session.execute(delete(Winner).where(Winner.giveaway_id.in_(ids)))
+    await session.execute(delete(Broadcast).where(Broadcast.giveaway_id.in_(ids)))
+    await session.execute(
+        delete(OutboxMessage).where(
+            OutboxMessage.giveaway_id.in_(ids),
+            OutboxMessage.status.in_([OutboxStatus.PENDING.value, OutboxStatus.FAILED.value])
+        )
+    )
+
+
 async def delete_finished_older_than(days: int) -> int:
     """Удаляет из базы розыгрыши, завершенные более чем days дней назад. Возвращает кол-во удаленных розыгрышей.
-    Удаляются также их участники и победители."""
+    Удаляются также их участники, победители, рассылки и неотправленные операции outbox."""
     threshold = datetime.utcnow() - timedelta(days=days)
     async with async_session() as session:
         # Найдем id таких розыгрышей
@@ -319,13 +438,13 @@ async def delete_finished_older_than(days: int) -> int:
         ids = [gid for (gid,) in result.all()]
         if not ids:
             return 0
-        # Удаляем участников и победителей для этих розыгрышей
-        await session.execute(delete(Participant).where(Participant.giveaway_id.in_(ids)))
-        await session.execute(delete(Winner).where(Winner.giveaway_id.in_(ids)))
+        # Удаляем участников, победителей, рассылки и неотправленные операции этих розыгрышей
+        await _delete_giveaway_dependents(session, ids)
         # Удаляем сами розыгрыши
         await session.execute(delete(Giveaway).where(Giveaway.id.in_(ids)))
         await session.commit()
-        return len(ids)
+    _forget_giveaway_metrics(ids)
+    return len(ids)
 
 
 async def update_giveaway_message_id(giveaway_id: int, message_id: int):
@@ -359,15 +478,71 @@ async def update_giveaway_fields(giveaway_id: int, **fields) -> Optional[Giveawa
         return result.scalar_one_or_none()
 
 
-async def finish_giveaway(giveaway_id: int, winners_data: List[dict] = None):
-    """Завершение розыгрыша с несколькими победителями"""
+async def claim_giveaway_finish(giveaway_id: int, stale_before: datetime = None) -> Optional[str]:
+    """
+    Атомарно переводит розыгрыш из active в finishing (compare-and-set).
+    Зависший захват (finish_claimed_at < stale_before) можно перехватить.
+    Возвращает токен захвата или None, если розыгрыш уже завершает кто-то другой.
+    """
+    condition = Giveaway.status == GiveawayStatus.ACTIVE.value
+    if stale_before is not None:
+        condition = or_(condition, and_(
+            Giveaway.status == GiveawayStatus.FINISHING.value,
+            Giveaway.finish_claimed_at < stale_before
+        ))
+    token = uuid.uuid4().hex
     async with async_session() as session:
-        # Обновляем статус розыгрыша
-        await session.execute(
+        result = await session.execute(
             update(Giveaway)
-            .where(Giveaway.id == giveaway_id)
-            .values(status=GiveawayStatus.FINISHED.value)
+            .where(Giveaway.id == giveaway_id, condition)
+            .values(
+                status=GiveawayStatus.FINISHING.value,
+                finish_claim_token=token,
+                finish_claimed_at=datetime.utcnow()
+            )
         )
+        await session.commit()
+        return token if result.rowcount == 1 else None
+
+
+async def release_giveaway_claim(giveaway_id: int, claim_token: str) -> bool:
+    """Возвращает захваченный розыгрыш в active, чтобы завершение можно было повторить"""
+    async with async_session() as session:
+        result = await session.execute(
+            update(Giveaway)
+            .where(
+                Giveaway.id == giveaway_id,
+                Giveaway.status == GiveawayStatus.FINISHING.value,
+                Giveaway.finish_claim_token == claim_token
+            )
+            .values(status=GiveawayStatus.ACTIVE.value, finish_claim_token=None, finish_claimed_at=None)
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+
+async def finish_giveaway(giveaway_id: int, winners_data: List[dict] = None, draw_seed: str = None,
+                          claim_token: str = None, outbox_messages: List[dict] = None) -> bool:
+    """
+    Завершение розыгрыша с несколькими победителями.
+    С claim_token розыгрыш завершается, только если захват все еще наш; иначе ничего не пишется и возвращается False.
+    outbox_messages - операции {"kind", "chat_id", "payload"} (итоги в канал, уведомления победителям):
+    ставятся в outbox той же транзакцией.
+    """
+    async with async_session() as session:
+        # Обновляем статус розыгрыша и сохраняем сид для аудита
+        query = update(Giveaway).where(Giveaway.id == giveaway_id)
+        if claim_token is not None:
+            query = query.where(
+                Giveaway.status == GiveawayStatus.FINISHING.value,
+                Giveaway.finish_claim_token == claim_token
+            )
+        result = await session.execute(
+            query.values(status=GiveawayStatus.FINISHED.value, draw_seed=draw_seed)
+        )
+        if result.rowcount != 1:
+            await session.rollback()
+            return False
         
         # Добавляем победителей
         if winners_data:
@@ -377,24 +552,29 @@ async def finish_giveaway(giveaway_id: int, winners_data: List[dict] = None):
                     user_id=winner_data["user_id"],
                     username=winner_data.get("username"),
                     first_name=winner_data.get("first_name"),
-                    place=winner_data["place"]
+                    place=winner_data["place"],
+                    dm_status=winner_data.get("dm_status")
                 )
                 session.add(winner)
         
+        # Отправка идет через outbox: если Bot API недоступен, итоги и уведомления не потеряются
+        for message in outbox_messages or []:
+            session.add(OutboxMessage(
+                kind=message["kind"],
+                chat_id=message["chat_id"],
+                giveaway_id=giveaway_id,
+                payload=json_dumps(message.get("payload") or {})
+            ))
+        
         await session.commit()
+        return True
 
 
 async def delete_giveaway(giveaway_id: int) -> bool:
     """Удаление розыгрыша"""
     async with async_session() as session:
-        # Сначала удаляем победителей
-        await session.execute(
-            delete(Winner).where(Winner.giveaway_id == giveaway_id)
-        )
-        # Затем удаляем участников
-        await session.execute(
-            delete(Participant).where(Participant.giveaway_id == giveaway_id)
-        )
+        # Сначала удаляем участников, победителей, рассылки и неотправленные операции
+        await _delete_giveaway_dependents(session, [giveaway_id])
         # Затем удаляем розыгрыш
         result = await session.execute(
             select(Giveaway).where(Giveaway.id == giveaway_id)
@@ -404,6 +584,7 @@ async def delete_giveaway(giveaway_id: int) -> bool:
         if giveaway:
             await session.delete(giveaway)
             await session.commit()
+            _forget_giveaway_metrics([giveaway_id])
             return True
         await session.commit()
         return False
@@ -411,7 +592,7 @@ async def delete_giveaway(giveaway_id: int) -> bool:
 
 # Функции для работы с участниками
 async def add_participant(giveaway_id: int, user_id: int, 
-                         username: str = None, first_name: str = None) -> bool:
+                         username: str = None, first_name: str = None) -> JoinResult:
     """Добавление участника в розыгрыш"""
     async with async_session() as session:
         try:
@@ -425,20 +606,33 @@ async def add_participant(giveaway_id: int, user_id: int,
             existing = result.scalar_one_or_none()
             
             if existing:
-                return False  # Уже участвует
+                return JoinResult.ALREADY_JOINED
             
-            participant = Participant(
-                giveaway_id=giveaway_id,
-                user_id=user_id,
-                username=username,
-                first_name=first_name
+            # Вставка только пока розыгрыш активен: после захвата завершения участие заморожено,
+            # и запись не может появиться между снимком участников и выбором победителей
+            result = await session.execute(
+                insert(Participant).from_select(
+                    ["giveaway_id", "user_id", "username", "first_name", "joined_at", "tickets"],
+                    select(
+                        literal(giveaway_id, Integer),
+                        literal(user_id, BigInteger),
+                        literal(username, String),
+                        literal(first_name, String),
+                        literal(datetime.utcnow(), DateTime),
+                        literal(1, Integer)
+                    ).where(exists().where(
+                        Giveaway.id == giveaway_id,
+                        Giveaway.status == GiveawayStatus.ACTIVE.value
+                    ))
+                )
             )
-            session.add(participant)
             await session.commit()
-            return True
+            # Ни одной строки - розыгрыш уже не активен
+            return JoinResult.JOINED if result.rowcount == 1 else JoinResult.CLOSED
         except IntegrityError:
+            # Параллельное нажатие того же пользователя успело первым
             await session.rollback()
-            return False
+            return JoinResult.ALREADY_JOINED
 
 
 async def get_participants_count(giveaway_id: int) -> int:
@@ -459,6 +653,112 @@ async def get_participants(giveaway_id: int) -> List[Participant]:
         return result.scalars().all()
 
 
+async def get_participants_at(giveaway_id: int, positions: List[int]) -> List[Participant]:
+    """Участники по позициям (0..count-1) в порядке id. Позиция ищется по индексу
+    (giveaway_id, id), затем строки читаются по первичному ключу - в память попадает только len(positions) строк.
+    Порядок результата соответствует порядку positions."""
+    async with async_session() as session:
+        ids = []
+        for position in positions:
+            result = await session.execute(
+                select(Participant.id)
+                .where(Participant.giveaway_id == giveaway_id)
+                .order_by(Participant.id)
+                .offset(position)
+                .limit(1)
+            )
+            participant_id = result.scalar_one_or_none()
+            if participant_id is not None:
+                ids.append(participant_id)
+        if not ids:
+            return []
+        result = await session.execute(select(Participant).where(Participant.id.in_(ids)))
+        by_id = {participant.id: participant for participant in result.scalars().all()}
+        return [by_id[participant_id] for participant_id in ids if participant_id in by_id]
+
+
+async def add_bonus_tickets(giveaway_id: int, user_id: int, tickets: int) -> bool:
+    """
+    Начисляет участнику дополнительные билеты (рефералы, бусты).
+    Только пока розыгрыш активен и до снимка участников (PREFINISH_LEAD_SECONDS до конца):
+    начисленное после снимка не попало бы в выборку. False - участник не найден или прием закрыт.
+    """
+    closes_at = datetime.utcnow() + timedelta(seconds=config.PREFINISH_LEAD_SECONDS)
+    async with async_session() as session:
+        result = await session.execute(
+            update(Participant)
+            .where(
+                Participant.giveaway_id == giveaway_id,
+                Participant.user_id == user_id,
+                exists().where(
+                    Giveaway.id == giveaway_id,
+                    Giveaway.status == GiveawayStatus.ACTIVE.value,
+                    Giveaway.end_time > closes_at
+                )
+            )
+            .values(tickets=Participant.tickets + tickets)
+        )
+        await session.commit()
+        return result.rowcount > 0
+
+
+async def get_participant_entries(giveaway_id: int, after_id: int = 0) -> tuple[array, array]:
+    """
+    Массивы (id, tickets) участников с id > after_id в порядке id, без создания ORM-объектов.
+    after_id позволяет дочитать только тех, кто присоединился после снимка.
+    """
+    ids = array("q")
+    tickets = array("q")
+    async with async_session() as session:
+        result = await session.stream(
+            select(Participant.id, Participant.tickets)
+            .where(Participant.giveaway_id == giveaway_id, Participant.id > after_id)
+            .order_by(Participant.id)
+            .execution_options(yield_per=50_000)
+        )
+        async for partition in result.partitions():
+            for participant_id, user_tickets in partition:
+                ids.append(participant_id)
+                tickets.append(user_tickets)
+    return ids, tickets
+
+
+async def get_participants_summary(giveaway_id: int, after_id: int = 0) -> tuple[int, int, int]:
+    """(количество, наибольший id, наибольшее число билетов) участников с id > after_id"""
+    async with async_session() as session:
+        result = await session.execute(
+            select(func.count(Participant.id), func.max(Participant.id), func.max(Participant.tickets))
+            .where(Participant.giveaway_id == giveaway_id, Participant.id > after_id)
+        )
+        count, max_id, max_tickets = result.one()
+        return int(count or 0), int(max_id or after_id), int(max_tickets or 0)
+
+
+async def get_participants_by_ids(participant_ids: List[int]) -> List[Participant]:
+    """Участники по первичному ключу в том же порядке"""
+    if not participant_ids:
+        return []
+    async with async_session() as session:
+        result = await session.execute(select(Participant).where(Participant.id.in_(participant_ids)))
+        by_id = {participant.id: participant for participant in result.scalars().all()}
+        return [by_id[participant_id] for participant_id in participant_ids if participant_id in by_id]
+
+
+async def get_participants_by_user_ids(giveaway_id: int, user_ids: List[int]) -> List[Participant]:
+    """Участники розыгрыша по списку user_id в том же порядке"""
+    if not user_ids:
+        return []
+    async with async_session() as session:
+        result = await session.execute(
+            select(Participant).where(
+                Participant.giveaway_id == giveaway_id,
+                Participant.user_id.in_(user_ids)
+            )
+        )
+        by_user = {participant.user_id: participant for participant in result.scalars().all()}
+        return [by_user[user_id] for user_id in user_ids if user_id in by_user]
+
+
 # Функции для работы с победителями
 async def get_winners(giveaway_id: int) -> List[Winner]:
     """Получение списка победителей розыгрыша"""
@@ -471,6 +771,19 @@ async def get_winners(giveaway_id: int) -> List[Winner]:
         return result.scalars().all()
 
 
+async def get_recent_winner_user_ids(user_ids: List[int], since: datetime) -> Set[int]:
+    """Кто из user_ids побеждал начиная с since - по индексу (user_id, won_at), без чтения участников"""
+    if not user_ids:
+        return set()
+    async with async_session() as session:
+        result = await session.execute(
+            select(Winner.user_id)
+            .where(Winner.user_id.in_(user_ids), Winner.won_at >= since)
+            .distinct()
+        )
+        return set(result.scalars().all())
+
+
 async def add_winner(giveaway_id: int, user_id: int, place: int,
                     username: str = None, first_name: str = None) -> bool:
     """Добавление победителя"""
@@ -489,3 +802,400 @@ async def add_winner(giveaway_id: int, user_id: int, place: int,
         except IntegrityError:
             await session.rollback()
             return False
+
+
+# Функции для аренды ролей между экземплярами бота
+async def acquire_lease(name: str, holder: str, ttl_seconds: float) -> bool:
+    """
+    Берет или продлевает аренду name на ttl_seconds.
+    Удается, если аренда свободна, просрочена или уже принадлежит holder.
+    """
+    now = datetime.utcnow()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+    async with async_session() as session:
+        result = await session.execute(
+            update(Lease)
+            .where(Lease.name == name, or_(Lease.holder == holder, Lease.expires_at < now))
+            .values(holder=holder, expires_at=expires_at, renewed_at=now)
+        )
+        if result.rowcount == 1:
+            await session.commit()
+            return True
+        
+        # Строки аренды еще нет - пробуем создать; при гонке побеждает первый INSERT
+        session.add(Lease(name=name, holder=holder, expires_at=expires_at, renewed_at=now))
+        try:
+            await session.commit()
+            return True
+        except IntegrityError:
+            await session.rollback()
+            return False
+
+
+async def release_lease(name: str, holder: str) -> bool:
+    """Освобождает аренду, если она принадлежит holder"""
+    async with async_session() as session:
+        result = await session.execute(
+            delete(Lease).where(Lease.name == name, Lease.holder == holder)
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+
+async def get_lease(name: str) -> Optional[Lease]:
+    """Текущая аренда name"""
+    async with async_session() as session:
+        result = await session.execute(select(Lease).where(Lease.name == name))
+        return result.scalar_one_or_none()
+
+
+async def set_winner_dm_status(giveaway_id: int, user_id: int, status: str):
+    """Статус личного уведомления победителя"""
+    async with async_session() as session:
+        await session.execute(
+            update(Winner)
+            .where(Winner.giveaway_id == giveaway_id, Winner.user_id == user_id)
+            .values(dm_status=status)
+        )
+        await session.commit()
+
+
+# Функции для исходящей очереди (outbox)
+async def enqueue_outbox(kind: str, chat_id: int, payload: dict = None,
+                         giveaway_id: int = None, dedupe_key: str = None) -> Optional[int]:
+    """
+    Ставит операцию в outbox и возвращает ее id.
+    Если ожидающая операция с тем же dedupe_key уже есть - новая не добавляется (возвращается None).
+    """
+    async with async_session() as session:
+        if dedupe_key:
+            result = await session.execute(
+                select(OutboxMessage.id).where(
+                    OutboxMessage.dedupe_key == dedupe_key,
+                    OutboxMessage.status == OutboxStatus.PENDING.value
+                ).limit(1)
+            )
+            if result.scalar_one_or_none() is not None:
+                return None
+        item = OutboxMessage(
+            kind=kind,
+            chat_id=chat_id,
+            giveaway_id=giveaway_id,
+            payload=json_dumps(payload or {}),
+            dedupe_key=dedupe_key
+        )
+        session.add(item)
+        await session.commit()
+        return item.id
+
+
+async def claim_due_outbox(limit: int, kinds: List[str] = None,
+                           exclude_kinds: List[str] = None) -> List[OutboxMessage]:
+    """Берет до limit операций (только kinds / кроме exclude_kinds), готовых к отправке, и помечает их sending"""
+    now = datetime.utcnow()
+    query = select(OutboxMessage).where(
+        OutboxMessage.status == OutboxStatus.PENDING.value,
+        OutboxMessage.next_attempt_at <= now
+    )
+    if kinds:
+        query = query.where(OutboxMessage.kind.in_(kinds))
+    if exclude_kinds:
+        query = query.where(OutboxMessage.kind.not_in(exclude_kinds))
+    async with async_session() as session:
+        result = await session.execute(
+            query.order_by(OutboxMessage.next_attempt_at).limit(limit)
+        )
+        items = result.scalars().all()
+        if items:
+            await session.execute(
+                update(OutboxMessage)
+                .where(OutboxMessage.id.in_([item.id for item in items]))
+                .values(status=OutboxStatus.SENDING.value)
+            )
+            await session.commit()
+        return items
+
+
+async def mark_outbox_sent(item_id: int):
+    async with async_session() as session:
+        await session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id == item_id)
+            .values(status=OutboxStatus.SENT.value, sent_at=datetime.utcnow(), last_error=None)
+        )
+        await session.commit()
+
+
+async def save_outbox_progress(item_id: int, payload: dict):
+    """
+    Сохраняет в payload, что часть операции уже выполнена (например, новый пост отправлен), чтобы повтор ее пропустил.
+    dedupe_key снимается: содержимое уже зафиксировано, и новые правки должны поставить свою операцию.
+    """
+    async with async_session() as session:
+        await session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id == item_id)
+            .values(payload=json_dumps(payload), dedupe_key=None)
+        )
+        await session.commit()
+
+
+async def mark_outbox_retry(item_id: int, delay_seconds: float, error: str, count_attempt: bool = True):
+    """Возвращает операцию в очередь с задержкой; RetryAfter не считается неудачной попыткой"""
+    values = dict(
+        status=OutboxStatus.PENDING.value,
+        next_attempt_at=datetime.utcnow() + timedelta(seconds=delay_seconds),
+        last_error=error
+    )
+    if count_attempt:
+        values["attempts"] = OutboxMessage.attempts + 1
+    async with async_session() as session:
+        await session.execute(update(OutboxMessage).where(OutboxMessage.id == item_id).values(**values))
+        await session.commit()
+
+
+async def mark_outbox_failed(item_id: int, error: str):
+    async with async_session() as session:
+        await session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.id == item_id)
+            .values(status=OutboxStatus.FAILED.value, attempts=OutboxMessage.attempts + 1, last_error=error)
+        )
+        await session.commit()
+
+
+async def reset_sending_outbox(kinds: List[str] = None, exclude_kinds: List[str] = None) -> int:
+    """Возвращает в очередь операции, которые остались в sending после падения процесса"""
+    query = update(OutboxMessage).where(OutboxMessage.status == OutboxStatus.SENDING.value)
+    if kinds:
+        query = query.where(OutboxMessage.kind.in_(kinds))
+    if exclude_kinds:
+        query = query.where(OutboxMessage.kind.not_in(exclude_kinds))
+    async with async_session() as session:
+        result = await session.execute(query.values(status=OutboxStatus.PENDING.value))
+        await session.commit()
+        return result.rowcount
+
+
+async def retry_failed_outbox() -> int:
+    """Снова ставит в очередь все недоставленные операции (действие админа)"""
+    async with async_session() as session:
+        result = await session.execute(
+            update(OutboxMessage)
+            .where(OutboxMessage.status == OutboxStatus.FAILED.value)
+            .values(status=OutboxStatus.PENDING.value, attempts=0, next_attempt_at=datetime.utcnow())
+        )
+        await session.commit()
+        return result.rowcount
+
+
+async def count_outbox_by_status() -> dict:
+    """Количество операций outbox по статусам"""
+    async with async_session() as session:
+        result = await session.execute(
+            select(OutboxMessage.status, func.count(OutboxMessage.id)).group_by(OutboxMessage.status)
+        )
+        return {status: count for status, count in result.all()}
+
+
+async def count_pending_outbox() -> dict:
+    """Неотправленные операции outbox по типам; читает только строки pending/sending по индексу статуса"""
+    async with async_session() as session:
+        result = await session.execute(
+            select(OutboxMessage.kind, func.count(OutboxMessage.id))
+            .where(OutboxMessage.status.in_((OutboxStatus.PENDING.value, OutboxStatus.SENDING.value)))
+            .group_by(OutboxMessage.kind)
+        )
+        return {kind: count for kind, count in result.all()}
+
+
+async def get_stuck_outbox(limit: int = 10) -> List[OutboxMessage]:
+    """Недоставленные операции и ожидающие повтора после ошибки, самые старые первыми"""
+    async with async_session() as session:
+        result = await session.execute(
+            select(OutboxMessage)
+            .where(or_(
+                OutboxMessage.status == OutboxStatus.FAILED.value,
+                and_(OutboxMessage.status == OutboxStatus.PENDING.value, OutboxMessage.attempts > 0)
+            ))
+            .order_by(OutboxMessage.created_at)
+            .limit(limit)
+        )
+        return result.scalars().all()
+
+
+async def delete_sent_outbox_older_than(days: int) -> int:
+    """Удаляет доставленные операции старше days дней"""
+    threshold = datetime.utcnow() - timedelta(days=days)
+    async with async_session() as session:
+        result = await session.execute(
+            delete(OutboxMessage).where(
+                OutboxMessage.status == OutboxStatus.SENT.value,
+                OutboxMessage.sent_at < threshold
+            )
+        )
+        await session.commit()
+        return result.rowcount
+
+
+# Функции для рассылок
+async def create_broadcast(giveaway_id: int, text: str, created_by: int = None) -> Broadcast:
+    """Создает рассылку участникам розыгрыша"""
+    async with async_session() as session:
+        broadcast = Broadcast(giveaway_id=giveaway_id, text=text, created_by=created_by)
+        session.add(broadcast)
+        await session.commit()
+        return broadcast
+
+
+async def has_unfinished_broadcast(giveaway_id: int) -> bool:
+    """Есть ли у розыгрыша ожидающая или идущая рассылка"""
+    async with async_session() as session:
+        result = await session.execute(
+            select(Broadcast.id).where(
+                Broadcast.giveaway_id == giveaway_id,
+                Broadcast.status.in_([BroadcastStatus.RUNNING.value, BroadcastStatus.PENDING.value])
+            ).limit(1)
+        )
+        return result.scalar_one_or_none() is not None
+
+
+async def get_next_broadcast() -> Optional[Broadcast]:
+    """Рассылка для выполнения: сначала прерванная (running), затем самая старая ожидающая"""
+    async with async_session() as session:
+        result = await session.execute(
+            select(Broadcast)
+            .where(Broadcast.status.in_([BroadcastStatus.RUNNING.value, BroadcastStatus.PENDING.value]))
+            .order_by((Broadcast.status == BroadcastStatus.RUNNING.value).desc(), Broadcast.id)
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+
+async def get_broadcast(broadcast_id: int) -> Optional[Broadcast]:
+    async with async_session() as session:
+        result = await session.execute(select(Broadcast).where(Broadcast.id == broadcast_id))
+        return result.scalar_one_or_none()
+
+
+async def get_recent_broadcasts(limit: int = 5) -> List[Broadcast]:
+    async with async_session() as session:
+        result = await session.execute(select(Broadcast).order_by(Broadcast.id.desc()).limit(limit))
+        return result.scalars().all()
+
+
+async def start_broadcast(broadcast_id: int, total: int):
+    """Переводит рассылку в running (total и started_at задаются только при первом запуске)"""
+    async with async_session() as session:
+        await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.status == BroadcastStatus.PENDING.value)
+            .values(status=BroadcastStatus.RUNNING.value, total=total, started_at=datetime.utcnow())
+        )
+        await session.commit()
+
+
+async def checkpoint_broadcast(broadcast_id: int, last_participant_id: int,
+                               sent: int, blocked: int, failed: int) -> bool:
+    """
+    Сохраняет контрольную точку и прибавляет счетчики порции.
+    Возвращает False, если рассылку за это время остановили.
+    """
+    async with async_session() as session:
+        result = await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id, Broadcast.status == BroadcastStatus.RUNNING.value)
+            .values(
+                last_participant_id=last_participant_id,
+                sent_count=Broadcast.sent_count + sent,
+                blocked_count=Broadcast.blocked_count + blocked,
+                failed_count=Broadcast.failed_count + failed
+            )
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+
+async def finish_broadcast(broadcast_id: int, status: str = BroadcastStatus.DONE.value) -> bool:
+    """Завершает (или отменяет) рассылку, если она еще не завершена"""
+    async with async_session() as session:
+        result = await session.execute(
+            update(Broadcast)
+            .where(
+                Broadcast.id == broadcast_id,
+                Broadcast.status.in_([BroadcastStatus.RUNNING.value, BroadcastStatus.PENDING.value])
+            )
+            .values(status=status, finished_at=datetime.utcnow())
+        )
+        await session.commit()
+        return result.rowcount == 1
+
+
+async def get_participant_user_ids_page(giveaway_id: int, after_id: int, limit: int) -> List[tuple]:
+    """Порция (id, user_id) участников с id > after_id - keyset-пагинация по индексу (giveaway_id, id)"""
+    async with async_session() as session:
+        result = await session.execute(
+            select(Participant.id, Participant.user_id)
+            .where(Participant.giveaway_id == giveaway_id, Participant.id > after_id)
+            .order_by(Participant.id)
+            .limit(limit)
+        )
+        return [tuple(row) for row in result.all()]
+
+
+# Функции для хранилища FSM
+async def get_fsm_record(key: str) -> Optional[FSMRecord]:
+    """Состояние FSM по ключу, если оно еще не истекло"""
+    async with async_session() as session:
+        result = await session.execute(
+            select(FSMRecord).where(FSMRecord.key == key, FSMRecord.expires_at > datetime.utcnow())
+        )
+        return result.scalar_one_or_none()
+
+
+async def get_fsm_keys() -> Set[str]:
+    """Ключи всех неистекших состояний FSM (их немного: только незаконченные диалоги админов)"""
+    async with async_session() as session:
+        result = await session.execute(select(FSMRecord.key).where(FSMRecord.expires_at > datetime.utcnow()))
+        return set(result.scalars().all())
+
+
+async def save_fsm_record(key: str, state: Optional[str], data: Optional[str], expires_at: datetime):
+    """Сохраняет состояние FSM (UPDATE, а если строки нет - INSERT)"""
+    async with async_session() as session:
+        result = await session.execute(
+            update(FSMRecord)
+            .where(FSMRecord.key == key)
+            .values(state=state, data=data, expires_at=expires_at, updated_at=datetime.utcnow())
+        )
+        if result.rowcount == 0:
+            session.add(FSMRecord(key=key, state=state, data=data, expires_at=expires_at))
+        try:
+            await session.commit()
+        except IntegrityError:
+            # Строку успел создать параллельный запрос - перезаписываем ее
+            await session.rollback()
+            await session.execute(
+                update(FSMRecord)
+                .where(FSMRecord.key == key)
+                .values(state=state, data=data, expires_at=expires_at, updated_at=datetime.utcnow())
+            )
+            await session.commit()
+
+
+async def delete_fsm_record(key: str):
+    async with async_session() as session:
+        await session.execute(delete(FSMRecord).where(FSMRecord.key == key))
+        await session.commit()
+
+
+async def delete_expired_fsm_records() -> int:
+    """Удаляет брошенные состояния FSM. Возвращает количество удаленных"""
+    async with async_session() as session:
+        result = await session.execute(delete(FSMRecord).where(FSMRecord.expires_at <= datetime.utcnow()))
+        await session.commit()
+        return result.rowcount
+
+
+# Замер времени всех функций модуля для метрик (должно оставаться в самом конце файла)
+instrument_db_module(globals(), __name__)
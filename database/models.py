@@ -4,7 +4,7 @@ from typing import Optional, List
 
 from sqlalchemy import (
     Column, Integer, String, Text, DateTime, Boolean, 
-    ForeignKey, BigInteger, create_engine
+    ForeignKey, BigInteger, Index, create_engine
 )
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker
@@ -13,9 +13,41 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sess
 Base = declarative_base()
 
 
+class OutboxStatus(Enum):
+    """Статусы исходящих операций"""
+    PENDING = "pending"   # Ждет отправки (в том числе повторной)
+    SENDING = "sending"   # Взята воркером
+    SENT = "sent"         # Доставлена
+    FAILED = "failed"     # Не доставлена: постоянная ошибка или исчерпаны попытки
+
+
+class WinnerDMStatus(Enum):
+    """Статусы личного уведомления победителя"""
+    PENDING = "pending"   # Поставлено в очередь
+    SENT = "sent"         # Доставлено
+    BLOCKED = "blocked"   # Пользователь заблокировал бота или не начинал с ним диалог
+    FAILED = "failed"     # Не доставлено после всех попыток
+
+
+class BroadcastStatus(Enum):
+    """Статусы рассылки"""
+    PENDING = "pending"       # Ждет запуска
+    RUNNING = "running"       # Идет (после перезапуска продолжается с контрольной точки)
+    DONE = "done"             # Завершена
+    CANCELLED = "cancelled"   # Остановлена админом
+
+
+class JoinResult(Enum):
+    """Результат попытки участия"""
+    JOINED = "joined"                # Участник добавлен
+    ALREADY_JOINED = "already"       # Уже участвует
+    CLOSED = "closed"                # Розыгрыш больше не принимает участников (завершается или удален)
+
+
 class GiveawayStatus(Enum):
     """Статусы розыгрыша"""
     ACTIVE = "active"       # Активный розыгрыш
+    FINISHING = "finishing" # Завершение захвачено одним обработчиком, идет выбор победителей
     FINISHED = "finished"   # Завершенный розыгрыш
     CANCELLED = "cancelled" # Отмененный розыгрыш
 
@@ -70,6 +102,12 @@ class Giveaway(Base):
     # Статус и количество призовых мест
     status = Column(String(20), default=GiveawayStatus.ACTIVE.value)
     winner_places = Column(Integer, default=1)  # Количество призовых мест
+    draw_seed = Column(String(64), nullable=True)  # Сид розыгрыша - по нему итоги можно воспроизвести
+    require_subscription = Column(Boolean, default=False, server_default="0", nullable=False)  # Участвовать могут только подписчики канала
+    
+    # Захват завершения: кто и когда перевел розыгрыш в finishing
+    finish_claim_token = Column(String(32), nullable=True)
+    finish_claimed_at = Column(DateTime, nullable=True)
     
     # Кто создал
     created_by = Column(BigInteger, ForeignKey('admins.user_id'))
@@ -79,6 +117,12 @@ class Giveaway(Base):
     # Связи
     channel = relationship("Channel", backref="giveaways")
     creator = relationship("Admin", backref="created_giveaways")
+    
+    # Индексы: поиск активных розыгрышей по времени окончания и изменений для синхронизации лидера
+    __table_args__ = (
+        Index("ix_giveaways_status_end_time", "status", "end_time"),
+        Index("ix_giveaways_updated_at", "updated_at"),
+    )
 
 
 class Participant(Base):
@@ -91,12 +135,16 @@ class Participant(Base):
     username = Column(String(255), nullable=True)
     first_name = Column(String(255), nullable=True)
     joined_at = Column(DateTime, default=datetime.utcnow)
+    tickets = Column(Integer, default=1, server_default="1", nullable=False)  # Билеты: 1 + бонусы за рефералов/бусты
     
     # Связь с розыгрышем
     giveaway = relationship("Giveaway", backref="participants")
     
-    # Уникальный индекс: один пользователь - один розыгрыш
+    # Индекс для подсчета участников и выборки по позиции без чтения всей таблицы
     __table_args__ = (
+        Index("ix_participants_giveaway_id_id", "giveaway_id", "id"),
+        # Один пользователь - одно участие, даже если нажатия обработали разные экземпляры бота
+        Index("ux_participants_giveaway_user", "giveaway_id", "user_id", unique=True),
         {'sqlite_autoincrement': True},
     )
 
@@ -112,11 +160,86 @@ class Winner(Base):
     first_name = Column(String(255), nullable=True)
     place = Column(Integer, nullable=False)  # 1, 2, 3... место
     won_at = Column(DateTime, default=datetime.utcnow)
+    dm_status = Column(String(20), nullable=True)  # Личное уведомление: pending, sent, blocked, failed
     
     # Связь с розыгрышем
     giveaway = relationship("Giveaway", backref="winners")
     
     # Уникальный индекс: одно место в одном розыгрыше
     __table_args__ = (
+        # История побед пользователя: для исключения недавних победителей (WINNER_COOLDOWN_DAYS)
+        Index("ix_winners_user_id_won_at", "user_id", "won_at"),
         {'sqlite_autoincrement': True},
     )
+
+
+class Lease(Base):
+    """Аренда роли между экземплярами бота (например, лидер планировщика)"""
+    __tablename__ = "leases"
+    
+    name = Column(String(64), primary_key=True)    # Название роли
+    holder = Column(String(255), nullable=False)   # ID экземпляра, который держит аренду
+    expires_at = Column(DateTime, nullable=False)  # После этого момента аренду может забрать другой
+    renewed_at = Column(DateTime, default=datetime.utcnow)
+
+
+class FSMRecord(Base):
+    """Состояние FSM пользователя (мастера создания и редактирования розыгрышей), переживает перезапуск"""
+    __tablename__ = "fsm_states"
+    
+    key = Column(String(255), primary_key=True)   # bot_id:chat_id:user_id:thread_id:destiny
+    state = Column(String(255), nullable=True)
+    data = Column(Text, nullable=True)             # JSON
+    expires_at = Column(DateTime, nullable=False)  # Брошенное состояние считается пустым после этого момента
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_fsm_states_expires_at", "expires_at"),
+    )
+
+
+class OutboxMessage(Base):
+    """Исходящая операция с каналом (публикация итогов, перепубликация поста), доставляемая с повторами"""
+    __tablename__ = "outbox"
+    
+    id = Column(Integer, primary_key=True)
+    kind = Column(String(50), nullable=False)        # send_message, repost_giveaway, winner_dm
+    chat_id = Column(BigInteger, nullable=False)
+    giveaway_id = Column(Integer, nullable=True)
+    payload = Column(Text, nullable=False, default="{}")  # Параметры операции в JSON
+    dedupe_key = Column(String(100), nullable=True)  # Повторная постановка с тем же ключом не дублирует ожидающую
+    
+    status = Column(String(20), default=OutboxStatus.PENDING.value, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    sent_at = Column(DateTime, nullable=True)
+    
+    # Индекс для выборки готовых к отправке
+    __table_args__ = (
+        Index("ix_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+        {'sqlite_autoincrement': True},
+    )
+
+
+class Broadcast(Base):
+    """Рассылка всем участникам розыгрыша с контрольной точкой для продолжения после падения"""
+    __tablename__ = "broadcasts"
+    
+    id = Column(Integer, primary_key=True)
+    giveaway_id = Column(Integer, ForeignKey('giveaways.id'), nullable=False)
+    text = Column(Text, nullable=False)
+    status = Column(String(20), default=BroadcastStatus.PENDING.value, nullable=False)
+    
+    # Контрольная точка: участники обходятся по возрастанию participants.id
+    last_participant_id = Column(Integer, default=0, nullable=False)
+    total = Column(Integer, default=0, nullable=False)    # Участников на момент запуска
+    sent_count = Column(Integer, default=0, nullable=False)
+    blocked_count = Column(Integer, default=0, nullable=False)
+    failed_count = Column(Integer, default=0, nullable=False)
+    
+    created_by = Column(BigInteger, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
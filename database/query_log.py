@@ -0,0 +1,86 @@
+"""
+Журнал медленных запросов и подсчет запросов на апдейт через события движка SQLAlchemy
+"""
+import logging
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from config import config
+
+# Сколько символов SQL и параметров попадает в лог
+_MAX_STATEMENT_LENGTH = 500
+_MAX_PARAMS_LENGTH = 300
+
+
+class QueryStats:
+    """Запросы к БД в рамках одного апдейта"""
+
+    __slots__ = ("update_id", "count", "seconds", "statements")
+
+    def __init__(self, update_id: Optional[int] = None):
+        self.update_id = update_id
+        self.count = 0
+        self.seconds = 0.0
+        self.statements: Counter = Counter()
+
+    def most_repeated(self):
+        """(SQL, сколько раз) самого частого запроса - признак N+1"""
+        if not self.statements:
+            return None, 0
+        return self.statements.most_common(1)[0]
+
+
+# Статистика текущего апдейта; задается middleware (middlewares/query_budget.py)
+current_query_stats: ContextVar[Optional[QueryStats]] = ContextVar("current_query_stats", default=None)
+
+
+def _shorten(value, limit: int) -> str:
+    text = " ".join(str(value).split())
+    return text if len(text) <= limit else text[:limit] + "…"
+
+
+def _format_parameters(parameters, executemany: bool) -> str:
+    # У пакетной вставки показываем только первый набор, не превращая в строку весь список
+    if executemany and isinstance(parameters, (list, tuple)) and parameters:
+        return f"{_shorten(parameters[0], _MAX_PARAMS_LENGTH)} и еще {len(parameters) - 1}"
+    return _shorten(parameters, _MAX_PARAMS_LENGTH)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+
+    stats = current_query_stats.get()
+    if stats is not None:
+        stats.count += 1
+        stats.seconds += elapsed
+        stats.statements[statement] += 1
+
+    if config.SLOW_QUERY_MS and elapsed * 1000 >= config.SLOW_QUERY_MS:
+        update = f" (апдейт {stats.update_id})" if stats is not None and stats.update_id is not None else ""
+        logging.warning(
+            f"Медленный запрос {elapsed * 1000:.0f} мс{update}: {_shorten(statement, _MAX_STATEMENT_LENGTH)} "
+            f"| параметры: {_format_parameters(parameters, executemany)}"
+        )
+
+
+def _handle_error(exception_context):
+    # Запрос упал - снимаем его время начала, иначе стек разойдется
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_start"):
+        connection.info["query_start"].pop()
+
+
+def setup_query_log(engine: Engine):
+    """Подключает замер запросов к синхронному движку (для async - engine.sync_engine)"""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(engine, "handle_error", _handle_error)
@@ -1,8 +1,9 @@
 from aiogram import Dispatcher
 
-from .admin_handlers import setup_admin_handlers
-from .giveaway_handlers import setup_giveaway_handlers
-from .basic_handlers import setup_basic_handlers
+from utils.metrics import HandlerMetricsMiddleware
+from .admin_handlers import setup_admin_handlers, router as admin_router
+from .giveaway_handlers import setup_giveaway_handlers, router as giveaway_router
+from .basic_handlers import setup_basic_handlers, router as basic_router
 
 
 def setup_handlers(dp: Dispatcher):
@@ -12,3 +13,9 @@ def setup_handlers(dp: Dispatcher):
     setup_giveaway_handlers(dp)
     # В самом конце — базовые (в т.ч. неизвестная команда)
     setup_basic_handlers(dp)
+    
+    # Время хендлеров с метками роутера и действия (utils.metrics)
+    metrics_middleware = HandlerMetricsMiddleware()
+    for router in (admin_router, giveaway_router, basic_router):
+        router.message.middleware(metrics_middleware)
+        router.callback_query.middleware(metrics_middleware)
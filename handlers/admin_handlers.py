@@ -1,28 +1,44 @@
+import html
 import logging
 from typing import Optional
 from aiogram import Dispatcher, Router, F
 from aiogram.types import Message, CallbackQuery
-from aiogram.filters import StateFilter
+from aiogram.filters import Command, CommandObject, StateFilter
+from aiogram.fsm.storage.base import BaseStorage
 from aiogram.fsm.context import FSMContext
+from aiogram.exceptions import TelegramBadRequest
 
 from states.admin_states import (
     AdminManagementStates, ChannelManagementStates,
     ViewGiveawaysStates
 )
-from texts.messages import MESSAGES, ADMIN_USER_ITEM, ADMIN_CHANNEL_ITEM
+from texts.messages import (
+    MESSAGES, ADMIN_USER_ITEM, ADMIN_CHANNEL_ITEM, ADMIN_OUTBOX_ITEM, ADMIN_BROADCAST_ITEM
+)
 from utils.keyboards import (
     get_admin_management_keyboard, get_admins_list_keyboard,
     get_channel_management_keyboard, get_channels_list_keyboard,
     get_back_to_menu_keyboard, get_confirm_keyboard,
-    get_giveaway_types_keyboard, get_add_channel_method_keyboard
+    get_giveaway_types_keyboard, get_add_channel_method_keyboard,
+    get_outbox_keyboard, get_broadcasts_keyboard, get_stats_keyboard
 )
 from database.database import (
     get_all_admins, add_admin, remove_admin,
     get_all_channels, add_channel, remove_channel, add_channel_by_username,
-    get_active_giveaways, get_finished_giveaways
+    get_active_giveaways, get_finished_giveaways,
+    count_outbox_by_status, get_stuck_outbox, retry_failed_outbox,
+    get_recent_broadcasts, finish_broadcast, add_bonus_tickets
 )
+from database.models import BroadcastStatus
+from utils.outbox import outbox_worker
+from utils.stats import build_stats_text
+from utils.profiler import profiler
+from config import config
+
+router = Router(name="admin")
 
-router = Router()
+# Защита от опечатки в /bonus: билетов за одно начисление
+MAX_BONUS_TICKETS = 1000
 
 
 # Управление администраторами
@@ -449,6 +465,172 @@ async def callback_view_giveaways(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
+# Очередь отправки в каналы
+@router.callback_query(F.data == "outbox_status")
+async def callback_outbox_status(callback: CallbackQuery, state: FSMContext):
+    """Состояние outbox и проблемные операции"""
+    await state.clear()
+    counts = await count_outbox_by_status()
+    text = MESSAGES["outbox_status"].format(
+        pending=counts.get("pending", 0),
+        sending=counts.get("sending", 0),
+        sent=counts.get("sent", 0),
+        failed=counts.get("failed", 0)
+    )
+    
+    stuck = await get_stuck_outbox(limit=10)
+    if stuck:
+        items = [
+            ADMIN_OUTBOX_ITEM.format(
+                id=item.id,
+                kind=item.kind,
+                chat_id=item.chat_id,
+                status=item.status,
+                attempts=item.attempts,
+                error=html.escape((item.last_error or "")[:200])
+            )
+            for item in stuck
+        ]
+        text += MESSAGES["outbox_stuck"].format(items="\n\n".join(items))
+    
+    try:
+        await callback.message.edit_text(
+            text,
+            reply_markup=get_outbox_keyboard(has_failed=counts.get("failed", 0) > 0)
+        )
+    except TelegramBadRequest:
+        pass  # Ничего не изменилось с прошлого обновления
+    await callback.answer()
+
+
+@router.callback_query(F.data == "outbox_retry_failed")
+async def callback_outbox_retry_failed(callback: CallbackQuery, state: FSMContext):
+    """Повторная постановка недоставленных операций"""
+    count = await retry_failed_outbox()
+    outbox_worker.wakeup()
+    await callback.answer(MESSAGES["outbox_retried"].format(count=count), show_alert=True)
+    await callback_outbox_status(callback, state)
+
+
+# Рассылки участникам
+BROADCAST_STATUS_LABELS = {
+    "pending": "⏳ в очереди",
+    "running": "📤 идет",
+    "done": "✅ завершена",
+    "cancelled": "⏹ остановлена",
+}
+
+
+@router.callback_query(F.data == "broadcasts_status")
+async def callback_broadcasts_status(callback: CallbackQuery, state: FSMContext):
+    """Прогресс последних рассылок"""
+    await state.clear()
+    broadcasts = await get_recent_broadcasts(limit=5)
+    text = MESSAGES["broadcasts_status"]
+    if broadcasts:
+        items = []
+        for b in broadcasts:
+            processed = b.sent_count + b.blocked_count + b.failed_count
+            items.append(ADMIN_BROADCAST_ITEM.format(
+                id=b.id,
+                giveaway_id=b.giveaway_id,
+                status=BROADCAST_STATUS_LABELS.get(b.status, b.status),
+                processed=processed,
+                total=b.total,
+                percent=min(100, processed * 100 // b.total) if b.total else 0,
+                sent=b.sent_count,
+                blocked=b.blocked_count,
+                failed=b.failed_count
+            ))
+        text += "\n\n" + "\n\n".join(items)
+    else:
+        text += MESSAGES["broadcasts_empty"]
+    
+    active_ids = [
+        b.id for b in broadcasts
+        if b.status in (BroadcastStatus.PENDING.value, BroadcastStatus.RUNNING.value)
+    ]
+    try:
+        await callback.message.edit_text(text, reply_markup=get_broadcasts_keyboard(active_ids))
+    except TelegramBadRequest:
+        pass  # Ничего не изменилось с прошлого обновления
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("broadcast_cancel_"))
+async def callback_broadcast_cancel(callback: CallbackQuery, state: FSMContext):
+    """Остановка рассылки: воркер заметит ее на следующей контрольной точке"""
+    broadcast_id = int(callback.data.split("_")[2])
+    await finish_broadcast(broadcast_id, BroadcastStatus.CANCELLED.value)
+    await callback.answer(MESSAGES["broadcast_cancelled"], show_alert=True)
+    await callback_broadcasts_status(callback, state)
+
+
+# Статистика: планировщик, кэши, очереди и задержки из счетчиков в памяти
+@router.message(Command("stats"))
+async def cmd_stats(message: Message, state: FSMContext, fsm_storage: BaseStorage):
+    """Обработчик команды /stats"""
+    await state.clear()
+    await message.answer(await build_stats_text(fsm_storage), reply_markup=get_stats_keyboard())
+
+
+@router.callback_query(F.data == "stats")
+async def callback_stats(callback: CallbackQuery, state: FSMContext, fsm_storage: BaseStorage):
+    """Экран статистики из админ-панели"""
+    await state.clear()
+    try:
+        await callback.message.edit_text(await build_stats_text(fsm_storage), reply_markup=get_stats_keyboard())
+    except TelegramBadRequest:
+        pass  # Ничего не изменилось с прошлого обновления
+    await callback.answer()
+
+
+# Бонусные билеты: шанс участника на победу пропорционален числу его билетов
+@router.message(Command("bonus"))
+async def cmd_bonus(message: Message, command: CommandObject):
+    """Обработчик команды /bonus ID_розыгрыша ID_пользователя билетов"""
+    try:
+        giveaway_id, user_id, tickets = (int(arg) for arg in (command.args or "").split())
+    except ValueError:
+        giveaway_id = user_id = tickets = 0
+    if giveaway_id <= 0 or not 1 <= tickets <= MAX_BONUS_TICKETS:
+        await message.answer(MESSAGES["bonus_usage"].format(max_tickets=MAX_BONUS_TICKETS))
+        return
+    if await add_bonus_tickets(giveaway_id, user_id, tickets):
+        logging.info(f"Админ {message.from_user.id} начислил {tickets} билетов {user_id} в розыгрыше #{giveaway_id}")
+        await message.answer(MESSAGES["bonus_added"].format(user_id=user_id, tickets=tickets, giveaway_id=giveaway_id))
+    else:
+        await message.answer(MESSAGES["bonus_not_added"].format(giveaway_id=giveaway_id))
+
+
+# Профиль event loop по запросу: снимается в фоне, результат приходит файлом
+@router.message(Command("profile"))
+async def cmd_profile(message: Message, command: CommandObject):
+    """Обработчик команды /profile [секунды]"""
+    seconds = config.PROFILE_SECONDS
+    if command.args:
+        try:
+            seconds = int(command.args.strip())
+        except ValueError:
+            seconds = 0
+        if not 1 <= seconds <= config.PROFILE_MAX_SECONDS:
+            await message.answer(MESSAGES["profile_invalid_seconds"].format(max_seconds=config.PROFILE_MAX_SECONDS))
+            return
+    if not profiler.start(message.bot, message.chat.id, seconds):
+        await message.answer(MESSAGES["profile_busy"])
+        return
+    await message.answer(MESSAGES["profile_started"].format(seconds=seconds))
+
+
+@router.callback_query(F.data == "profile")
+async def callback_profile(callback: CallbackQuery):
+    """Кнопка профиля на экране статистики"""
+    if not profiler.start(callback.bot, callback.message.chat.id, config.PROFILE_SECONDS):
+        await callback.answer(MESSAGES["profile_busy"], show_alert=True)
+        return
+    await callback.answer(MESSAGES["profile_started"].format(seconds=config.PROFILE_SECONDS), show_alert=True)
+
+
 # Общие callback'и для отмены и возврата
 @router.callback_query(F.data == "cancel")
 async def callback_cancel(callback: CallbackQuery, state: FSMContext):
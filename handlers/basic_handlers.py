@@ -6,12 +6,15 @@ from aiogram.fsm.context import FSMContext
 
 from texts.messages import MESSAGES, BUTTONS
 from utils.keyboards import get_main_admin_keyboard, get_participate_keyboard
+from utils.membership import membership_cache
+from utils.metrics import giveaway_joins, joins_last_minute
 from database.database import (
     add_participant, get_participants_count, 
     get_giveaway, update_giveaway_message_id, is_admin
 )
+from database.models import JoinResult
 
-router = Router()
+router = Router(name="basic")
 
 
 # Удалён универсальный логгер сообщений, чтобы не блокировать другие хендлеры
@@ -77,8 +80,8 @@ async def callback_participate(callback: CallbackQuery):
     try:
         giveaway_id = int(callback.data.split("_")[1])
         
-        # Получаем данные розыгрыша
-        giveaway = await get_giveaway(giveaway_id)
+        # Получаем данные розыгрыша (список участников для проверки не нужен)
+        giveaway = await get_giveaway(giveaway_id, with_participants=False)
         if not giveaway:
             await callback.answer("❌ Розыгрыш не найден!", show_alert=True)
             return
@@ -87,16 +90,25 @@ async def callback_participate(callback: CallbackQuery):
             await callback.answer(MESSAGES["giveaway_ended"], show_alert=True)
             return
         
-        # Добавляем участника
+        # Проверяем подписку на канал (ответ кэшируется, повторные нажатия не обращаются к Bot API)
         user = callback.from_user
-        success = await add_participant(
+        if giveaway.require_subscription and not await membership_cache.is_member(
+            callback.bot, giveaway.channel_id, user.id
+        ):
+            await callback.answer(MESSAGES["subscription_required"], show_alert=True)
+            return
+        
+        # Добавляем участника
+        result = await add_participant(
             giveaway_id=giveaway_id,
             user_id=user.id,
             username=user.username,
             first_name=user.first_name
         )
         
-        if success:
+        if result == JoinResult.JOINED:
+            giveaway_joins.inc(str(giveaway_id))
+            joins_last_minute.inc()
             await callback.answer(MESSAGES["participation_success"], show_alert=True)
             
             # Обновляем счетчик участников в кнопке
@@ -108,6 +120,9 @@ async def callback_participate(callback: CallbackQuery):
             except Exception as e:
                 logging.warning(f"Не удалось обновить клавиатуру: {e}")
                 
+        elif result == JoinResult.CLOSED:
+            # Завершение захвачено между проверкой статуса и вставкой
+            await callback.answer(MESSAGES["giveaway_ended"], show_alert=True)
         else:
             await callback.answer(MESSAGES["already_participating"], show_alert=True)
             
@@ -1,4 +1,5 @@
 import logging
+from typing import Optional
 from datetime import datetime
 from aiogram import Dispatcher, Router, F
 from aiogram.types import Message, CallbackQuery, ContentType
@@ -10,28 +11,34 @@ from states.admin_states import (
     ViewGiveawaysStates
 )
 from texts.messages import (
-    MESSAGES, GIVEAWAY_POST_TEMPLATE, ADMIN_GIVEAWAY_ITEM
+    MESSAGES, GIVEAWAY_POST_TEMPLATE, ADMIN_GIVEAWAY_ITEM, BROADCAST_RESULTS_TEMPLATE
 )
 from utils.keyboards import (
     get_skip_media_keyboard, get_channels_keyboard, 
     get_confirm_keyboard, get_back_to_menu_keyboard,
     get_giveaways_list_keyboard, get_giveaway_details_keyboard,
     get_edit_fields_keyboard, get_participate_keyboard,
-    get_delete_confirmation_keyboard
+    get_delete_confirmation_keyboard, get_require_subscription_keyboard
 )
 from utils.datetime_utils import (
     parse_datetime, format_datetime, is_future_datetime
 )
 from utils.scheduler import schedule_giveaway_finish, cancel_giveaway_schedule
+from utils.outbox import outbox_worker
+from utils.broadcast import broadcast_runner
 from database.database import (
     get_all_channels, create_giveaway, update_giveaway_message_id,
     get_active_giveaways, get_finished_giveaways, get_giveaway,
     get_participants_count, delete_giveaway, get_winners,
     get_finished_giveaways_page, count_finished_giveaways,
-    update_giveaway_fields
+    update_giveaway_fields, enqueue_outbox,
+    create_broadcast, has_unfinished_broadcast
 )
 
-router = Router()
+router = Router(name="giveaway")
+
+# Статус личного уведомления победителя в деталях розыгрыша
+WINNER_DM_ICONS = {"pending": "⏳", "sent": "📩", "blocked": "🚫", "failed": "⚠️"}
 
 
 # Создание розыгрыша
@@ -164,6 +171,19 @@ async def callback_select_channel(callback: CallbackQuery, state: FSMContext):
     """Выбор канала для розыгрыша"""
     channel_id = int(callback.data.split("_")[2])
     await state.update_data(channel_id=channel_id)
+    await state.set_state(CreateGiveawayStates.WAITING_SUBSCRIPTION)
+    
+    await callback.message.edit_text(
+        MESSAGES["ask_require_subscription"],
+        reply_markup=get_require_subscription_keyboard()
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("require_subscription_"), StateFilter(CreateGiveawayStates.WAITING_SUBSCRIPTION))
+async def callback_require_subscription(callback: CallbackQuery, state: FSMContext):
+    """Выбор: участвовать могут только подписчики канала или все"""
+    await state.update_data(require_subscription=callback.data == "require_subscription_yes")
     await state.set_state(CreateGiveawayStates.WAITING_END_TIME)
     
     await callback.message.edit_text(MESSAGES["enter_end_time"])
@@ -199,6 +219,7 @@ async def process_end_time(message: Message, state: FSMContext):
             description=data["description"][:100] + "..." if len(data["description"]) > 100 else data["description"],
             winner_places=data.get("winner_places", 1),
             channel=channel_name,
+            subscription="Да" if data.get("require_subscription") else "Нет",
             end_time=format_datetime(end_time),
             media=media_info
         )
@@ -228,7 +249,8 @@ async def confirm_create_giveaway(callback: CallbackQuery, state: FSMContext):
             created_by=callback.from_user.id,
             winner_places=data.get("winner_places", 1),
             media_type=media_data["type"] if media_data else None,
-            media_file_id=media_data["file_id"] if media_data else None
+            media_file_id=media_data["file_id"] if media_data else None,
+            require_subscription=data.get("require_subscription", False)
         )
         
         if not giveaway:
@@ -413,8 +435,8 @@ async def callback_giveaway_details(callback: CallbackQuery, state: FSMContext):
     
     # Формируем детали
     channel_name = giveaway.channel.channel_name if giveaway.channel else "Неизвестен"
-    status_emoji = "🟢" if giveaway.status == "active" else "🔴"
-    status_text = "Активный" if giveaway.status == "active" else "Завершенный"
+    status_emoji = {"active": "🟢", "finishing": "🟡"}.get(giveaway.status, "🔴")
+    status_text = {"active": "Активный", "finishing": "Подводятся итоги"}.get(giveaway.status, "Завершенный")
     
     # Список победителей (если завершен)
     winners_block = ""
@@ -427,7 +449,8 @@ async def callback_giveaway_details(callback: CallbackQuery, state: FSMContext):
                 name = w.first_name or "Пользователь"
                 if w.username:
                     name = f"@{w.username}"
-                lines.append(f"{place_emoji} <b>{w.place} место:</b> {name}")
+                dm_icon = WINNER_DM_ICONS.get(w.dm_status, "")
+                lines.append(f"{place_emoji} <b>{w.place} место:</b> {name} {dm_icon}".rstrip())
             winners_block = "\n\n" + "\n".join(lines)
     
     details_text = MESSAGES["giveaway_details"].format(
@@ -451,6 +474,40 @@ async def callback_giveaway_details(callback: CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
+# Рассылка итогов всем участникам
+@router.callback_query(F.data.startswith("broadcast_results_"))
+async def callback_broadcast_results(callback: CallbackQuery, state: FSMContext):
+    """Ставит в очередь рассылку итогов завершенного розыгрыша всем участникам"""
+    giveaway_id = int(callback.data.split("_")[2])
+    giveaway = await get_giveaway(giveaway_id, with_participants=False)
+    
+    if not giveaway or giveaway.status != "finished":
+        await callback.answer("❌ Розыгрыш не найден", show_alert=True)
+        return
+    
+    if await has_unfinished_broadcast(giveaway_id):
+        await callback.answer(MESSAGES["broadcast_exists"], show_alert=True)
+        return
+    
+    winners = await get_winners(giveaway_id)
+    lines = []
+    for w in winners:
+        name = f"@{w.username}" if w.username else (w.first_name or "Пользователь")
+        if len(winners) == 1:
+            lines.append(f"🏆 <b>Победитель:</b> {name}")
+        else:
+            place_emoji = {1: "🥇", 2: "🥈", 3: "🥉"}.get(w.place, f"{w.place}️⃣")
+            lines.append(f"{place_emoji} <b>{w.place} место:</b> {name}")
+    
+    text = BROADCAST_RESULTS_TEMPLATE.format(
+        title=giveaway.title,
+        winners_list="\n".join(lines) or "😔 Победителей нет."
+    )
+    await create_broadcast(giveaway_id, text, created_by=callback.from_user.id)
+    broadcast_runner.wakeup()
+    await callback.answer(MESSAGES["broadcast_created"], show_alert=True)
+
+
 # Удаление розыгрыша
 @router.callback_query(F.data.startswith("delete_giveaway_"))
 async def callback_delete_giveaway(callback: CallbackQuery, state: FSMContext):
@@ -662,66 +719,85 @@ async def process_new_end_time(message: Message, state: FSMContext):
 
 
 async def update_channel_giveaway_post(bot, giveaway) -> None:
-    """Переопубликовывает пост розыгрыша в канале, чтобы гарантировать сохранение клавиатуры.
-    Всегда отправляет новое сообщение, удаляет старое и обновляет message_id."""
+    """Ставит перепубликацию поста розыгрыша в outbox. Несколько правок подряд дают одну перепубликацию."""
     try:
-        participants_count = await get_participants_count(giveaway.id)
-        post_text = GIVEAWAY_POST_TEMPLATE.format(
-            title=giveaway.title,
-            description=giveaway.description,
-            winner_places=getattr(giveaway, "winner_places", 1),
-            end_time=format_datetime(giveaway.end_time),
-            participants=participants_count,
+        await enqueue_outbox(
+            "repost_giveaway",
+            chat_id=giveaway.channel_id,
+            giveaway_id=giveaway.id,
+            dedupe_key=f"repost_giveaway:{giveaway.id}"
         )
-        keyboard = get_participate_keyboard(giveaway.id, participants_count)
-
-        sent_message = None
-        if giveaway.media_type == "photo" and giveaway.media_file_id:
-            sent_message = await bot.send_photo(
-                chat_id=giveaway.channel_id,
-                photo=giveaway.media_file_id,
-                caption=post_text,
-                reply_markup=keyboard
-            )
-        elif giveaway.media_type == "video" and giveaway.media_file_id:
-            sent_message = await bot.send_video(
-                chat_id=giveaway.channel_id,
-                video=giveaway.media_file_id,
-                caption=post_text,
-                reply_markup=keyboard
-            )
-        elif giveaway.media_type == "animation" and giveaway.media_file_id:
-            sent_message = await bot.send_animation(
-                chat_id=giveaway.channel_id,
-                animation=giveaway.media_file_id,
-                caption=post_text,
-                reply_markup=keyboard
-            )
-        elif giveaway.media_type == "document" and giveaway.media_file_id:
-            sent_message = await bot.send_document(
-                chat_id=giveaway.channel_id,
-                document=giveaway.media_file_id,
-                caption=post_text,
-                reply_markup=keyboard
-            )
-        else:
-            sent_message = await bot.send_message(
-                chat_id=giveaway.channel_id,
-                text=post_text,
-                reply_markup=keyboard
-            )
+        outbox_worker.wakeup()
+    except Exception as e:
+        logging.error(f"Не удалось поставить перепубликацию розыгрыша #{giveaway.id} в очередь: {e}")
 
-        if sent_message:
-            # Удаляем старое сообщение, если было
-            if giveaway.message_id:
-                try:
-                    await bot.delete_message(chat_id=giveaway.channel_id, message_id=giveaway.message_id)
-                except Exception:
-                    pass
-            # Сохраняем новый message_id
-            await update_giveaway_message_id(giveaway.id, sent_message.message_id)
-    except Exception:
-        pass
+
+async def publish_giveaway_post(bot, giveaway) -> None:
+    """Переопубликовывает пост розыгрыша в канале, чтобы гарантировать сохранение клавиатуры.
+    Всегда отправляет новое сообщение, удаляет старое и обновляет message_id.
+    Ошибки отправки пробрасываются - повтором занимается outbox."""
+    sent_message = await send_giveaway_post(bot, giveaway)
+    await replace_giveaway_post(bot, giveaway, giveaway.message_id, sent_message.message_id)
+
+
+async def send_giveaway_post(bot, giveaway):
+    """Отправляет в канал новый пост розыгрыша с актуальным числом участников и возвращает сообщение"""
+    participants_count = await get_participants_count(giveaway.id)
+    post_text = GIVEAWAY_POST_TEMPLATE.format(
+        title=giveaway.title,
+        description=giveaway.description,
+        winner_places=getattr(giveaway, "winner_places", 1),
+        end_time=format_datetime(giveaway.end_time),
+        participants=participants_count,
+    )
+    keyboard = get_participate_keyboard(giveaway.id, participants_count)
+
+    if giveaway.media_type == "photo" and giveaway.media_file_id:
+        sent_message = await bot.send_photo(
+            chat_id=giveaway.channel_id,
+            photo=giveaway.media_file_id,
+            caption=post_text,
+            reply_markup=keyboard
+        )
+    elif giveaway.media_type == "video" and giveaway.media_file_id:
+        sent_message = await bot.send_video(
+            chat_id=giveaway.channel_id,
+            video=giveaway.media_file_id,
+            caption=post_text,
+            reply_markup=keyboard
+        )
+    elif giveaway.media_type == "animation" and giveaway.media_file_id:
+        sent_message = await bot.send_animation(
+            chat_id=giveaway.channel_id,
+            animation=giveaway.media_file_id,
+            caption=post_text,
+            reply_markup=keyboard
+        )
+    elif giveaway.media_type == "document" and giveaway.media_file_id:
+        sent_message = await bot.send_document(
+            chat_id=giveaway.channel_id,
+            document=giveaway.media_file_id,
+            caption=post_text,
+            reply_markup=keyboard
+        )
+    else:
+        sent_message = await bot.send_message(
+            chat_id=giveaway.channel_id,
+            text=post_text,
+            reply_markup=keyboard
+        )
+
+    return sent_message
+
+
+async def replace_giveaway_post(bot, giveaway, old_message_id: Optional[int], new_message_id: int) -> None:
+    """Удаляет старый пост (если был и это не новый) и сохраняет message_id нового"""
+    if old_message_id and old_message_id != new_message_id:
+        try:
+            await bot.delete_message(chat_id=giveaway.channel_id, message_id=old_message_id)
+        except Exception:
+            pass
+    await update_giveaway_message_id(giveaway.id, new_message_id)
 
 
 def setup_giveaway_handlers(dp: Dispatcher):
@@ -1,33 +1,62 @@
 import asyncio
 import logging
-import sys
+from aiohttp import web
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
 from aiogram.enums import ParseMode
 from aiogram.types import BotCommand
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
 
 from config import config
 from database.database import init_db
 from handlers import setup_handlers
 from middlewares.auth import AdminMiddleware
-from utils.scheduler import setup_scheduler
+from middlewares.query_budget import QueryBudgetMiddleware
+from middlewares.update_recorder import setup_update_recorder
+from utils.scheduler import setup_scheduler, shutdown_scheduler
+from utils.http_session import create_bot_session
+from utils.fsm_storage import create_fsm_storage
+from utils.metrics import start_metrics_server
+from utils.logging_setup import setup_logging, stop_logging
+from utils.tracing import setup_tracing, exporter as trace_exporter
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot):
+    """Прием обновлений через webhook: так можно запустить несколько экземпляров за балансировщиком"""
+    app = web.Application()
+    SimpleRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        secret_token=config.WEBHOOK_SECRET or None
+    ).register(app, path=config.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+    
+    await bot.set_webhook(
+        url=f"{config.WEBHOOK_URL}{config.WEBHOOK_PATH}",
+        secret_token=config.WEBHOOK_SECRET or None,
+        allowed_updates=dp.resolve_used_update_types()
+    )
+    
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, host=config.WEBHOOK_HOST, port=config.WEBHOOK_PORT)
+    await site.start()
+    logging.info(f"Webhook слушает {config.WEBHOOK_HOST}:{config.WEBHOOK_PORT}{config.WEBHOOK_PATH}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
 
 
 async def main():
     """Основная функция запуска бота"""
     # Настройка логирования
-    logging.basicConfig(
-        level=logging.INFO,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler('bot.log', encoding='utf-8'),
-            logging.StreamHandler(sys.stdout)
-        ]
-    )
+    setup_logging()
     
     # Инициализация бота и диспетчера
     bot = Bot(
         token=config.BOT_TOKEN,
+        session=create_bot_session(),
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     
@@ -40,11 +69,21 @@ async def main():
     except Exception:
         pass
     
-    dp = Dispatcher()
+    # Состояния диалогов хранятся в БД и переживают перезапуск
+    dp = Dispatcher(storage=create_fsm_storage())
     
     # Инициализация базы данных
     await init_db()
     
+    # Запись апдейтов для воспроизведения (UPDATE_RECORD_FILE)
+    update_recorder = setup_update_recorder(dp)
+    
+    # Трассировка выбранной доли апдейтов (TRACE_SAMPLE_RATE)
+    setup_tracing(dp)
+    
+    # Подсчет запросов к БД на апдейт с предупреждением о превышении бюджета
+    dp.update.outer_middleware(QueryBudgetMiddleware())
+    
     # Настройка middleware для проверки админов
     dp.message.middleware(AdminMiddleware())
     dp.callback_query.middleware(AdminMiddleware())
@@ -55,12 +94,26 @@ async def main():
     # Настройка планировщика для автоматического завершения розыгрышей
     await setup_scheduler(bot)
     
+    # HTTP-эндпоинт метрик (если задан METRICS_PORT)
+    metrics_runner = await start_metrics_server()
+    
     try:
         # Запуск бота
         logging.info("Бот запущен!")
-        await dp.start_polling(bot)
+        if config.WEBHOOK_URL:
+            await run_webhook(dp, bot)
+        else:
+            await dp.start_polling(bot)
     finally:
+        await shutdown_scheduler()
+        if metrics_runner:
+            await metrics_runner.cleanup()
+        await dp.storage.close()
         await bot.session.close()
+        trace_exporter.stop()
+        if update_recorder:
+            update_recorder.stop()
+        stop_logging()
 
 
 if __name__ == "__main__":
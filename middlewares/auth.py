@@ -4,11 +4,16 @@ from aiogram.types import TelegramObject, Message, CallbackQuery
 
 from database.database import is_admin, update_admin_profile
 from texts.messages import MESSAGES
+from utils.tracing import traced
+
+# Команды админ-панели: не-админу на них отвечаем отказом
+ADMIN_COMMANDS = ("/admin", "/stats", "/profile", "/bonus")
 
 
 class AdminMiddleware(BaseMiddleware):
     """Middleware для проверки админских прав"""
     
+    @traced("middleware AdminMiddleware")
     async def __call__(
         self,
         handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
@@ -43,8 +48,8 @@ class AdminMiddleware(BaseMiddleware):
             else:
                 # Если не админ и это админская команда - отправляем сообщение об отказе
                 if isinstance(event, Message):
-                    # Если это команда /admin - отправляем сообщение об отказе
-                    if event.text and event.text == "/admin":
+                    # Если это админская команда - отправляем сообщение об отказе
+                    if event.text and event.text.split()[0].split("@")[0] in ADMIN_COMMANDS:
                         await event.answer(MESSAGES["access_denied"])
                         return
                     # Для остальных сообщений - пропускаем к хендлеру (он решит игнорировать или нет)
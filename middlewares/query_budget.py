@@ -0,0 +1,51 @@
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from config import config
+from database.query_log import QueryStats, current_query_stats
+from utils.metrics import event_action
+
+
+class QueryBudgetMiddleware(BaseMiddleware):
+    """
+    Outer-middleware апдейтов: считает запросы к БД за апдейт и предупреждает,
+    если их больше UPDATE_QUERY_BUDGET или они заняли больше UPDATE_DB_TIME_BUDGET_MS.
+    В предупреждение попадает самый частый запрос - так видны N+1 и лишняя жадная загрузка.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        update_id = event.update_id if isinstance(event, Update) else None
+        stats = QueryStats(update_id)
+        token = current_query_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            current_query_stats.reset(token)
+            self._check_budget(event, stats, time.perf_counter() - started)
+
+    @staticmethod
+    def _check_budget(event: TelegramObject, stats: QueryStats, elapsed: float):
+        over_count = config.UPDATE_QUERY_BUDGET and stats.count > config.UPDATE_QUERY_BUDGET
+        over_time = config.UPDATE_DB_TIME_BUDGET_MS and stats.seconds * 1000 > config.UPDATE_DB_TIME_BUDGET_MS
+        if not (over_count or over_time):
+            return
+        inner = event.event if isinstance(event, Update) else event
+        event_type, action = event_action(inner, {})
+        message = (
+            f"Апдейт {stats.update_id} ({event_type} {action}): {stats.count} запросов к БД, "
+            f"{stats.seconds * 1000:.0f} мс в БД из {elapsed * 1000:.0f} мс"
+        )
+        statement, repeats = stats.most_repeated()
+        if repeats > 1:
+            message += f"; повторяется {repeats} раз: {' '.join(str(statement).split())[:300]}"
+        logging.warning(message)
@@ -0,0 +1,209 @@
+"""
+Запись входящих апдейтов в сжатый лог для воспроизведения (benchmarks/replay_updates.py).
+
+Каждая строка gzip-файла - {"ts": время получения, "update": обезличенный апдейт}.
+Пользователи, личные чаты, группы и каналы получают стабильные псевдонимы (хеш id с солью), имена и
+произвольный текст заменяются. Команды и callback_data сохраняются - по ним идет маршрутизация;
+id пользователей и чатов внутри callback_data (remove_admin_<id>, select_channel_<id>) заменяются псевдонимами.
+Сериализация, обезличивание и сжатие идут в фоновом потоке, апдейт не ждет диска.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from config import config
+
+# Личные данные, которые не нужны для воспроизведения, удаляются целиком
+_DROP_KEYS = {
+    "last_name", "language_code", "bio", "phone_number", "contact", "location", "venue",
+    "invite_link", "emoji_status_custom_emoji_id", "sender_chat",
+}
+_TEXT_KEYS = {"text", "caption"}
+_GROUP_CHAT_TYPES = {"group", "supergroup", "channel"}
+
+# Префиксы callback_data (utils/keyboards.py), за которыми идет id пользователя или чата
+USER_ID_CALLBACKS = ("remove_admin_",)
+CHAT_ID_CALLBACKS = ("select_channel_", "remove_channel_")
+_CALLBACK_KEYS = {"data", "callback_data"}
+
+
+class Anonymizer:
+    """Стабильные псевдонимы пользователей: одинаковый id с одной солью дает одинаковый псевдоним"""
+
+    def __init__(self, salt: str = ""):
+        self.salt = (salt or os.urandom(16).hex()).encode()
+
+    def user_id(self, user_id: int) -> int:
+        digest = hashlib.blake2b(str(user_id).encode(), key=self.salt[:64], digest_size=5).digest()
+        # Диапазон обычных id Telegram, чтобы псевдонимы не путались с каналами (отрицательные id)
+        return 1_000_000_000 + int.from_bytes(digest, "big") % 1_000_000_000_000
+
+    def chat_id(self, chat_id: int) -> int:
+        """Псевдоним группы или канала: отрицательный, как у настоящих, и не пересекается с пользователями"""
+        digest = hashlib.blake2b(f"chat:{chat_id}".encode(), key=self.salt[:64], digest_size=5).digest()
+        return -1_000_000_000_000 - int.from_bytes(digest, "big") % 1_000_000_000_000
+
+    def callback_data(self, data: str) -> str:
+        """id пользователей и чатов в callback_data заменяются теми же псевдонимами, что и в самих апдейтах"""
+        for prefixes, pseudonym in ((USER_ID_CALLBACKS, self.user_id), (CHAT_ID_CALLBACKS, self.chat_id)):
+            for prefix in prefixes:
+                suffix = data[len(prefix):]
+                if data.startswith(prefix) and suffix.lstrip("-").isdigit():
+                    return f"{prefix}{pseudonym(int(suffix))}"
+        return data
+
+    def update(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        return self._walk(data)
+
+    def _walk(self, value: Any) -> Any:
+        if isinstance(value, list):
+            return [self._walk(item) for item in value]
+        if not isinstance(value, dict):
+            return value
+
+        result = {}
+        is_person = "is_bot" in value or value.get("type") == "private"
+        is_group = not is_person and value.get("type") in _GROUP_CHAT_TYPES and isinstance(value.get("id"), int)
+        for key, item in value.items():
+            if key in _DROP_KEYS:
+                continue
+            if is_person and key == "id" and isinstance(item, int):
+                result[key] = self.user_id(item)
+            elif is_person and key in ("first_name", "title"):
+                result[key] = "User"
+            elif is_person and key == "username":
+                result[key] = f"user{self.user_id(value['id'])}" if isinstance(value.get("id"), int) else "user"
+            elif is_group and key == "id":
+                result[key] = self.chat_id(item)
+            elif is_group and key in ("title", "username"):
+                result[key] = f"chat{self.chat_id(value['id'])}"
+            elif key in _CALLBACK_KEYS and isinstance(item, str):
+                result[key] = self.callback_data(item)
+            elif key in _TEXT_KEYS and isinstance(item, str):
+                result[key] = _mask_text(item)
+            elif key in ("entities", "caption_entities") and isinstance(item, list):
+                # Смещения остаются верными: маскирование сохраняет длину текста
+                result[key] = [entity for entity in item if entity.get("type") == "bot_command"]
+            else:
+                result[key] = self._walk(item)
+        return result
+
+
+def _mask_text(text: str) -> str:
+    """Команда сохраняется (без аргументов), остальной текст заменяется той же длины"""
+    if text.startswith("/"):
+        command, _, rest = text.partition(" ")
+        return command + (" " + "x" * len(rest) if rest else "")
+    return "x" * len(text)
+
+
+class UpdateRecorder:
+    """Фоновый поток, дописывающий апдейты в gzip-файл (несколько запусков - несколько gzip-членов)"""
+
+    def __init__(self, path: str, max_updates: int, salt: str = ""):
+        self.path = path
+        self.max_updates = max_updates
+        self.anonymizer = Anonymizer(salt)
+        self.recorded = 0
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[Tuple[float, Update]]]" = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="update-recorder", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def record(self, update: Update):
+        if self.recorded >= self.max_updates:
+            return
+        self.recorded += 1
+        try:
+            self._queue.put_nowait((time.time(), update))
+        except queue.Full:
+            self.dropped += 1  # Диск не успевает - лучше потерять апдейт в записи, чем задержать обработку
+
+    def _run(self):
+        unflushed = False
+        with gzip.open(self.path, "at", encoding="utf-8") as file:
+            while True:
+                try:
+                    item = self._queue.get(timeout=1)
+                except queue.Empty:
+                    # Сброс после секунды тишины, а не на каждый апдейт: каждый сброс ухудшает сжатие
+                    if unflushed:
+                        file.flush()
+                        unflushed = False
+                    continue
+                if item is None:
+                    return
+                received_at, update = item
+                try:
+                    data = self.anonymizer.update(update.model_dump(mode="json", exclude_none=True, by_alias=True))
+                except Exception as e:
+                    logging.warning(f"Не удалось записать апдейт {update.update_id}: {e}")
+                    continue
+                file.write(json.dumps({"ts": round(received_at, 6), "update": data}, ensure_ascii=False) + "\n")
+                unflushed = True
+
+
+class UpdateRecorderMiddleware(BaseMiddleware):
+    """Outer-middleware апдейтов: отдает апдейт в запись и сразу передает дальше"""
+
+    def __init__(self, recorder: UpdateRecorder):
+        self.recorder = recorder
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if isinstance(event, Update):
+            self.recorder.record(event)
+        return await handler(event, data)
+
+
+def setup_update_recorder(dp) -> Optional[UpdateRecorder]:
+    """Включает запись апдейтов, если задан UPDATE_RECORD_FILE"""
+    if not config.UPDATE_RECORD_FILE:
+        return None
+    recorder = UpdateRecorder(config.UPDATE_RECORD_FILE, config.UPDATE_RECORD_MAX_UPDATES, config.UPDATE_RECORD_SALT)
+    recorder.start()
+    dp.update.outer_middleware(UpdateRecorderMiddleware(recorder))
+    logging.info(f"Запись апдейтов в {config.UPDATE_RECORD_FILE} (до {config.UPDATE_RECORD_MAX_UPDATES})")
+    return recorder
+
+
+def read_recording(path: str) -> Iterator[Tuple[float, Dict[str, Any]]]:
+    """(время получения, апдейт) из лога записи по порядку"""
+    with gzip.open(path, "rt", encoding="utf-8") as file:
+        try:
+            for line in file:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # Оборванная последняя строка после аварийной остановки
+                    continue
+                yield entry["ts"], entry["update"]
+        except EOFError:
+            # Бот остановлен без закрытия файла: все сброшенное до этого прочитано
+            return
@@ -13,6 +13,7 @@ class CreateGiveawayStates(StatesGroup):
     WAITING_MEDIA = State()         # Ожидание медиа (фото/видео/гиф)
     WAITING_WINNER_PLACES = State() # Ожидание количества призовых мест
     WAITING_CHANNEL = State()       # Выбор канала
+    WAITING_SUBSCRIPTION = State()  # Только для подписчиков канала?
     WAITING_END_TIME = State()      # Ожидание даты/времени окончания
     CONFIRM_CREATION = State()      # Подтверждение создания
 
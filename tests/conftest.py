@@ -0,0 +1,11 @@
+"""
+Тесты работают с временной SQLite-базой: движок создается при импорте database.database,
+поэтому окружение задается до импорта модулей бота.
+"""
+import os
+import tempfile
+
+_directory = tempfile.mkdtemp(prefix="giveaway_tests_")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_directory, 'test.db')}"
+os.environ.setdefault("BOT_TOKEN", "123456:TEST-TOKEN")
+os.environ.setdefault("MAIN_ADMIN_ID", "1")
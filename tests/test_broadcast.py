@@ -0,0 +1,42 @@
+import asyncio
+import time
+from unittest import mock
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from utils.broadcast import BroadcastRunner
+from utils.rate_limiter import TokenBucket
+
+
+class FloodOnceBot:
+    """Первая отправка получает RetryAfter, остальные проходят"""
+
+    def __init__(self, retry_after: int):
+        self.retry_after = retry_after
+        self.sent_at = []
+
+    async def send_message(self, chat_id: int, text: str, **kwargs):
+        self.sent_at.append(time.monotonic())
+        if len(self.sent_at) == 1:
+            raise TelegramRetryAfter(SendMessage(chat_id=chat_id, text=text), "Flood control", self.retry_after)
+
+
+def test_retry_after_pauses_all_broadcast_senders():
+    async def scenario():
+        limiter = TokenBucket(rate=1000, capacity=100)
+        bot = FloodOnceBot(retry_after=1)
+        runner = BroadcastRunner(concurrency=2, chunk_size=10, poll_interval=1)
+        runner._bot = bot
+        started = time.monotonic()
+        with mock.patch("utils.broadcast.dm_limiter", limiter):
+            first = asyncio.create_task(runner._send(1, "Итоги"))
+            await asyncio.sleep(0.05)
+            # Второй отправитель начинает после RetryAfter первого и тоже ждет паузу
+            second = asyncio.create_task(runner._send(2, "Итоги"))
+            results = await asyncio.gather(first, second)
+        assert results == ["sent", "sent"]
+        assert len(bot.sent_at) == 3
+        assert all(sent_at - started >= 0.95 for sent_at in bot.sent_at[1:])
+
+    asyncio.run(scenario())
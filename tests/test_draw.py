@@ -0,0 +1,40 @@
+import random
+from unittest import mock
+
+import pytest
+
+from utils import draw
+from utils.draw import weighted_sample
+
+
+def _python_sample(weights, k, seed):
+    with mock.patch.object(draw, "np", None):
+        return weighted_sample(list(weights), k, seed)
+
+
+@pytest.mark.skipif(draw.np is None, reason="нужен numpy")
+@pytest.mark.parametrize("chunk", [draw._KEYS_CHUNK, 64])
+def test_numpy_and_python_paths_pick_the_same_winners(chunk):
+    rng = random.Random(2024)
+    with mock.patch.object(draw, "_KEYS_CHUNK", chunk):
+        for _ in range(100):
+            n = rng.randint(1, 500)
+            weights = [rng.choice((0, 1, 1, 1, 2, 5, 100)) for _ in range(n)]
+            k = rng.randint(1, 12)
+            seed = "%064x" % rng.getrandbits(256)
+            # Порядок важен: по нему распределяются места
+            assert weighted_sample(weights, k, seed) == _python_sample(weights, k, seed)
+
+
+def test_sample_is_reproducible_from_seed_and_skips_zero_weights():
+    seed = "ab" * 32
+    weights = [0, 1, 0, 2, 3]
+    winners = weighted_sample(weights, 5, seed)
+    assert winners == weighted_sample(weights, 5, seed)
+    assert sorted(winners) == [1, 3, 4]
+
+
+def test_winner_share_follows_weights():
+    rounds = 4000
+    wins = sum(weighted_sample([1, 3], 1, "%064x" % seed) == [1] for seed in range(rounds))
+    assert abs(wins / rounds - 0.75) < 0.03
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, select
+
+from database.database import (
+    add_participant, async_session, engine, create_broadcast, create_giveaway, delete_finished_older_than,
+    delete_giveaway, enqueue_outbox, finish_giveaway, init_db, update_giveaway_fields
+)
+from database.models import Broadcast, OutboxMessage, OutboxStatus, Participant
+from utils.metrics import giveaway_joins
+
+CHANNEL_ID = -1001234567890
+
+
+async def _finished_giveaway_with_broadcast(end_time: datetime) -> int:
+    await init_db()
+    giveaway = await create_giveaway("Тест", "Описание", end_time, CHANNEL_ID, 1)
+    await add_participant(giveaway.id, 1001)
+    await finish_giveaway(giveaway.id, [])
+    await update_giveaway_fields(giveaway.id, end_time=end_time)
+    await create_broadcast(giveaway.id, "Итоги")
+    await enqueue_outbox("send_message", CHANNEL_ID, {"text": "Итоги"}, giveaway_id=giveaway.id)
+    return giveaway.id
+
+
+async def _count(model, giveaway_id: int, *where) -> int:
+    async with async_session() as session:
+        result = await session.execute(
+            select(func.count()).select_from(model).where(model.giveaway_id == giveaway_id, *where)
+        )
+        return result.scalar()
+
+
+async def _assert_nothing_left(giveaway_id: int):
+    assert await _count(Participant, giveaway_id) == 0
+    assert await _count(Broadcast, giveaway_id) == 0
+    assert await _count(OutboxMessage, giveaway_id, OutboxMessage.status == OutboxStatus.PENDING.value) == 0
+
+
+def _run(scenario):
+    async def main():
+        try:
+            await scenario()
+        finally:
+            # Соединения aiosqlite привязаны к циклу событий, а каждый тест запускает свой
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+def test_delete_giveaway_removes_broadcasts_and_pending_outbox():
+    async def scenario():
+        giveaway_id = await _finished_giveaway_with_broadcast(datetime.utcnow())
+        assert await _count(Broadcast, giveaway_id) == 1
+        assert await delete_giveaway(giveaway_id)
+        await _assert_nothing_left(giveaway_id)
+
+    _run(scenario)
+
+
+def test_cleanup_removes_broadcasts_of_old_giveaways():
+    async def scenario():
+        giveaway_id = await _finished_giveaway_with_broadcast(datetime.utcnow() - timedelta(days=30))
+        assert await delete_finished_older_than(15) >= 1
+        await _assert_nothing_left(giveaway_id)
+
+    _run(scenario)
+
+
+def test_deleted_giveaways_drop_join_metrics():
+    async def scenario():
+        deleted_id = await _finished_giveaway_with_broadcast(datetime.utcnow())
+        old_id = await _finished_giveaway_with_broadcast(datetime.utcnow() - timedelta(days=30))
+        for giveaway_id in (deleted_id, old_id):
+            giveaway_joins.inc(str(giveaway_id))
+
+        await delete_giveaway(deleted_id)
+        await delete_finished_older_than(15)
+        labels = {labels for labels, _ in giveaway_joins.items()}
+        assert (str(deleted_id),) not in labels
+        assert (str(old_id),) not in labels
+
+    _run(scenario)
@@ -0,0 +1,34 @@
+import asyncio
+
+from database.database import engine, get_lease, init_db
+from utils.leader import LeaderElector
+
+
+def test_failed_election_releases_lease_and_retries():
+    events = []
+
+    async def on_elected():
+        events.append("elected")
+        if events.count("elected") == 1:
+            raise RuntimeError("временная ошибка БД")
+
+    async def on_demoted():
+        events.append("demoted")
+
+    async def scenario():
+        await init_db()
+        elector = LeaderElector("test_leader", "instance-1", ttl=10, heartbeat=1,
+                                on_elected=on_elected, on_demoted=on_demoted)
+        try:
+            await elector._tick()
+            assert not elector.is_leader
+            assert events == ["elected", "demoted"]
+            assert await get_lease("test_leader") is None
+
+            await elector._tick()
+            assert elector.is_leader
+            assert events == ["elected", "demoted", "elected"]
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,83 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+from unittest import mock
+
+from aiogram import Bot
+from sqlalchemy import select
+
+import handlers.giveaway_handlers as giveaway_handlers
+from benchmarks.fake_bot_api import FakeBotSession, FakeTelegramServer
+from database.database import (
+    async_session, create_giveaway, engine, enqueue_outbox, get_giveaway, init_db
+)
+from database.models import OutboxMessage, OutboxStatus
+from utils.outbox import OutboxWorker
+from utils.rate_limiter import TokenBucket
+
+CHANNEL_ID = -1001234567890
+
+
+async def _get_item(item_id: int) -> OutboxMessage:
+    async with async_session() as session:
+        result = await session.execute(select(OutboxMessage).where(OutboxMessage.id == item_id))
+        return result.scalar_one()
+
+
+def test_repost_retry_does_not_publish_twice(monkeypatch):
+    update_message_id = giveaway_handlers.update_giveaway_message_id
+    failures = []
+
+    async def flaky_update(giveaway_id: int, message_id: int):
+        if not failures:
+            failures.append(message_id)
+            raise RuntimeError("временная ошибка БД")
+        await update_message_id(giveaway_id, message_id)
+
+    monkeypatch.setattr(giveaway_handlers, "update_giveaway_message_id", flaky_update)
+
+    async def scenario():
+        await init_db()
+        server = FakeTelegramServer()
+        bot = Bot(token="123456:TEST-TOKEN", session=FakeBotSession(server))
+        worker = OutboxWorker(concurrency=1, batch_size=1, poll_interval=1)
+        worker._bot = bot
+        try:
+            giveaway = await create_giveaway("Тест", "Описание", datetime.utcnow() + timedelta(hours=1), CHANNEL_ID, 1)
+            item_id = await enqueue_outbox("repost_giveaway", CHANNEL_ID, giveaway_id=giveaway.id)
+
+            await worker._deliver(await _get_item(item_id))
+            item = await _get_item(item_id)
+            assert item.status == OutboxStatus.PENDING.value
+
+            await worker._deliver(item)
+            assert (await _get_item(item_id)).status == OutboxStatus.SENT.value
+            assert server.calls["sendmessage"] == 1
+            assert (await get_giveaway(giveaway.id, with_participants=False)).message_id == failures[0]
+        finally:
+            await bot.session.close()
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_retry_after_pauses_shared_limiter():
+    async def scenario():
+        await init_db()
+        server = FakeTelegramServer(rate_429=1.0, retry_after=3)
+        bot = Bot(token="123456:TEST-TOKEN", session=FakeBotSession(server))
+        worker = OutboxWorker(concurrency=1, batch_size=1, poll_interval=1)
+        worker._bot = bot
+        limiter = TokenBucket(rate=100, capacity=10)
+        try:
+            item_id = await enqueue_outbox("send_message", CHANNEL_ID, {"text": "Итоги"})
+            with mock.patch("utils.outbox.channel_limiter", limiter):
+                await worker._deliver(await _get_item(item_id))
+            assert (await _get_item(item_id)).status == OutboxStatus.PENDING.value
+            # Остальные отправки в каналы ждут столько, сколько попросил Telegram
+            assert limiter._paused_until - time.monotonic() > 2
+        finally:
+            await bot.session.close()
+            await engine.dispose()
+
+    asyncio.run(scenario())
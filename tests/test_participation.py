@@ -0,0 +1,49 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from database.database import (
+    add_bonus_tickets, add_participant, claim_giveaway_finish, create_giveaway, engine, get_participant_entries,
+    init_db
+)
+from database.models import JoinResult
+
+
+def test_join_results_distinguish_duplicate_and_closed_giveaway():
+    async def scenario():
+        await init_db()
+        giveaway = await create_giveaway("Тест", "Описание", datetime.utcnow() + timedelta(hours=1), -100, 1)
+        try:
+            assert await add_participant(giveaway.id, 2001) == JoinResult.JOINED
+            assert await add_participant(giveaway.id, 2001) == JoinResult.ALREADY_JOINED
+
+            # Завершение захвачено: новые участники не принимаются
+            assert await claim_giveaway_finish(giveaway.id)
+            assert await add_participant(giveaway.id, 2002) == JoinResult.CLOSED
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_bonus_tickets_only_for_participants_of_open_giveaways():
+    async def scenario():
+        await init_db()
+        giveaway = await create_giveaway("Тест", "Описание", datetime.utcnow() + timedelta(hours=1), -100, 1)
+        closing = await create_giveaway("Тест", "Описание", datetime.utcnow() + timedelta(seconds=1), -100, 1)
+        try:
+            await add_participant(giveaway.id, 3001)
+            await add_participant(closing.id, 3001)
+            assert await add_bonus_tickets(giveaway.id, 3001, 2)
+            assert not await add_bonus_tickets(giveaway.id, 3002, 2)
+            # Снимок участников уже прочитан - билеты в выборку не попали бы
+            assert not await add_bonus_tickets(closing.id, 3001, 2)
+
+            _, tickets = await get_participant_entries(giveaway.id)
+            assert list(tickets) == [3]
+
+            assert await claim_giveaway_finish(giveaway.id)
+            assert not await add_bonus_tickets(giveaway.id, 3001, 1)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,52 @@
+import json
+
+from middlewares.update_recorder import Anonymizer
+
+ADMIN_ID = 987654321
+REMOVED_ADMIN_ID = 123456789
+CHANNEL_ID = -1001987654321
+PRIVATE_MESSAGE_ID = 42
+
+
+def _admin_callback(data: str) -> dict:
+    return {
+        "update_id": 1,
+        "callback_query": {
+            "id": "1",
+            "chat_instance": "1",
+            "from": {"id": ADMIN_ID, "is_bot": False, "first_name": "Иван", "username": "ivan"},
+            "data": data,
+            "message": {
+                "message_id": PRIVATE_MESSAGE_ID,
+                "date": 0,
+                "chat": {"id": ADMIN_ID, "type": "private", "first_name": "Иван"},
+                "text": "Выберите админа",
+                "reply_markup": {"inline_keyboard": [
+                    [{"text": "Иван", "callback_data": f"remove_admin_{REMOVED_ADMIN_ID}"}],
+                    [{"text": "Канал", "callback_data": f"select_channel_{CHANNEL_ID}"}],
+                    [{"text": "Назад", "callback_data": "main_menu"}],
+                ]},
+            },
+        },
+    }
+
+
+def test_no_real_ids_survive_anonymization():
+    anonymizer = Anonymizer("test-salt")
+    for data in (f"remove_admin_{REMOVED_ADMIN_ID}", f"select_channel_{CHANNEL_ID}", f"remove_channel_{CHANNEL_ID}"):
+        recorded = json.dumps(anonymizer.update(_admin_callback(data)))
+        for real_id in (ADMIN_ID, REMOVED_ADMIN_ID, CHANNEL_ID, -CHANNEL_ID):
+            assert str(real_id) not in recorded
+        assert "ivan" not in recorded and "Иван" not in recorded
+
+
+def test_callback_pseudonyms_match_update_pseudonyms():
+    anonymizer = Anonymizer("test-salt")
+    recorded = anonymizer.update(_admin_callback(f"remove_admin_{ADMIN_ID}"))
+    callback = recorded["callback_query"]
+    # Маршрутизация сохраняется, а id в callback_data совпадает с псевдонимом того же пользователя
+    assert callback["data"] == f"remove_admin_{callback['from']['id']}"
+    keyboard = callback["message"]["reply_markup"]["inline_keyboard"]
+    assert keyboard[1][0]["callback_data"] == f"select_channel_{anonymizer.chat_id(CHANNEL_ID)}"
+    assert keyboard[2][0]["callback_data"] == "main_menu"
+    assert anonymizer.chat_id(CHANNEL_ID) < 0
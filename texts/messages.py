@@ -15,8 +15,9 @@ MESSAGES = {
     "enter_media": "🖼 Отправьте фото, видео или GIF для розыгрыша\n\n<i>Или нажмите 'Пропустить', если медиа не нужно</i>:",
     "enter_winner_places": "🏆 Введите количество призовых мест (1-10)\n\n<b>Например:</b>\n• 1 - один победитель\n• 3 - первое, второе и третье места\n• 5 - пять призовых мест",
     "choose_channel": "📺 Выберите канал для публикации розыгрыша:",
+    "ask_require_subscription": "📢 Участвовать могут только подписчики канала?\n\n<i>Подписка проверяется при нажатии «Участвовать» и еще раз у победителей перед подведением итогов</i>",
     "enter_end_time": "⏰ Введите дату и время окончания розыгрыша\n\n<b>Формат:</b> ДД.ММ.ГГГГ ЧЧ:ММ\n<b>Пример:</b> 25.12.2024 18:00\n\n<i>Время указывается по Москве</i>",
-    "confirm_giveaway": "✅ <b>Подтверждение создания розыгрыша</b>\n\n<b>Заголовок:</b> {title}\n<b>Описание:</b> {description}\n<b>Призовых мест:</b> {winner_places}\n<b>Канал:</b> {channel}\n<b>Окончание:</b> {end_time}\n<b>Медиа:</b> {media}\n\nВсе верно?",
+    "confirm_giveaway": "✅ <b>Подтверждение создания розыгрыша</b>\n\n<b>Заголовок:</b> {title}\n<b>Описание:</b> {description}\n<b>Призовых мест:</b> {winner_places}\n<b>Канал:</b> {channel}\n<b>Только подписчики:</b> {subscription}\n<b>Окончание:</b> {end_time}\n<b>Медиа:</b> {media}\n\nВсе верно?",
     "giveaway_created": "✅ Розыгрыш успешно создан и опубликован!",
     "giveaway_creation_cancelled": "❌ Создание розыгрыша отменено.",
     
@@ -68,6 +69,7 @@ MESSAGES = {
     # Участие в розыгрыше
     "participation_success": "🎉 Вы успешно участвуете в розыгрыше!",
     "already_participating": "⚠️ Вы уже участвуете в этом розыгрыше!",
+    "subscription_required": "📢 Чтобы участвовать, подпишитесь на канал и нажмите кнопку еще раз",
     "giveaway_ended": "❌ Этот розыгрыш уже завершен!",
     
     # Завершение розыгрыша
@@ -79,6 +81,31 @@ MESSAGES = {
     "giveaway_deleted": "✅ Розыгрыш удален!",
     "deletion_cancelled": "❌ Удаление отменено.",
     
+    # Очередь отправки (outbox)
+    "outbox_status": "📮 <b>Очередь отправки в каналы</b>\n\n⏳ Ожидают: {pending}\n📤 Отправляются: {sending}\n✅ Доставлено: {sent}\n❌ Не доставлено: {failed}",
+    "outbox_stuck": "\n\n<b>Проблемные операции:</b>\n{items}",
+    "outbox_retried": "🔁 Снова поставлено в очередь: {count}",
+    
+    # Рассылки участникам
+    "broadcasts_status": "📣 <b>Рассылки участникам</b>",
+    "broadcasts_empty": "\n\nРассылок пока не было.",
+    "broadcast_created": "📣 Рассылка итогов поставлена в очередь",
+    "broadcast_exists": "⏳ Рассылка итогов этого розыгрыша уже идет",
+    "broadcast_cancelled": "⏹ Рассылка остановлена",
+    
+    # Профилирование
+    "profile_started": "🔬 Снимаю профиль {seconds} с, результат придет файлом",
+    "profile_busy": "⏳ Профиль уже снимается, дождитесь результата",
+    "profile_invalid_seconds": "❌ Длительность - число секунд от 1 до {max_seconds}. Пример: /profile 30",
+    "profile_done": "🔬 Профиль event loop за {seconds} с, выборок: {samples}\nФормат collapsed stacks: flamegraph.pl, speedscope.app",
+    "profile_allocations": "🧠 <b>Память, выделенная за время профиля</b>\n{items}",
+    "profile_error": "❌ Не удалось снять профиль: {error}",
+    
+    # Бонусные билеты
+    "bonus_usage": "🎟 Начисление бонусных билетов: /bonus ID_розыгрыша ID_пользователя билетов\nПример: /bonus 12 123456789 2 (от 1 до {max_tickets} за раз)",
+    "bonus_added": "🎟 Участнику {user_id} начислено билетов: {tickets} (розыгрыш #{giveaway_id})",
+    "bonus_not_added": "❌ Билеты не начислены: пользователь не участвует в розыгрыше #{giveaway_id} или розыгрыш уже завершается",
+    
     # Ошибки валидации
     "invalid_datetime": "❌ Неверный формат даты/времени. Используйте формат: ДД.ММ.ГГГГ ЧЧ:ММ",
     "datetime_in_past": "❌ Указанное время уже прошло!",
@@ -96,6 +123,10 @@ BUTTONS = {
     "view_giveaways": "📋 Просмотр розыгрышей",
     "admin_management": "👥 Управление админами",
     "channel_management": "📺 Управление каналами",
+    "outbox": "📮 Очередь отправки",
+    "broadcasts": "📣 Рассылки",
+    "stats": "📊 Статистика",
+    "profile": "🔬 Профиль",
     "back_to_menu": "🔙 Главное меню",
     
     # Создание розыгрыша
@@ -129,6 +160,12 @@ BUTTONS = {
     "remove_channel": "➖ Удалить канал",
     "view_channels": "📺 Список каналов",
     
+    # Очередь отправки
+    "outbox_retry_failed": "🔁 Повторить недоставленные",
+    "refresh": "🔄 Обновить",
+    "broadcast_results": "📣 Разослать итоги участникам",
+    "broadcast_cancel": "⏹ Остановить #{id}",
+    
     # Участие в розыгрыше
     "participate": "🎯 Участвовать ({count})",
     
@@ -165,9 +202,52 @@ NO_PARTICIPANTS_TEMPLATE = """🎯 <b>Розыгрыш завершен</b>
 😔 К сожалению, в розыгрыше не было участников.
 """
 
+WINNER_DM_TEMPLATE = """🎉 <b>Поздравляем!</b>
+
+Вы заняли <b>{place} место</b> в розыгрыше «{title}»{channel}!
+
+Свяжитесь с организатором, чтобы получить приз."""
+
+BROADCAST_RESULTS_TEMPLATE = """🎊 <b>Итоги розыгрыша «{title}»</b>
+
+{winners_list}
+
+Спасибо за участие!"""
+
 # Шаблоны для админских сообщений
 ADMIN_GIVEAWAY_ITEM = "🎯 <b>#{id}</b> {title}\n📅 {end_time} | 👥 {participants}"
 
 ADMIN_CHANNEL_ITEM = "📺 <b>{name}</b>\n🔗 {username}\n👤 Добавил: {admin}"
 
 ADMIN_USER_ITEM = "👤 <b>{name}</b> (@{username})\n🆔 {user_id}"
+
+ADMIN_BROADCAST_ITEM = "#{id} розыгрыш #{giveaway_id} | {status}\n📤 {processed}/{total} ({percent}%) ✅ {sent} 🚫 {blocked} ❌ {failed}"
+
+ADMIN_OUTBOX_ITEM = "#{id} {kind} → {chat_id} | {status}, попыток: {attempts}\n<i>{error}</i>"
+
+STATS_TEMPLATE = """📊 <b>Статистика бота</b>
+
+🖥 Экземпляр: {instance} ({role})
+🎯 Розыгрыши: активных {active}, завершается {finishing}, завершено {finished}
+👥 Участий за минуту: {joins_per_minute}
+⏰ Таймеров завершения: {expiry_pending}, ближайший: {expiry_next}
+
+💾 База: {db_size}, WAL: {wal_size}
+🧠 Кэш подписок: {membership_ratio}, записей: {membership_size}
+🧠 Кэш FSM: {fsm_ratio}
+
+📮 Публикации: в очереди {outbox_pending}, отправляется {outbox_in_flight}
+✉️ Личные сообщения: в очереди {dm_pending}, отправляется {dm_in_flight}, ждут лимита {dm_waiting}
+📣 Рассылка: {broadcast}
+
+⏱ <b>p99 за последние 5-10 минут</b>
+{latencies}
+
+🗓 <b>Задачи планировщика</b>
+{jobs}"""
+
+STATS_LATENCY_ITEM = "• {name}: {p99} ({count})"
+
+STATS_JOB_ITEM = "• {name}: {next_run}"
+
+PROFILE_ALLOCATION_ITEM = "• <code>{location}</code>: {size:.1f} КБ ({count})"
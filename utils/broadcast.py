@@ -0,0 +1,152 @@
+"""
+Рассылка сообщений всем участникам розыгрыша.
+
+Участники читаются порциями по возрастанию participants.id (keyset-пагинация), поэтому
+память не растет с числом получателей. После каждой порции в БД сохраняется контрольная
+точка, и после падения рассылка продолжается с нее: сообщения последней незавершенной
+порции могут прийти повторно, но ни один участник не будет пропущен.
+"""
+import asyncio
+import logging
+from typing import Optional
+
+from aiogram.exceptions import TelegramForbiddenError, TelegramNetworkError, TelegramRetryAfter
+
+from config import config
+from database.database import (
+    get_next_broadcast, get_participants_summary, get_participant_user_ids_page,
+    start_broadcast, checkpoint_broadcast, finish_broadcast
+)
+from database.models import Broadcast, BroadcastStatus
+from utils.outbox import dm_limiter
+
+# Сетевые ошибки повторяются несколько раз, прежде чем получатель считается недоставленным
+_NETWORK_RETRIES = 3
+
+_SENT, _BLOCKED, _FAILED = "sent", "blocked", "failed"
+
+
+class BroadcastRunner:
+    """
+    Выполняет рассылки по одной. Скорость ограничена общим dm_limiter, который делят
+    рассылки и личные уведомления победителям, так что вместе они не превышают лимит Bot API.
+    """
+
+    def __init__(self, concurrency: int, chunk_size: int, poll_interval: float):
+        self.concurrency = max(1, concurrency)
+        self.chunk_size = max(1, chunk_size)
+        self.poll_interval = poll_interval
+        self.current_id: Optional[int] = None
+        self._bot = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, bot):
+        self._bot = bot
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self.current_id = None
+
+    def wakeup(self):
+        """Сообщает о новой рассылке, чтобы не ждать следующего опроса"""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                broadcast = await get_next_broadcast()
+            except Exception as e:
+                logging.error(f"Рассылки: ошибка выборки: {e}")
+                broadcast = None
+            if broadcast:
+                self.current_id = broadcast.id
+                try:
+                    await self._process(broadcast)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # Рассылка остается running и продолжится с контрольной точки
+                    logging.error(f"Рассылка #{broadcast.id}: ошибка, повтор через {self.poll_interval} с: {e}")
+                    await asyncio.sleep(self.poll_interval)
+                finally:
+                    self.current_id = None
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, broadcast: Broadcast):
+        if broadcast.status == BroadcastStatus.PENDING.value:
+            total, _, _ = await get_participants_summary(broadcast.giveaway_id)
+            await start_broadcast(broadcast.id, total)
+            logging.info(f"Рассылка #{broadcast.id}: старт, получателей {total}")
+        else:
+            logging.info(f"Рассылка #{broadcast.id}: продолжение после участника #{broadcast.last_participant_id}")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def send(user_id: int) -> str:
+            async with semaphore:
+                return await self._send(user_id, broadcast.text)
+
+        after_id = broadcast.last_participant_id
+        while True:
+            page = await get_participant_user_ids_page(broadcast.giveaway_id, after_id, self.chunk_size)
+            if not page:
+                await finish_broadcast(broadcast.id)
+                logging.info(f"Рассылка #{broadcast.id} завершена")
+                return
+            results = await asyncio.gather(*(send(user_id) for _, user_id in page))
+            after_id = page[-1][0]
+            if not await checkpoint_broadcast(
+                broadcast.id, after_id,
+                sent=results.count(_SENT), blocked=results.count(_BLOCKED), failed=results.count(_FAILED)
+            ):
+                logging.info(f"Рассылка #{broadcast.id} остановлена")
+                return
+
+    async def _send(self, user_id: int, text: str) -> str:
+        network_errors = 0
+        while True:
+            await dm_limiter.acquire()
+            try:
+                await self._bot.send_message(chat_id=user_id, text=text, disable_web_page_preview=True)
+                return _SENT
+            except TelegramRetryAfter as e:
+                # Лимит превышен - паузу получает общий лимитер: ждут все отправители рассылки и уведомления
+                # победителям, а этому получателю отправляем снова после паузы (acquire ее дождется)
+                logging.warning(f"Рассылка: RetryAfter {e.retry_after} с")
+                dm_limiter.pause(e.retry_after)
+            except TelegramForbiddenError:
+                return _BLOCKED
+            except TelegramNetworkError as e:
+                network_errors += 1
+                if network_errors > _NETWORK_RETRIES:
+                    logging.warning(f"Рассылка: не доставлено {user_id}: {e}")
+                    return _FAILED
+                await asyncio.sleep(2 ** network_errors)
+            except Exception as e:
+                logging.warning(f"Рассылка: не доставлено {user_id}: {e}")
+                return _FAILED
+
+
+broadcast_runner = BroadcastRunner(
+    concurrency=config.BROADCAST_CONCURRENCY,
+    chunk_size=config.BROADCAST_CHUNK_SIZE,
+    poll_interval=config.OUTBOX_POLL_SECONDS
+)
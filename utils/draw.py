@@ -0,0 +1,282 @@
+"""
+Выбор победителей розыгрыша без загрузки всех участников в память.
+
+Вся случайность берется из потока SHAKE-256 от сида розыгрыша: сид сохраняется
+в giveaways.draw_seed, и по нему итоги можно независимо воспроизвести.
+"""
+import hashlib
+import heapq
+import logging
+import math
+import random
+import secrets
+from array import array
+from typing import Awaitable, Callable, List, Optional, Sequence, Set, Tuple
+
+from database.database import (
+    get_participants_at, get_participant_entries, get_participants_by_ids, get_participants_summary
+)
+from database.models import Participant
+
+try:
+    import numpy as np
+except ImportError:  # NumPy необязателен - есть реализация на чистом Python
+    np = None
+
+# Сколько участников обрабатывается за один блок случайного потока
+_KEYS_CHUNK = 1 << 20
+_RNG_BLOCK = 4096
+
+# Сколько кандидатов на одно место можно проверить при перевыборе, прежде чем оставить место пустым
+_MAX_CANDIDATES_PER_PLACE = 20
+
+# Получает кандидатов и возвращает user_id тех, кто не может победить (отписался от канала и т.п.)
+ExcludeCallback = Callable[[List[Participant]], Awaitable[Set[int]]]
+
+
+def new_seed() -> str:
+    """Новый случайный сид розыгрыша (hex, 256 бит)"""
+    return secrets.token_hex(32)
+
+
+class AuditableRandom(random.Random):
+    """random.Random поверх детерминированного потока SHAKE-256 от сида"""
+
+    def seed(self, a=None, version=2):
+        self._seed_bytes = bytes.fromhex(a) if isinstance(a, str) else bytes(a or b"")
+        self._block = 0
+        self._buffer = b""
+        self._pos = 0
+
+    def _read(self, size: int) -> bytes:
+        chunks = []
+        while size > 0:
+            if self._pos >= len(self._buffer):
+                self._buffer = hashlib.shake_256(
+                    self._seed_bytes + b"rng" + self._block.to_bytes(8, "big")
+                ).digest(_RNG_BLOCK)
+                self._block += 1
+                self._pos = 0
+            chunk = self._buffer[self._pos:self._pos + size]
+            self._pos += len(chunk)
+            size -= len(chunk)
+            chunks.append(chunk)
+        return b"".join(chunks)
+
+    def getrandbits(self, k: int) -> int:
+        if k <= 0:
+            return 0
+        size = (k + 7) // 8
+        return int.from_bytes(self._read(size), "big") >> (size * 8 - k)
+
+    def random(self) -> float:
+        return self.getrandbits(53) * 2.0 ** -53
+
+    def getstate(self):
+        return self._seed_bytes, self._block, self._buffer, self._pos
+
+    def setstate(self, state):
+        self._seed_bytes, self._block, self._buffer, self._pos = state
+
+
+def _key_stream(seed: str, block: int, count: int) -> bytes:
+    """8 байт случайного потока на каждого участника блока"""
+    return hashlib.shake_256(
+        bytes.fromhex(seed) + b"keys" + block.to_bytes(8, "big")
+    ).digest(8 * count)
+
+
+def _top_keys_numpy(raw: bytes, weights: Sequence[int], start: int, k: int) -> List[Tuple[float, int]]:
+    # u в (0, 1): старшие 53 бита + 0.5, чтобы не получить log(0)
+    u = ((np.frombuffer(raw, dtype=">u8") >> np.uint64(11)).astype(np.float64) + 0.5) * 2.0 ** -53
+    w = weights[start:start + len(u)].astype(np.float64)
+    with np.errstate(divide="ignore"):
+        keys = np.log(u) / w
+    keys[w <= 0] = -np.inf
+    m = min(k, len(keys))
+    top = np.argpartition(keys, len(keys) - m)[len(keys) - m:]
+    return list(zip(keys[top].tolist(), (top + start).tolist()))
+
+
+def _top_keys_python(raw: bytes, weights: Sequence[int], start: int, k: int) -> List[Tuple[float, int]]:
+    log = math.log
+    scale = 2.0 ** -53
+    keys = []
+    for offset in range(len(raw) // 8):
+        weight = weights[start + offset]
+        if weight <= 0:
+            continue
+        bits = int.from_bytes(raw[offset * 8:offset * 8 + 8], "big") >> 11
+        keys.append((log((bits + 0.5) * scale) / weight, start + offset))
+    return heapq.nlargest(k, keys)
+
+
+def weighted_sample(weights: Sequence[int], k: int, seed: str) -> List[int]:
+    """
+    k различных индексов, вероятность пропорциональна весу (Efraimidis-Spirakis:
+    ключ ln(u)/w, берутся k наибольших). С NumPy ключи считаются векторно по блокам,
+    без него - тем же потоком байтов на чистом Python.
+    """
+    n = len(weights)
+    k = min(k, n)
+    if k <= 0:
+        return []
+    if np is not None and not isinstance(weights, np.ndarray):
+        weights = np.asarray(weights, dtype=np.int64)
+    top_keys = _top_keys_numpy if np is not None else _top_keys_python
+
+    candidates: List[Tuple[float, int]] = []
+    for block, start in enumerate(range(0, n, _KEYS_CHUNK)):
+        count = min(_KEYS_CHUNK, n - start)
+        candidates.extend(top_keys(_key_stream(seed, block, count), weights, start, k))
+    candidates.sort(reverse=True)
+    return [index for key, index in candidates[:k] if key != -math.inf]
+
+
+class DrawSnapshot:
+    """
+    Заранее прочитанные сведения об участниках розыгрыша: количество, наибольший id (watermark)
+    и наибольшее число билетов. Если есть бонусные билеты - еще массивы (id, tickets) в порядке id.
+    В момент завершения дочитываются только записи с id больше watermark (id участников
+    только растут, а после захвата завершения новые участники не добавляются).
+    Бонусные билеты, начисленные старым участникам после снимка, не учитываются.
+    """
+
+    def __init__(self, giveaway_id: int, count: int, watermark: int, max_tickets: int):
+        self.giveaway_id = giveaway_id
+        self.count = count
+        self.watermark = watermark
+        self.max_tickets = max_tickets
+        self.ids: Optional[array] = None
+        self.tickets: Optional[array] = None
+
+    def __len__(self) -> int:
+        return self.count
+
+    async def load_entries(self):
+        """Читает массивы (id, tickets) до текущего watermark"""
+        ids, tickets = await get_participant_entries(self.giveaway_id)
+        ids_count = len(ids)
+        # Пока массивы читались, могли добавиться участники - сдвигаем watermark вперед
+        self.ids, self.tickets = ids, tickets
+        self.count = ids_count
+        self.watermark = ids[-1] if ids_count else 0
+        self.max_tickets = max(tickets, default=0)
+
+    async def catch_up(self):
+        """Дочитывает участников, присоединившихся после снимка"""
+        if self.ids is not None:
+            ids, tickets = await get_participant_entries(self.giveaway_id, after_id=self.watermark)
+            self.ids.extend(ids)
+            self.tickets.extend(tickets)
+            self.count += len(ids)
+            if ids:
+                self.watermark = ids[-1]
+                self.max_tickets = max(self.max_tickets, max(tickets))
+            return
+        count, watermark, max_tickets = await get_participants_summary(self.giveaway_id, after_id=self.watermark)
+        self.count += count
+        self.watermark = watermark
+        self.max_tickets = max(self.max_tickets, max_tickets)
+
+
+async def prepare_draw(giveaway_id: int) -> DrawSnapshot:
+    """
+    Снимок участников для быстрого завершения: читается заранее, до end_time.
+    Массивы нужны только взвешенной выборке, равновероятной хватает количества.
+    """
+    snapshot = DrawSnapshot(giveaway_id, *await get_participants_summary(giveaway_id))
+    if snapshot.max_tickets > 1:
+        await snapshot.load_entries()
+    return snapshot
+
+
+async def draw_winners(giveaway_id: int, places: int, seed: Optional[str] = None,
+                       snapshot: Optional[DrawSnapshot] = None,
+                       exclude: Optional[ExcludeCallback] = None) -> Tuple[List[Participant], str]:
+    """
+    Выбирает до places разных победителей и возвращает (победители, сид).
+    Если у всех участников по одному билету - равновероятная выборка позиций прямо в БД
+    (память O(k)). Если есть бонусные билеты - взвешенная выборка по массивам (id, tickets).
+    Со снимком дочитываются только новые участники; при том же сиде результат совпадает с выбором без снимка.
+    
+    exclude проверяет кандидатов пачкой; вместо исключенных из того же потока сида
+    дотягиваются следующие кандидаты. Без исключений результат тот же, что и без exclude.
+    """
+    seed = seed or new_seed()
+    if places <= 0:
+        return [], seed
+    
+    if snapshot is None:
+        snapshot = await prepare_draw(giveaway_id)
+    else:
+        await snapshot.catch_up()
+    
+    total = len(snapshot)
+    if total == 0 or snapshot.max_tickets <= 0:
+        return [], seed
+    
+    if snapshot.max_tickets == 1:
+        next_candidates = _uniform_candidates(giveaway_id, total, seed)
+    else:
+        if snapshot.ids is None:
+            # Бонусные билеты появились уже после снимка
+            await snapshot.load_entries()
+        next_candidates = _weighted_candidates(snapshot, seed)
+    
+    winners: List[Participant] = []
+    excluded_count = 0
+    limit = places * _MAX_CANDIDATES_PER_PLACE
+    examined = 0
+    candidates = await next_candidates(places)
+    while candidates:
+        examined += len(candidates)
+        excluded = await exclude(candidates) if exclude else set()
+        excluded_count += len(excluded)
+        winners.extend(candidate for candidate in candidates if candidate.user_id not in excluded)
+        need = places - len(winners)
+        if need <= 0 or examined >= limit:
+            break
+        candidates = await next_candidates(min(need, limit - examined))
+    
+    if excluded_count:
+        logging.info(
+            f"Розыгрыш {giveaway_id}: исключено кандидатов {excluded_count}, "
+            f"победителей {len(winners)} из {places}"
+        )
+    return winners, seed
+
+
+def _uniform_candidates(giveaway_id: int, total: int, seed: str) -> Callable[[int], Awaitable[List[Participant]]]:
+    """Кандидаты равновероятной выборки: первая пачка - sample, дальше - новые позиции из того же потока"""
+    rng = AuditableRandom(seed)
+    drawn = set()
+    
+    async def next_candidates(count: int) -> List[Participant]:
+        if not drawn:
+            # sample по range не материализует диапазон
+            positions = rng.sample(range(total), min(count, total))
+        else:
+            positions = []
+            while len(positions) < count and len(drawn) < total:
+                position = rng.randrange(total)
+                if position not in drawn:
+                    drawn.add(position)
+                    positions.append(position)
+        drawn.update(positions)
+        return await get_participants_at(giveaway_id, positions)
+    
+    return next_candidates
+
+
+def _weighted_candidates(snapshot: DrawSnapshot, seed: str) -> Callable[[int], Awaitable[List[Participant]]]:
+    """Кандидаты взвешенной выборки: k наибольших ключей - префикс k + m наибольших, поэтому порядок устойчив"""
+    taken = 0
+    
+    async def next_candidates(count: int) -> List[Participant]:
+        nonlocal taken
+        indexes = weighted_sample(snapshot.tickets, taken + count, seed)[taken:]
+        taken += len(indexes)
+        return await get_participants_by_ids([snapshot.ids[index] for index in indexes])
+    
+    return next_candidates
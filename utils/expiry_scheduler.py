@@ -0,0 +1,172 @@
+"""
+Планировщик окончания розыгрышей на min-куче, обслуживаемый одной asyncio-задачей
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import pytz
+
+_REMOVED = None  # Метка отмененной записи в куче
+
+# Верхняя граница одного ожидания: страховка от переводов системных часов
+_MAX_SLEEP_SECONDS = 60
+
+
+def _timestamp(dt: datetime) -> float:
+    """Наивные даты из БД хранятся в UTC"""
+    if dt.tzinfo is None:
+        dt = pytz.UTC.localize(dt)
+    return dt.timestamp()
+
+
+class ExpiryScheduler:
+    """
+    Очередь дедлайнов розыгрышей.
+    schedule() и перенос - O(log n), cancel() - O(1) (ленивое удаление из кучи).
+    Розыгрыши с одинаковым end_time передаются в on_expire одной пачкой.
+    """
+
+    def __init__(self, on_expire: Callable[[List[int]], Awaitable[None]],
+                 on_lag: Optional[Callable[[float], None]] = None):
+        self._on_expire = on_expire
+        self._on_lag = on_lag  # Получает, на сколько секунд позже дедлайна сработал таймер
+        self._heap: List[list] = []  # [timestamp, seq, giveaway_id]
+        self._entries: Dict[int, list] = {}
+        self._counter = itertools.count()
+        self._removed = 0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._batches = set()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, giveaway_id: int) -> bool:
+        return giveaway_id in self._entries
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def schedule(self, giveaway_id: int, end_time: datetime):
+        """Добавляет или переносит дедлайн розыгрыша"""
+        self._discard(giveaway_id)
+        entry = [_timestamp(end_time), next(self._counter), giveaway_id]
+        self._entries[giveaway_id] = entry
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._wakeup.set()
+
+    def cancel(self, giveaway_id: int) -> bool:
+        """Отменяет дедлайн; запись остается в куче помеченной и выбрасывается позже"""
+        return self._discard(giveaway_id)
+
+    def clear(self):
+        """Забывает все дедлайны (например, когда экземпляр перестал быть лидером)"""
+        self._heap.clear()
+        self._entries.clear()
+        self._removed = 0
+
+    def get_deadline(self, giveaway_id: int) -> Optional[datetime]:
+        entry = self._entries.get(giveaway_id)
+        if entry is None:
+            return None
+        return datetime.fromtimestamp(entry[0], pytz.UTC)
+
+    def scheduled_ids(self) -> List[int]:
+        return list(self._entries)
+
+    def next_deadline(self) -> Optional[datetime]:
+        self._drop_removed_head()
+        if not self._heap:
+            return None
+        return datetime.fromtimestamp(self._heap[0][0], pytz.UTC)
+
+    def start(self):
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def _discard(self, giveaway_id: int) -> bool:
+        entry = self._entries.pop(giveaway_id, None)
+        if entry is None:
+            return False
+        entry[2] = _REMOVED
+        self._removed += 1
+        # Если отмененных записей больше половины - пересобираем кучу, чтобы она не разрасталась
+        if self._removed > len(self._entries) and self._removed > 64:
+            self._heap = [item for item in self._heap if item[2] is not _REMOVED]
+            heapq.heapify(self._heap)
+            self._removed = 0
+        return True
+
+    def _drop_removed_head(self):
+        while self._heap and self._heap[0][2] is _REMOVED:
+            heapq.heappop(self._heap)
+            self._removed -= 1
+
+    def _pop_due_batch(self, now: float) -> List[int]:
+        """Снимает с кучи все розыгрыши с самым ранним наступившим end_time"""
+        self._drop_removed_head()
+        if not self._heap or self._heap[0][0] > now:
+            return []
+        deadline = self._heap[0][0]
+        batch = []
+        while self._heap and self._heap[0][0] == deadline:
+            _, _, giveaway_id = heapq.heappop(self._heap)
+            if giveaway_id is _REMOVED:
+                self._removed -= 1
+                continue
+            del self._entries[giveaway_id]
+            batch.append(giveaway_id)
+        if batch and self._on_lag:
+            self._on_lag(now - deadline)
+        return batch
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            self._drop_removed_head()
+            if self._heap:
+                delay = self._heap[0][0] - time.time()
+                if delay > 0:
+                    await self._wait(min(delay, _MAX_SLEEP_SECONDS))
+                    continue
+            else:
+                await self._wait(None)
+                continue
+
+            now = time.time()
+            while True:
+                batch = self._pop_due_batch(now)
+                if not batch:
+                    break
+                # Пачку завершаем в отдельной задаче, чтобы таймер не ждал Bot API
+                task = asyncio.create_task(self._expire(batch))
+                self._batches.add(task)
+                task.add_done_callback(self._batches.discard)
+
+    async def _wait(self, timeout: Optional[float]):
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _expire(self, batch: List[int]):
+        try:
+            await self._on_expire(batch)
+        except Exception as e:
+            logging.error(f"Ошибка завершения пачки розыгрышей {batch}: {e}")
@@ -0,0 +1,156 @@
+"""
+Хранилище FSM в базе данных проекта: незаконченные мастера создания и редактирования розыгрышей
+переживают перезапуск, брошенные состояния истекают через FSM_STATE_TTL.
+Недавно использованные состояния держатся в LRU-кэше в памяти; каждая запись сразу пишется в БД.
+"""
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from config import config
+from database.database import get_fsm_keys, get_fsm_record, save_fsm_record, delete_fsm_record
+
+_DATETIME_TAG = "__datetime__"
+
+
+def _default(value: Any):
+    if isinstance(value, datetime):
+        return {_DATETIME_TAG: value.isoformat()}
+    raise TypeError(f"Тип {type(value).__name__} не сохраняется в FSM")
+
+
+def _object_hook(value: dict):
+    if len(value) == 1 and _DATETIME_TAG in value:
+        return datetime.fromisoformat(value[_DATETIME_TAG])
+    return value
+
+
+def dumps_fsm_data(data: Dict[str, Any]) -> str:
+    """JSON данных FSM; datetime (например, end_time из мастера) сохраняется с меткой типа"""
+    return json.dumps(data, default=_default, ensure_ascii=False)
+
+
+def loads_fsm_data(raw: str) -> Dict[str, Any]:
+    return json.loads(raw, object_hook=_object_hook)
+
+
+def _make_key(key: StorageKey) -> str:
+    return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+
+class DatabaseStorage(BaseStorage):
+    """
+    Чтение состояния - из кэша, если оно там есть, иначе одним запросом по первичному ключу.
+    Запись обновляет кэш и БД и продлевает срок жизни состояния на ttl секунд.
+    
+    aiogram читает состояние на каждый апдейт, включая нажатия «Участвовать». Поэтому с кэшем
+    в памяти держится и множество ключей, для которых в БД есть строка: для остальных
+    пользователей состояние пустое без обращения к БД.
+    Кэш рассчитан на один экземпляр бота: если апдейты одного пользователя могут попасть
+    на разные экземпляры, нужен FSM_CACHE_SIZE=0 (в режиме webhook это значение по умолчанию).
+    """
+
+    def __init__(self, ttl: int, cache_size: int):
+        self.ttl = ttl
+        self.cache_size = max(0, cache_size)
+        self.hits = 0
+        self.misses = 0
+        # key -> (state, data, момент истечения по time.monotonic())
+        self._cache: "OrderedDict[str, Tuple[Optional[str], Dict[str, Any], float]]" = OrderedDict()
+        self._known_keys: Optional[set] = None  # Ключи строк в БД; None - еще не загружены
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        storage_key = _make_key(key)
+        _, data = await self._load(storage_key)
+        await self._save(storage_key, state.state if isinstance(state, State) else state, data)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state, _ = await self._load(_make_key(key))
+        return state
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        storage_key = _make_key(key)
+        state, _ = await self._load(storage_key)
+        await self._save(storage_key, state, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        _, data = await self._load(_make_key(key))
+        return data.copy()
+
+    async def close(self) -> None:
+        self._cache.clear()
+        self._known_keys = None
+
+    async def _load(self, storage_key: str) -> Tuple[Optional[str], Dict[str, Any]]:
+        entry = self._cache.get(storage_key)
+        if entry is not None:
+            state, data, expires_at = entry
+            if expires_at > time.monotonic():
+                self.hits += 1
+                self._cache.move_to_end(storage_key)
+                return state, data
+            del self._cache[storage_key]
+
+        if self.cache_size:
+            if self._known_keys is None:
+                self._known_keys = await get_fsm_keys()
+            if storage_key not in self._known_keys:
+                self.hits += 1
+                return None, {}
+        self.misses += 1
+
+        record = await get_fsm_record(storage_key)
+        if record is None:
+            # Состояние истекло
+            if self._known_keys is not None:
+                self._known_keys.discard(storage_key)
+            return None, {}
+        state = record.state
+        data = loads_fsm_data(record.data) if record.data else {}
+        self._remember(storage_key, state, data, (record.expires_at - datetime.utcnow()).total_seconds())
+        return state, data
+
+    async def _save(self, storage_key: str, state: Optional[str], data: Dict[str, Any]):
+        if state is None and not data:
+            # Диалог завершен (state.clear()) - строка не нужна
+            await delete_fsm_record(storage_key)
+            if self._known_keys is not None:
+                self._known_keys.discard(storage_key)
+            self._cache.pop(storage_key, None)
+            return
+        expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+        await save_fsm_record(storage_key, state, dumps_fsm_data(data) if data else None, expires_at)
+        if self._known_keys is not None:
+            self._known_keys.add(storage_key)
+        self._remember(storage_key, state, data, self.ttl)
+
+    def _remember(self, storage_key: str, state: Optional[str], data: Dict[str, Any], ttl: float):
+        if self.cache_size == 0:
+            return
+        self._cache[storage_key] = (state, data, time.monotonic() + ttl)
+        self._cache.move_to_end(storage_key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+def create_fsm_storage() -> BaseStorage:
+    """Хранилище FSM по настройке FSM_STORAGE"""
+    if config.FSM_STORAGE == "memory":
+        return MemoryStorage()
+    if config.FSM_STORAGE == "redis":
+        # Нужен пакет redis; подойдет любой совместимый сервер (Redis, KeyDB, Valkey, Dragonfly)
+        from aiogram.fsm.storage.redis import RedisStorage
+        return RedisStorage.from_url(
+            config.REDIS_URL,
+            state_ttl=config.FSM_STATE_TTL,
+            data_ttl=config.FSM_STATE_TTL,
+            json_loads=loads_fsm_data,
+            json_dumps=dumps_fsm_data
+        )
+    return DatabaseStorage(ttl=config.FSM_STATE_TTL, cache_size=config.FSM_CACHE_SIZE)
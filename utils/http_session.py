@@ -0,0 +1,109 @@
+"""
+Общая HTTP-сессия для Bot API с настраиваемым пулом соединений
+"""
+import asyncio
+import logging
+from typing import Any, Optional, cast
+
+from aiohttp import ClientError, ClientSession, ClientTimeout
+from aiohttp.hdrs import USER_AGENT
+from aiohttp.http import SERVER_SOFTWARE
+from aiogram import Bot, __version__
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramNetworkError
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+
+from config import config
+from utils.json_codec import JSON_CODEC_NAME, json_dumps, json_loads
+from utils.metrics import BotAPIMetricsMiddleware
+
+
+class TunedAiohttpSession(AiohttpSession):
+    """AiohttpSession с настройкой лимита соединений, DNS-кэша, keep-alive и таймаутов"""
+
+    def __init__(
+        self,
+        limit: int = 100,
+        dns_cache_ttl: int = 3600,
+        keepalive_timeout: float = 60,
+        connect_timeout: Optional[float] = 10,
+        **kwargs: Any
+    ) -> None:
+        super().__init__(**kwargs)
+        self.connect_timeout = connect_timeout
+        self._connector_init.update(
+            limit=limit,
+            ttl_dns_cache=dns_cache_ttl,
+            keepalive_timeout=keepalive_timeout,
+        )
+
+    def _client_timeout(self, total: Optional[float]) -> ClientTimeout:
+        return ClientTimeout(total=total, sock_connect=self.connect_timeout)
+
+    async def create_session(self) -> ClientSession:
+        if self._should_reset_connector:
+            await self.close()
+
+        if self._session is None or self._session.closed:
+            self._session = ClientSession(
+                connector=self._connector_type(**self._connector_init),
+                headers={
+                    USER_AGENT: f"{SERVER_SOFTWARE} aiogram/{__version__}",
+                },
+                json_serialize=self.json_dumps,
+                timeout=self._client_timeout(self.timeout),
+            )
+            self._should_reset_connector = False
+
+        return self._session
+
+    async def make_request(
+        self, bot: Bot, method: TelegramMethod[TelegramType], timeout: Optional[int] = None
+    ) -> TelegramType:
+        # Повторяет AiohttpSession.make_request, но передает ClientTimeout целиком,
+        # иначе aiohttp теряет таймаут на установку соединения
+        session = await self.create_session()
+
+        url = self.api.api_url(token=bot.token, method=method.__api_method__)
+        form = self.build_form_data(bot=bot, method=method)
+
+        try:
+            async with session.post(
+                url,
+                data=form,
+                timeout=self._client_timeout(self.timeout if timeout is None else timeout),
+            ) as resp:
+                raw_result = await resp.text()
+        except asyncio.TimeoutError:
+            raise TelegramNetworkError(method=method, message="Request timeout error")
+        except ClientError as e:
+            raise TelegramNetworkError(method=method, message=f"{type(e).__name__}: {e}")
+        response = self.check_response(
+            bot=bot, method=method, status_code=resp.status, content=raw_result
+        )
+        return cast(TelegramType, response.result)
+
+
+def create_bot_session(**overrides: Any) -> TunedAiohttpSession:
+    """Создает HTTP-сессию бота по настройкам из конфигурации"""
+    params = dict(
+        limit=config.HTTP_CONNECTION_LIMIT,
+        dns_cache_ttl=config.HTTP_DNS_CACHE_TTL,
+        keepalive_timeout=config.HTTP_KEEPALIVE_TIMEOUT,
+        connect_timeout=config.HTTP_CONNECT_TIMEOUT,
+        timeout=config.HTTP_REQUEST_TIMEOUT,
+        json_loads=json_loads,
+        json_dumps=json_dumps,
+    )
+    if config.TELEGRAM_API_URL:
+        params["api"] = TelegramAPIServer.from_base(config.TELEGRAM_API_URL)
+        logging.info(f"Bot API: {config.TELEGRAM_API_URL}")
+    params.update(overrides)
+    logging.info(
+        f"HTTP-сессия Bot API: лимит соединений {params['limit']}, JSON-кодек {JSON_CODEC_NAME}"
+    )
+    session = TunedAiohttpSession(**params)
+    session.middleware(BotAPIMetricsMiddleware())
+    return session
@@ -0,0 +1,60 @@
+"""
+JSON-кодек: orjson/ujson, если установлены, иначе стандартный json
+"""
+import json
+from typing import Any, Callable, Tuple
+
+from config import config
+
+JsonDumps = Callable[[Any], str]
+JsonLoads = Callable[[Any], Any]
+
+
+def _load_orjson() -> Tuple[str, JsonDumps, JsonLoads]:
+    import orjson
+
+    def dumps(obj: Any) -> str:
+        # orjson возвращает bytes, а aiogram ожидает str
+        return orjson.dumps(obj).decode("utf-8")
+
+    return "orjson", dumps, orjson.loads
+
+
+def _load_ujson() -> Tuple[str, JsonDumps, JsonLoads]:
+    import ujson
+    return "ujson", ujson.dumps, ujson.loads
+
+
+def _load_stdlib() -> Tuple[str, JsonDumps, JsonLoads]:
+    return "json", json.dumps, json.loads
+
+
+_LOADERS = {
+    "orjson": _load_orjson,
+    "ujson": _load_ujson,
+    "json": _load_stdlib,
+}
+
+
+def get_json_codec(preferred: str = "auto") -> Tuple[str, JsonDumps, JsonLoads]:
+    """
+    Возвращает (имя, dumps, loads) для первого доступного кодека.
+    При preferred="auto" перебирает orjson -> ujson -> json.
+    """
+    if preferred == "auto":
+        order = ["orjson", "ujson", "json"]
+    else:
+        order = [preferred, "json"]
+
+    for name in order:
+        loader = _LOADERS.get(name)
+        if loader is None:
+            continue
+        try:
+            return loader()
+        except ImportError:
+            continue
+    return _load_stdlib()
+
+
+JSON_CODEC_NAME, json_dumps, json_loads = get_json_codec(config.JSON_CODEC)
@@ -20,6 +20,13 @@ def get_main_admin_keyboard() -> InlineKeyboardMarkup:
         InlineKeyboardButton(text=BUTTONS["admin_management"], callback_data="admin_management"),
         InlineKeyboardButton(text=BUTTONS["channel_management"], callback_data="channel_management")
     )
+    builder.row(
+        InlineKeyboardButton(text=BUTTONS["outbox"], callback_data="outbox_status"),
+        InlineKeyboardButton(text=BUTTONS["broadcasts"], callback_data="broadcasts_status")
+    )
+    builder.row(
+        InlineKeyboardButton(text=BUTTONS["stats"], callback_data="stats")
+    )
     
     return builder.as_markup()
 
@@ -55,6 +62,19 @@ def get_confirm_keyboard() -> InlineKeyboardMarkup:
     return builder.as_markup()
 
 
+def get_require_subscription_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура выбора: участвовать могут только подписчики канала или все"""
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text=BUTTONS["yes"], callback_data="require_subscription_yes"),
+        InlineKeyboardButton(text=BUTTONS["no"], callback_data="require_subscription_no")
+    )
+    builder.row(
+        InlineKeyboardButton(text=BUTTONS["cancel"], callback_data="cancel_creation")
+    )
+    return builder.as_markup()
+
+
 def get_channels_keyboard(channels: List[Channel]) -> InlineKeyboardMarkup:
     """Клавиатура выбора канала"""
     builder = InlineKeyboardBuilder()
@@ -125,6 +145,11 @@ def get_giveaway_details_keyboard(giveaway: Giveaway) -> InlineKeyboardMarkup:
             InlineKeyboardButton(text=BUTTONS["edit_giveaway"], 
                                callback_data=f"edit_giveaway_{giveaway.id}")
         )
+    elif giveaway.status == "finished":
+        builder.row(
+            InlineKeyboardButton(text=BUTTONS["broadcast_results"],
+                               callback_data=f"broadcast_results_{giveaway.id}")
+        )
     
     builder.row(
         InlineKeyboardButton(text=BUTTONS["delete_giveaway"], 
@@ -342,3 +367,49 @@ def get_finished_list_with_pagination_keyboard(giveaways: List[Giveaway], page:
     )
     builder.row(InlineKeyboardButton(text=BUTTONS["back"], callback_data="view_giveaways"))
     return builder.as_markup()
+
+
+def get_outbox_keyboard(has_failed: bool) -> InlineKeyboardMarkup:
+    """Клавиатура экрана очереди отправки"""
+    builder = InlineKeyboardBuilder()
+    if has_failed:
+        builder.row(
+            InlineKeyboardButton(text=BUTTONS["outbox_retry_failed"], callback_data="outbox_retry_failed")
+        )
+    builder.row(
+        InlineKeyboardButton(text=BUTTONS["refresh"], callback_data="outbox_status")
+    )
+    builder.row(
+        InlineKeyboardButton(text=BUTTONS["back_to_menu"], callback_data="main_menu")
+    )
+    return builder.as_markup()
+
+
+def get_broadcasts_keyboard(active_ids: List[int]) -> InlineKeyboardMarkup:
+    """Клавиатура экрана рассылок: остановка незавершенных и обновление прогресса"""
+    builder = InlineKeyboardBuilder()
+    for broadcast_id in active_ids:
+        builder.row(
+            InlineKeyboardButton(text=BUTTONS["broadcast_cancel"].format(id=broadcast_id),
+                               callback_data=f"broadcast_cancel_{broadcast_id}")
+        )
+    builder.row(
+        InlineKeyboardButton(text=BUTTONS["refresh"], callback_data="broadcasts_status")
+    )
+    builder.row(
+        InlineKeyboardButton(text=BUTTONS["back_to_menu"], callback_data="main_menu")
+    )
+    return builder.as_markup()
+
+
+def get_stats_keyboard() -> InlineKeyboardMarkup:
+    """Клавиатура экрана статистики"""
+    builder = InlineKeyboardBuilder()
+    builder.row(
+        InlineKeyboardButton(text=BUTTONS["refresh"], callback_data="stats"),
+        InlineKeyboardButton(text=BUTTONS["profile"], callback_data="profile")
+    )
+    builder.row(
+        InlineKeyboardButton(text=BUTTONS["back_to_menu"], callback_data="main_menu")
+    )
+    return builder.as_markup()
@@ -0,0 +1,127 @@
+"""
+Выбор лидера среди экземпляров бота через аренду в общей БД
+"""
+import asyncio
+import logging
+import os
+import socket
+import time
+import uuid
+from typing import Awaitable, Callable, Optional
+
+from database.database import acquire_lease, release_lease
+
+
+def default_instance_id() -> str:
+    """hostname:pid и короткий случайный суффикс - уникален даже при перезапуске с тем же pid"""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+class LeaderElector:
+    """
+    Держит аренду name в таблице leases, продлевая ее каждые heartbeat секунд.
+    Если аренду не удалось продлить до истечения ttl, экземпляр сам слагает полномочия
+    раньше, чем ее сможет забрать другой. Время аренды считается по часам каждого экземпляра,
+    поэтому ttl должен с запасом превышать расхождение часов между серверами.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        instance_id: str,
+        ttl: float,
+        heartbeat: float,
+        on_elected: Callable[[], Awaitable[None]],
+        on_demoted: Callable[[], Awaitable[None]],
+        on_heartbeat: Optional[Callable[[], Awaitable[None]]] = None
+    ):
+        self.name = name
+        self.instance_id = instance_id
+        self.ttl = ttl
+        self.heartbeat = min(heartbeat, ttl / 2)
+        self._on_elected = on_elected
+        self._on_demoted = on_demoted
+        self._on_heartbeat = on_heartbeat
+        self._is_leader = False
+        self._valid_until = 0.0  # time.monotonic(), до которого аренда точно наша
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._is_leader
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Останавливает продление и освобождает аренду, чтобы другой экземпляр подхватил ее сразу"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._is_leader:
+            await self._demote()
+            try:
+                await release_lease(self.name, self.instance_id)
+            except Exception as e:
+                logging.error(f"Не удалось освободить аренду {self.name}: {e}")
+
+    async def _run(self):
+        while True:
+            await self._tick()
+            await asyncio.sleep(self.heartbeat)
+
+    async def _tick(self):
+        attempt_started = time.monotonic()
+        try:
+            acquired = await acquire_lease(self.name, self.instance_id, self.ttl)
+        except Exception as e:
+            logging.error(f"Ошибка продления аренды {self.name}: {e}")
+            # Пока аренда не истекла, остаемся лидером; до следующей попытки она может истечь - слагаем заранее
+            if self._is_leader and time.monotonic() + self.heartbeat >= self._valid_until:
+                logging.warning(f"Аренда {self.name} не продлена вовремя, экземпляр {self.instance_id} слагает роль")
+                await self._demote()
+            return
+
+        if acquired:
+            self._valid_until = attempt_started + self.ttl
+            if not self._is_leader:
+                await self._elect()
+            elif self._on_heartbeat:
+                await self._call(self._on_heartbeat)
+        elif self._is_leader:
+            logging.warning(f"Аренду {self.name} забрал другой экземпляр")
+            await self._demote()
+
+    async def _elect(self):
+        """
+        Запускает обязанности лидера. Лидером экземпляр считается только после успешного запуска:
+        иначе он продлевал бы аренду, ничего не делая. При ошибке запущенное частично останавливается,
+        аренда освобождается, и на следующем продлении роль достается тому, кто первым ее захватит.
+        """
+        try:
+            await self._on_elected()
+        except Exception as e:
+            logging.error(f"Экземпляр {self.instance_id} не смог принять роль {self.name}: {e}")
+            await self._call(self._on_demoted)
+            try:
+                await release_lease(self.name, self.instance_id)
+            except Exception as release_error:
+                logging.error(f"Не удалось освободить аренду {self.name}: {release_error}")
+            return
+        self._is_leader = True
+        logging.info(f"Экземпляр {self.instance_id} получил роль {self.name}")
+
+    async def _demote(self):
+        self._is_leader = False
+        await self._call(self._on_demoted)
+
+    async def _call(self, callback: Callable[[], Awaitable[None]]):
+        try:
+            await callback()
+        except Exception as e:
+            logging.error(f"Ошибка обработчика аренды {self.name}: {e}")
@@ -0,0 +1,147 @@
+"""
+Логирование без блокирующего ввода-вывода в event loop.
+
+logging.info()/warning() в хендлерах только кладут запись в очередь (QueueHandler). Файл с ротацией
+по размеру и консоль пишет фоновый поток QueueListener. Повторяющиеся предупреждения и ошибки
+(например, «Не удалось обновить клавиатуру» при шторме нажатий) ограничиваются фильтром:
+сверх LOG_RATE_LIMIT_BURST одинаковых записей за LOG_RATE_LIMIT_SECONDS секунд отбрасываются,
+а следующая пропущенная запись сообщает, сколько похожих было подавлено.
+"""
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from config import config
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Числа в тексте (id, время, счетчики) не делают запись новой
+_DIGITS = re.compile(r"\d+")
+_MAX_KEY_LENGTH = 200
+_MAX_TRACKED_KEYS = 10000
+
+_EXCEPTION_FORMATTER = logging.Formatter()
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - одна строка JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class RateLimitFilter(logging.Filter):
+    """Не больше burst одинаковых записей уровня WARNING и выше за period секунд"""
+
+    def __init__(self, period: float, burst: int):
+        super().__init__()
+        self.period = period
+        self.burst = max(1, burst)
+        # ключ -> [начало окна, записей в окне, подавлено в окне]
+        self._windows: Dict[Tuple[str, int, str], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING or self.period <= 0:
+            return True
+        key = (record.name, record.levelno, _DIGITS.sub("#", str(record.msg)[:_MAX_KEY_LENGTH]))
+        now = time.monotonic()
+        window = self._windows.get(key)
+        if window is None or now - window[0] >= self.period:
+            suppressed = window[2] if window is not None else 0
+            if len(self._windows) >= _MAX_TRACKED_KEYS:
+                self._windows.clear()
+            self._windows[key] = [now, 1, 0]
+            if suppressed:
+                record.msg = f"{record.getMessage()} (подавлено похожих: {suppressed} за {self.period:g} с)"
+                record.args = None
+            return True
+        if window[1] < self.burst:
+            window[1] += 1
+            return True
+        window[2] += 1
+        return False
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler с ограниченной очередью: если писатель не успевает, запись теряется, а не ждет"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Текст и трассировка фиксируются до передачи в поток; трассировка остается отдельным полем для JSON
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _EXCEPTION_FORMATTER.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """Настраивает корневой логгер: очередь, фоновый писатель, ротация, JSON и ограничение повторов"""
+    global _listener
+    formatter = JsonFormatter() if config.LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+
+    handlers = [logging.StreamHandler(sys.stdout)]
+    if config.LOG_FILE:
+        handlers.append(logging.handlers.RotatingFileHandler(
+            config.LOG_FILE,
+            maxBytes=config.LOG_FILE_MAX_BYTES,
+            backupCount=config.LOG_FILE_BACKUPS,
+            encoding="utf-8"
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(maxsize=config.LOG_QUEUE_SIZE))
+    queue_handler.addFilter(RateLimitFilter(config.LOG_RATE_LIMIT_SECONDS, config.LOG_RATE_LIMIT_BURST))
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(config.LOG_LEVEL)
+
+    _listener = logging.handlers.QueueListener(queue_handler.queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    """Дописывает очередь и останавливает фоновый поток (вызывать последним при остановке)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
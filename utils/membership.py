@@ -0,0 +1,128 @@
+"""
+Проверка подписки на канал через getChatMember с TTL-кэшем положительных и отрицательных ответов
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from aiogram.enums import ChatMemberStatus
+from aiogram.exceptions import TelegramBadRequest
+
+from config import config
+
+_MEMBER_STATUSES = {ChatMemberStatus.CREATOR, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.MEMBER}
+
+
+class MembershipCache:
+    """
+    Кэш (chat_id, user_id) -> подписан ли, с ограничением размера (LRU).
+    Положительный ответ живет дольше: повторные нажатия подписчика не тратят запросов к Bot API.
+    Отрицательный - недолго, чтобы только что подписавшийся пользователь смог участвовать.
+    Одновременные запросы одного пользователя объединяются в один вызов getChatMember.
+    """
+
+    def __init__(self, positive_ttl: float, negative_ttl: float, max_size: int):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max(1, max_size)
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[bool, float]]" = OrderedDict()
+        self._inflight: Dict[Tuple[int, int], asyncio.Future] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, chat_id: int, user_id: int) -> Optional[bool]:
+        key = (chat_id, user_id)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        is_member, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return is_member
+
+    def set(self, chat_id: int, user_id: int, is_member: bool):
+        ttl = self.positive_ttl if is_member else self.negative_ttl
+        key = (chat_id, user_id)
+        self._entries[key] = (is_member, time.monotonic() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, chat_id: int, user_id: int):
+        self._entries.pop((chat_id, user_id), None)
+
+    async def is_member(self, bot, chat_id: int, user_id: int, fresh: bool = False) -> bool:
+        """
+        Подписан ли пользователь. fresh=True - спросить Telegram в обход кэша (итоговая проверка победителей).
+        Если Telegram ответить не смог, пользователь считается подписанным и ответ не кэшируется:
+        сбой Bot API или прав бота не должен лишать участия.
+        """
+        if not fresh:
+            cached = self.get(chat_id, user_id)
+            if cached is not None:
+                self.hits += 1
+                return cached
+        self.misses += 1
+
+        key = (chat_id, user_id)
+        future = self._inflight.get(key)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await self._fetch(bot, chat_id, user_id)
+            future.set_result(result)
+            return result
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # Ошибку увидит вызывающий, ожидающих может не быть
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _fetch(self, bot, chat_id: int, user_id: int) -> bool:
+        try:
+            member = await bot.get_chat_member(chat_id=chat_id, user_id=user_id)
+        except TelegramBadRequest as e:
+            # "user not found" и подобные - пользователя в канале нет
+            logging.debug(f"getChatMember {chat_id}/{user_id}: {e}")
+            self.set(chat_id, user_id, False)
+            return False
+        except Exception as e:
+            logging.warning(f"Не удалось проверить подписку {user_id} на {chat_id}: {e}")
+            return True
+        is_member = member.status in _MEMBER_STATUSES or (
+            member.status == ChatMemberStatus.RESTRICTED and getattr(member, "is_member", False)
+        )
+        self.set(chat_id, user_id, is_member)
+        return is_member
+
+    async def find_non_members(self, bot, chat_id: int, user_ids: Iterable[int],
+                               concurrency: int = None) -> Set[int]:
+        """Свежая проверка пачки пользователей не больше чем concurrency запросами одновременно"""
+        semaphore = asyncio.Semaphore(max(1, concurrency or config.MEMBERSHIP_CHECK_CONCURRENCY))
+
+        async def check(user_id: int) -> Tuple[int, bool]:
+            async with semaphore:
+                return user_id, await self.is_member(bot, chat_id, user_id, fresh=True)
+
+        results = await asyncio.gather(*(check(user_id) for user_id in set(user_ids)))
+        return {user_id for user_id, is_member in results if not is_member}
+
+
+membership_cache = MembershipCache(
+    positive_ttl=config.MEMBERSHIP_CACHE_TTL,
+    negative_ttl=config.MEMBERSHIP_NEGATIVE_TTL,
+    max_size=config.MEMBERSHIP_CACHE_SIZE
+)
@@ -0,0 +1,356 @@
+"""
+Метрики в формате Prometheus: задержки хендлеров, запросов к БД и Bot API, отставание планировщика,
+число участий по розыгрышам. Отдаются по HTTP на METRICS_HOST:METRICS_PORT (/metrics).
+
+Запись - несколько операций со словарем без блокировок (все в одном потоке event loop),
+поэтому метрики можно не выключать в продакшене.
+"""
+import functools
+import inspect
+import logging
+import re
+import time
+from bisect import bisect_left
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramAPIError, TelegramRetryAfter
+from aiogram.types import CallbackQuery, Message, TelegramObject
+
+from config import config
+from utils.tracing import SPAN_KIND_CLIENT, span
+
+# Границы корзин гистограмм задержек, секунд
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    """Счетчик с метками"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def get(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def remove(self, *labels: str):
+        self._values.pop(labels, None)
+
+    def items(self) -> List[Tuple[Tuple[str, ...], float]]:
+        return list(self._values.items())
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labels, value in self._values.items():
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Gauge(Counter):
+    """Значение, которое может уменьшаться"""
+
+    def set(self, *labels: str, value: float):
+        self._values[labels] = value
+
+    def render(self) -> List[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+
+# Окно «недавних» значений гистограмм для экрана статистики, секунд
+RECENT_WINDOW = 300
+
+
+class _HistogramSeries:
+    __slots__ = ("counts", "sum", "count", "recent", "previous", "window_start")
+
+    def __init__(self, size: int):
+        self.counts = [0] * size
+        self.sum = 0.0
+        self.count = 0
+        # Корзины текущего и предыдущего окна: недавние значения без хранения самих наблюдений
+        self.recent = [0] * size
+        self.previous = [0] * size
+        self.window_start = time.monotonic()
+
+    def rotate(self, now: float, window: float):
+        age = now - self.window_start
+        if age < window:
+            return
+        self.previous = self.recent if age < 2 * window else [0] * len(self.counts)
+        self.recent = [0] * len(self.counts)
+        self.window_start = now
+
+    def recent_counts(self, now: float, window: float) -> List[int]:
+        """Корзины за последние window..2*window секунд"""
+        age = now - self.window_start
+        if age >= 2 * window:
+            return [0] * len(self.counts)
+        if age >= window:
+            return list(self.recent)
+        return [a + b for a, b in zip(self.previous, self.recent)]
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: observe() - поиск корзины bisect и несколько сложений"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS, window: float = RECENT_WINDOW):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self.window = window
+        self._series: Dict[Tuple[str, ...], _HistogramSeries] = {}
+
+    def observe(self, value: float, *labels: str):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = _HistogramSeries(len(self.buckets) + 1)
+        index = bisect_left(self.buckets, value)
+        series.counts[index] += 1
+        series.sum += value
+        series.count += 1
+        series.rotate(time.monotonic(), self.window)
+        series.recent[index] += 1
+
+    def series(self) -> Dict[Tuple[str, ...], _HistogramSeries]:
+        return self._series
+
+    def _bucket_quantile(self, counts: Sequence[int], q: float) -> Optional[float]:
+        total = sum(counts)
+        if total == 0:
+            return None
+        rank = q * total
+        cumulative = 0
+        for index, count in enumerate(counts):
+            cumulative += count
+            if cumulative >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float("inf")
+        return float("inf")
+
+    def quantile(self, q: float, *labels: str) -> Optional[float]:
+        """Оценка квантиля по корзинам (верхняя граница корзины, как histogram_quantile без интерполяции)"""
+        series = self._series.get(labels)
+        if series is None:
+            return None
+        return self._bucket_quantile(series.counts, q)
+
+    def recent(self, *labels: str) -> Tuple[int, Optional[float]]:
+        """(число наблюдений, p99) за последние window..2*window секунд; без меток - по всем сериям"""
+        now = time.monotonic()
+        if labels:
+            selected = [self._series[labels]] if labels in self._series else []
+        else:
+            selected = list(self._series.values())
+        counts = [0] * (len(self.buckets) + 1)
+        for series in selected:
+            for index, count in enumerate(series.recent_counts(now, self.window)):
+                counts[index] += count
+        return sum(counts), self._bucket_quantile(counts, 0.99)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labels, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series.counts):
+                cumulative += count
+                bucket_labels = _format_labels(self.labelnames, labels, 'le="%s"' % bound)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            bucket_labels = _format_labels(self.labelnames, labels, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {series.count}")
+            label_str = _format_labels(self.labelnames, labels)
+            lines.append(f"{self.name}_sum{label_str} {series.sum}")
+            lines.append(f"{self.name}_count{label_str} {series.count}")
+        return lines
+
+
+class RateWindow:
+    """Число событий за последние window секунд: кольцо посекундных корзин, inc() - O(1)"""
+
+    def __init__(self, window: int = 60):
+        self.window = window
+        self._counts = [0] * window
+        self._seconds = [0] * window
+
+    def inc(self, amount: int = 1):
+        second = int(time.monotonic())
+        index = second % self.window
+        if self._seconds[index] != second:
+            self._seconds[index] = second
+            self._counts[index] = 0
+        self._counts[index] += amount
+
+    def total(self) -> int:
+        now = int(time.monotonic())
+        return sum(count for count, second in zip(self._counts, self._seconds) if now - second < self.window)
+
+
+handler_seconds = Histogram(
+    "bot_handler_seconds", "Время обработки апдейта хендлером", ("router", "event", "action")
+)
+handler_errors = Counter(
+    "bot_handler_errors_total", "Исключения в хендлерах", ("router", "event", "action")
+)
+db_seconds = Histogram(
+    "bot_db_query_seconds", "Время выполнения функций database.database", ("function",)
+)
+bot_api_seconds = Histogram(
+    "bot_api_request_seconds", "Время запросов к Bot API", ("method",)
+)
+bot_api_errors = Counter(
+    "bot_api_errors_total", "Ошибки запросов к Bot API", ("method", "error")
+)
+scheduler_lag_seconds = Histogram(
+    "bot_scheduler_lag_seconds", "Насколько позже end_time сработал таймер завершения", buckets=LAG_BUCKETS
+)
+giveaway_joins = Counter(
+    "bot_giveaway_joins_total", "Успешные участия в активных розыгрышах", ("giveaway_id",)
+)
+
+# Участия за последнюю минуту для экрана статистики (Prometheus считает rate() сам)
+joins_last_minute = RateWindow(60)
+
+REGISTRY = [
+    handler_seconds, handler_errors, db_seconds, bot_api_seconds, bot_api_errors,
+    scheduler_lag_seconds, giveaway_joins
+]
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# Числовые хвосты callback_data (participate_15, giveaway_details_7) отбрасываются,
+# чтобы число меток не росло с числом розыгрышей
+_CALLBACK_ID_SUFFIX = re.compile(r"(_-?\d+)+$")
+
+
+def callback_action(data: Optional[str]) -> str:
+    if not data:
+        return ""
+    return _CALLBACK_ID_SUFFIX.sub("", data)[:64]
+
+
+def event_action(event: TelegramObject, data: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    (тип события, действие) для меток: префикс callback_data или команда сообщения.
+    Команда берется из фильтра Command, то есть только известная боту, - иначе произвольный
+    текст пользователей раздувал бы число меток.
+    """
+    if isinstance(event, CallbackQuery):
+        return "callback_query", callback_action(event.data)
+    if isinstance(event, Message):
+        command = data.get("command")
+        return "message", f"/{command.command}" if command else ""
+    return type(event).__name__, ""
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware роутера: время хендлера с метками роутера и действия"""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        router = data.get("event_router")
+        labels = (router.name if router else "", *event_action(event, data))
+        started = time.perf_counter()
+        try:
+            with span(f"handler {labels[0]}:{labels[2]}"):
+                return await handler(event, data)
+        except Exception:
+            handler_errors.inc(*labels)
+            raise
+        finally:
+            handler_seconds.observe(time.perf_counter() - started, *labels)
+
+
+class BotAPIMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware HTTP-сессии бота: время и ошибки запросов по методу Bot API"""
+
+    async def __call__(self, make_request: NextRequestMiddlewareType, bot, method):
+        api_method = method.__api_method__
+        started = time.perf_counter()
+        try:
+            with span(f"bot_api {api_method}", kind=SPAN_KIND_CLIENT):
+                return await make_request(bot, method)
+        except TelegramRetryAfter:
+            bot_api_errors.inc(api_method, "retry_after")
+            raise
+        except TelegramAPIError as e:
+            bot_api_errors.inc(api_method, type(e).__name__)
+            raise
+        finally:
+            bot_api_seconds.observe(time.perf_counter() - started, api_method)
+
+
+def timed_db_function(func: Callable[..., Awaitable[Any]]) -> Callable[..., Awaitable[Any]]:
+    name = func.__name__
+    span_name = f"db {name}"
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            with span(span_name, kind=SPAN_KIND_CLIENT):
+                return await func(*args, **kwargs)
+        finally:
+            db_seconds.observe(time.perf_counter() - started, name)
+
+    return wrapper
+
+
+def instrument_db_module(namespace: Dict[str, Any], module_name: str):
+    """Оборачивает публичные async-функции модуля замером времени (вызывается в конце database.database)"""
+    for name, value in list(namespace.items()):
+        if (
+            not name.startswith("_")
+            and inspect.iscoroutinefunction(value)
+            and value.__module__ == module_name
+        ):
+            namespace[name] = timed_db_function(value)
+
+
+async def metrics_handler(request: web.Request) -> web.Response:
+    return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8",
+                        headers={"X-Content-Type-Options": "nosniff"})
+
+
+async def start_metrics_server() -> Optional[web.AppRunner]:
+    """Запускает HTTP-сервер метрик, если задан METRICS_PORT"""
+    if not config.METRICS_PORT:
+        return None
+    app = web.Application()
+    app.router.add_get("/metrics", metrics_handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=config.METRICS_HOST, port=config.METRICS_PORT).start()
+    logging.info(f"Метрики: http://{config.METRICS_HOST}:{config.METRICS_PORT}/metrics")
+    return runner
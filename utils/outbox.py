@@ -0,0 +1,212 @@
+"""
+Исходящая очередь (outbox): операции с каналами сохраняются в БД и доставляются фоновым воркером
+с повторами, экспоненциальной задержкой и учетом RetryAfter
+"""
+import asyncio
+import logging
+import random
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from aiogram.exceptions import (
+    TelegramBadRequest, TelegramForbiddenError, TelegramNotFound,
+    TelegramRetryAfter, TelegramUnauthorizedError
+)
+
+from config import config
+from database.database import (
+    claim_due_outbox, mark_outbox_sent, mark_outbox_retry, mark_outbox_failed,
+    reset_sending_outbox, save_outbox_progress, set_winner_dm_status
+)
+from database.models import OutboxMessage, WinnerDMStatus
+from utils.json_codec import json_loads
+from utils.rate_limiter import TokenBucket
+
+# Ошибки, после которых повтор не поможет: нет прав, чат не найден, некорректный запрос
+PERMANENT_ERRORS = (TelegramBadRequest, TelegramForbiddenError, TelegramNotFound, TelegramUnauthorizedError)
+
+# Ограничение частоты отправки в каналы, чтобы массовое завершение не упиралось в лимиты Telegram
+channel_limiter = TokenBucket(rate=config.ANNOUNCE_RATE_PER_SEC, capacity=config.ANNOUNCE_BURST)
+
+# Ограничение частоты личных сообщений (общий лимит Bot API - около 30 сообщений в секунду)
+dm_limiter = TokenBucket(rate=config.DM_RATE_PER_SEC, capacity=config.DM_RATE_PER_SEC)
+
+# Операции с личными сообщениями обслуживает отдельный воркер, чтобы они не задерживали публикации в каналах
+DM_KINDS = ["winner_dm"]
+
+
+async def _send_message(bot, item: OutboxMessage, payload: dict):
+    await channel_limiter.acquire()
+    await bot.send_message(chat_id=item.chat_id, **payload)
+
+
+async def _repost_giveaway(bot, item: OutboxMessage, payload: dict):
+    from database.database import get_giveaway
+    from handlers.giveaway_handlers import replace_giveaway_post, send_giveaway_post
+
+    giveaway = await get_giveaway(item.giveaway_id, with_participants=False)
+    if not giveaway:
+        return  # Розыгрыш удален - перепубликовывать нечего
+    if "posted_message_id" not in payload:
+        if giveaway.status != "active":
+            return  # Уже завершен - итоги публикуются отдельно
+        await channel_limiter.acquire()
+        sent_message = await send_giveaway_post(bot, giveaway)
+        # Новый пост уже в канале: если дальше что-то упадет, повтор не отправит его второй раз
+        payload = {**payload, "posted_message_id": sent_message.message_id, "replaced_message_id": giveaway.message_id}
+        await save_outbox_progress(item.id, payload)
+    await replace_giveaway_post(bot, giveaway, payload["replaced_message_id"], payload["posted_message_id"])
+
+
+async def _winner_dm(bot, item: OutboxMessage, payload: dict):
+    await dm_limiter.acquire()
+    await bot.send_message(chat_id=item.chat_id, **payload)
+    await set_winner_dm_status(item.giveaway_id, item.chat_id, WinnerDMStatus.SENT.value)
+
+
+async def _winner_dm_failed(item: OutboxMessage, error: Exception):
+    # Forbidden - пользователь заблокировал бота или не начинал с ним диалог
+    status = WinnerDMStatus.BLOCKED if isinstance(error, TelegramForbiddenError) else WinnerDMStatus.FAILED
+    await set_winner_dm_status(item.giveaway_id, item.chat_id, status.value)
+
+
+# Обработчики доставки по kind
+DELIVERY_HANDLERS: Dict[str, Callable[..., Awaitable[None]]] = {
+    "send_message": _send_message,
+    "repost_giveaway": _repost_giveaway,
+    "winner_dm": _winner_dm,
+}
+
+# Вызываются, когда операция окончательно не доставлена
+FAILURE_HANDLERS: Dict[str, Callable[[OutboxMessage, Exception], Awaitable[None]]] = {
+    "winner_dm": _winner_dm_failed,
+}
+
+
+def retry_delay(attempts: int) -> float:
+    """Экспоненциальная задержка с разбросом: base * 2^attempts, не больше OUTBOX_RETRY_MAX"""
+    delay = min(config.OUTBOX_RETRY_MAX, config.OUTBOX_RETRY_BASE * (2 ** attempts))
+    return delay * random.uniform(0.8, 1.2)
+
+
+class OutboxWorker:
+    """Забирает готовые операции пачками и доставляет их параллельно, не блокируя хендлеры"""
+
+    def __init__(self, concurrency: int, batch_size: int, poll_interval: float,
+                 kinds: List[str] = None, exclude_kinds: List[str] = None):
+        self.concurrency = max(1, concurrency)
+        self.batch_size = max(1, batch_size)
+        self.poll_interval = poll_interval
+        self.kinds = kinds
+        self.exclude_kinds = exclude_kinds
+        self.in_flight = 0  # Операций из текущей пачки, еще не доставленных
+        self._bot = None
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, bot):
+        self._bot = bot
+        if not self.running:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self.in_flight = 0
+
+    def wakeup(self):
+        """Сообщает воркеру о новой операции, чтобы не ждать следующего опроса"""
+        self._wakeup.set()
+
+    async def _run(self):
+        restored = await reset_sending_outbox(self.kinds, self.exclude_kinds)
+        if restored:
+            logging.warning(f"Outbox: {restored} операций возвращено в очередь после перезапуска")
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def deliver(item: OutboxMessage):
+            async with semaphore:
+                try:
+                    await self._deliver(item)
+                except Exception as e:
+                    # Операция останется в sending и вернется в очередь при следующем запуске воркера
+                    logging.error(f"Outbox #{item.id}: ошибка обновления статуса: {e}")
+                finally:
+                    self.in_flight -= 1
+
+        while True:
+            self._wakeup.clear()
+            try:
+                items = await claim_due_outbox(self.batch_size, self.kinds, self.exclude_kinds)
+            except Exception as e:
+                logging.error(f"Outbox: ошибка выборки операций: {e}")
+                items = []
+            if items:
+                self.in_flight = len(items)
+                await asyncio.gather(*(deliver(item) for item in items))
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _deliver(self, item: OutboxMessage):
+        handler = DELIVERY_HANDLERS.get(item.kind)
+        if handler is None:
+            await mark_outbox_failed(item.id, f"Неизвестный тип операции: {item.kind}")
+            return
+        try:
+            await handler(self._bot, item, json_loads(item.payload))
+        except TelegramRetryAfter as e:
+            logging.warning(f"Outbox #{item.id}: RetryAfter {e.retry_after} с")
+            # Лимит общий для всех отправок этого типа - остальные операции тоже ждут, а не попадают в тот же флуд
+            (dm_limiter if item.kind in DM_KINDS else channel_limiter).pause(e.retry_after)
+            await mark_outbox_retry(item.id, e.retry_after, str(e), count_attempt=False)
+            return
+        except PERMANENT_ERRORS as e:
+            # Заблокированный бот в личке - обычная ситуация, а не авария
+            log = logging.warning if item.kind in DM_KINDS else logging.error
+            log(f"Outbox #{item.id} ({item.kind}) не доставлена: {e}")
+            await self._fail(item, e)
+            return
+        except Exception as e:
+            if item.attempts + 1 >= config.OUTBOX_MAX_ATTEMPTS:
+                logging.error(f"Outbox #{item.id} ({item.kind}): попытки исчерпаны: {e}")
+                await self._fail(item, e)
+            else:
+                delay = retry_delay(item.attempts)
+                logging.warning(f"Outbox #{item.id} ({item.kind}): ошибка, повтор через {delay:.0f} с: {e}")
+                await mark_outbox_retry(item.id, delay, str(e))
+            return
+        await mark_outbox_sent(item.id)
+
+    async def _fail(self, item: OutboxMessage, error: Exception):
+        await mark_outbox_failed(item.id, str(error))
+        on_failed = FAILURE_HANDLERS.get(item.kind)
+        if on_failed:
+            await on_failed(item, error)
+
+
+# Публикации в каналы
+outbox_worker = OutboxWorker(
+    concurrency=config.OUTBOX_CONCURRENCY,
+    batch_size=config.OUTBOX_BATCH_SIZE,
+    poll_interval=config.OUTBOX_POLL_SECONDS,
+    exclude_kinds=DM_KINDS
+)
+
+# Личные сообщения победителям
+dm_worker = OutboxWorker(
+    concurrency=config.DM_CONCURRENCY,
+    batch_size=config.OUTBOX_BATCH_SIZE,
+    poll_interval=config.OUTBOX_POLL_SECONDS,
+    kinds=DM_KINDS
+)
@@ -0,0 +1,162 @@
+"""
+Профилирование работающего бота по запросу админа (/profile или кнопка на экране /stats).
+
+Пока профиль не снимается, ничего не работает: нет потока, хуков и tracemalloc. Во время съемки
+отдельный поток каждые PROFILE_INTERVAL_MS читает стек потока event loop через sys._current_frames()
+и считает одинаковые стеки. Результат - файл в формате collapsed stacks («кадр;кадр;кадр число»),
+который открывают flamegraph.pl, speedscope или inferno. Параллельно включается tracemalloc:
+в конце снимается топ строк кода по памяти, выделенной за время съемки и еще не освобожденной.
+"""
+import asyncio
+import html
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import dataclass
+from datetime import datetime
+from typing import List, Optional
+
+from aiogram.types import BufferedInputFile
+
+from config import config
+from texts.messages import MESSAGES, PROFILE_ALLOCATION_ITEM
+
+# Стеки глубже обрезаются со стороны корня
+_MAX_DEPTH = 200
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _short_path(path: str) -> str:
+    """Путь относительно проекта или site-packages/stdlib"""
+    if path.startswith(_PROJECT_ROOT):
+        return os.path.relpath(path, _PROJECT_ROOT)
+    for marker in ("site-packages" + os.sep, "lib" + os.sep + "python"):
+        index = path.find(marker)
+        if index != -1:
+            return path[index + len(marker):]
+    return path
+
+
+def _frame_name(code) -> str:
+    # Пробелы и «;» - разделители формата collapsed stacks
+    return f"{code.co_name} ({_short_path(code.co_filename)})".replace(";", ":").replace(" ", "_")
+
+
+@dataclass
+class ProfileResult:
+    seconds: float
+    samples: int
+    collapsed: str
+    allocations: List[str]
+
+
+class StackSampler:
+    """Поток, снимающий стек одного потока с заданным интервалом"""
+
+    def __init__(self, thread_id: int, interval: float):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            names = []
+            while frame is not None and len(names) < _MAX_DEPTH:
+                names.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            self.stacks[";".join(reversed(names))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class Profiler:
+    """Одна съемка профиля за раз; результат отправляется файлом в чат, откуда его запросили"""
+
+    def __init__(self):
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, bot, chat_id: int, seconds: float) -> bool:
+        """Запускает съемку в фоне; False, если профиль уже снимается"""
+        if self.running:
+            return False
+        self._task = asyncio.create_task(self._run(bot, chat_id, seconds))
+        return True
+
+    async def sample(self, seconds: float) -> ProfileResult:
+        """Снимает профиль потока event loop за seconds секунд"""
+        sampler = StackSampler(threading.get_ident(), config.PROFILE_INTERVAL_MS / 1000)
+        # tracemalloc мог включить кто-то другой (PYTHONTRACEMALLOC) - тогда его не выключаем
+        owns_tracemalloc = not tracemalloc.is_tracing()
+        if owns_tracemalloc:
+            tracemalloc.start()
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            await asyncio.to_thread(sampler.stop)
+            snapshot = tracemalloc.take_snapshot()
+            if owns_tracemalloc:
+                tracemalloc.stop()
+        elapsed = time.perf_counter() - started
+
+        snapshot = snapshot.filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),
+        ))
+        allocations = []
+        for stat in snapshot.statistics("lineno")[:config.PROFILE_TOP_ALLOCATIONS]:
+            frame = stat.traceback[0]
+            allocations.append(PROFILE_ALLOCATION_ITEM.format(
+                size=stat.size / 1024,
+                count=stat.count,
+                location=html.escape(f"{_short_path(frame.filename)}:{frame.lineno}")
+            ))
+        return ProfileResult(elapsed, sampler.samples, sampler.collapsed(), allocations)
+
+    async def _run(self, bot, chat_id: int, seconds: float):
+        try:
+            result = await self.sample(seconds)
+            filename = f"profile-{datetime.now().strftime('%Y%m%d-%H%M%S')}.folded"
+            await bot.send_document(
+                chat_id,
+                BufferedInputFile(result.collapsed.encode("utf-8"), filename=filename),
+                caption=MESSAGES["profile_done"].format(seconds=round(result.seconds), samples=result.samples)
+            )
+            await bot.send_message(
+                chat_id,
+                MESSAGES["profile_allocations"].format(items="\n".join(result.allocations) or "—")
+            )
+            logging.info(f"Профиль за {result.seconds:.0f} с: {result.samples} выборок")
+        except Exception as e:
+            logging.error(f"Ошибка профилирования: {e}")
+            try:
+                await bot.send_message(chat_id, MESSAGES["profile_error"].format(error=html.escape(str(e))))
+            except Exception:
+                pass
+
+
+profiler = Profiler()
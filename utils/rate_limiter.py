@@ -0,0 +1,56 @@
+"""
+Асинхронный ограничитель частоты запросов к Bot API
+"""
+import asyncio
+import time
+
+
+class TokenBucket:
+    """Token bucket: не больше rate операций в секунду, с запасом в capacity операций"""
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waiting = 0  # Сколько отправок сейчас ждут жетон
+        self._paused_until = 0.0  # time.monotonic(), до которого отправки приостановлены
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def pause(self, seconds: float):
+        """Приостанавливает все отправки на seconds секунд (RetryAfter от Telegram); запас жетонов сгорает"""
+        until = time.monotonic() + seconds
+        if until > self._paused_until:
+            self._paused_until = until
+            self._tokens = 0.0
+
+    async def acquire(self, tokens: float = 1):
+        """Ждет, пока в ведре не наберется tokens жетонов, и забирает их"""
+        if self.rate <= 0:
+            # Без ограничения частоты пауза по RetryAfter все равно соблюдается
+            paused_for = self._paused_until - time.monotonic()
+            if paused_for > 0:
+                await asyncio.sleep(paused_for)
+            return
+        self.waiting += 1
+        try:
+            async with self._lock:
+                while True:
+                    paused_for = self._paused_until - time.monotonic()
+                    if paused_for > 0:
+                        await asyncio.sleep(paused_for)
+                        # Жетоны начинают копиться только после паузы
+                        self._updated = max(self._updated, time.monotonic())
+                        continue
+                    self._refill()
+                    if self._tokens >= tokens:
+                        self._tokens -= tokens
+                        return
+                    await asyncio.sleep((tokens - self._tokens) / self.rate)
+        finally:
+            self.waiting -= 1
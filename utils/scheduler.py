@@ -1,172 +1,507 @@
 import asyncio
 import logging
-import random
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.date import DateTrigger
 import pytz
 
-from database.database import get_active_giveaways, finish_giveaway, get_participants, delete_finished_older_than
-from texts.messages import WINNER_ANNOUNCEMENT_TEMPLATE, NO_PARTICIPANTS_TEMPLATE
+from config import config
+from database.database import (
+    get_active_giveaway_schedule, finish_giveaway, claim_giveaway_finish, release_giveaway_claim,
+    delete_finished_older_than, delete_sent_outbox_older_than, get_overdue_giveaway_ids,
+    get_giveaway_schedule_changes, get_recent_winner_user_ids, delete_expired_fsm_records
+)
+from database.models import WinnerDMStatus
+from texts.messages import WINNER_ANNOUNCEMENT_TEMPLATE, NO_PARTICIPANTS_TEMPLATE, WINNER_DM_TEMPLATE
 from utils.datetime_utils import format_datetime
+from utils.draw import DrawSnapshot, ExcludeCallback, draw_winners, prepare_draw
+from utils.expiry_scheduler import ExpiryScheduler
+from utils.leader import LeaderElector, default_instance_id
+from utils.outbox import outbox_worker, dm_worker
+from utils.broadcast import broadcast_runner
+from utils.membership import membership_cache
+from utils.metrics import giveaway_joins, scheduler_lag_seconds
 
-scheduler = AsyncIOScheduler()
+# Насколько розыгрыш может опоздать и все еще завершиться по таймеру; более старые завершает догоняющий проход
+MISFIRE_GRACE_SECONDS = 60
 
+# Служебные периодические задачи держатся в памяти: лидер добавляет их заново при каждом избрании,
+# а хранилище в БД писало бы на диск синхронно прямо из event loop
+scheduler = AsyncIOScheduler(
+    job_defaults={"coalesce": True, "misfire_grace_time": MISFIRE_GRACE_SECONDS},
+    timezone=pytz.UTC
+)
 
-async def setup_scheduler(bot):
-    """Настройка планировщика"""
-    scheduler.start()
+# Первый запуск ежедневной очистки после избрания: расписание не переживает перезапуск,
+# и без этого частые перезапуски откладывали бы очистку бесконечно
+CLEANUP_FIRST_RUN_DELAY = timedelta(minutes=5)
+
+# Бот, которым завершаются розыгрыши (задается в setup_scheduler)
+_bot = None
+
+_catch_up_lock = asyncio.Lock()
+_background_tasks = set()
+
+# Общие на все пачки: пачки по соседним дедлайнам и догоняющий проход могут идти одновременно.
+# У фаз отдельные семафоры - завершение ждет снимок подготовки и не должно занимать ее места
+_finish_semaphore = asyncio.Semaphore(max(1, config.FINISH_CONCURRENCY))
+_prepare_semaphore = asyncio.Semaphore(max(1, config.FINISH_CONCURRENCY))
+
+
+async def _finish_batch(giveaway_ids: List[int]):
+    """Завершает пачку розыгрышей с одинаковым end_time; всего одновременно - не больше FINISH_CONCURRENCY"""
+    async def finish_one(giveaway_id: int):
+        async with _finish_semaphore:
+            await finish_giveaway_task(_bot, giveaway_id)
     
-    # Планируем все активные розыгрыши
-    active_giveaways = await get_active_giveaways()
-    for giveaway in active_giveaways:
-        if giveaway.end_time > datetime.utcnow():
-            schedule_giveaway_finish(bot, giveaway.id, giveaway.end_time)
+    await asyncio.gather(*(finish_one(giveaway_id) for giveaway_id in giveaway_ids))
+
+
+# Дедлайны розыгрышей: одна куча и одна asyncio-задача вместо задачи APScheduler на каждый розыгрыш
+expiry_scheduler = ExpiryScheduler(on_expire=_finish_batch, on_lag=scheduler_lag_seconds.observe)
+
+# Снимки участников, подготовленные за PREFINISH_LEAD_SECONDS до end_time: giveaway_id -> задача prepare_draw
+_snapshots: Dict[int, asyncio.Task] = {}
+
+
+async def _prepare_batch(giveaway_ids: List[int]):
+    """Первая фаза завершения: заранее читает участников, чтобы в end_time осталось дочитать только новых"""
+    async def prepare_one(giveaway_id: int) -> Optional[DrawSnapshot]:
+        async with _prepare_semaphore:
+            try:
+                snapshot = await prepare_draw(giveaway_id)
+                logging.info(f"Подготовлен снимок розыгрыша #{giveaway_id}: {len(snapshot)} участников")
+                return snapshot
+            except Exception as e:
+                logging.error(f"Ошибка подготовки снимка розыгрыша #{giveaway_id}: {e}")
+                return None
     
-    # Ежедневная авто-очистка завершенных старше 15 дней (только из базы)
+    for giveaway_id in giveaway_ids:
+        _drop_snapshot(giveaway_id)
+        _snapshots[giveaway_id] = asyncio.create_task(prepare_one(giveaway_id))
+
+
+# Дедлайны подготовки: те же розыгрыши, сдвинутые на PREFINISH_LEAD_SECONDS раньше
+prepare_scheduler = ExpiryScheduler(on_expire=_prepare_batch)
+
+
+def _drop_snapshot(giveaway_id: int):
+    task = _snapshots.pop(giveaway_id, None)
+    if task and not task.done():
+        task.cancel()
+
+
+async def _await_snapshot(task: Optional[asyncio.Task]) -> Optional[DrawSnapshot]:
+    """Результат подготовки снимка; если она еще идет - дожидается ее"""
+    if task is None:
+        return None
     try:
-        scheduler.add_job(
-            cleanup_old_finished,
-            "interval",
-            days=1,
-            id="cleanup_finished",
-            name="Очистка завершенных розыгрышей старше 15 дней",
-            args=[15]
-        )
-    except Exception:
-        pass
-    
-    logging.info(f"Запланировано {len(active_giveaways)} активных розыгрышей")
+        return await task
+    except asyncio.CancelledError:
+        return None
 
 
-def schedule_giveaway_finish(bot, giveaway_id: int, end_time: datetime):
-    """Планирование завершения розыгрыша"""
-    job_id = f"finish_giveaway_{giveaway_id}"
+def _schedule_deadline(giveaway_id: int, end_time: datetime):
+    """Ставит (или переносит) завершение и подготовку снимка"""
+    expiry_scheduler.schedule(giveaway_id, end_time)
+    _drop_snapshot(giveaway_id)
+    if config.PREFINISH_LEAD_SECONDS > 0:
+        prepare_scheduler.schedule(giveaway_id, _as_utc(end_time) - timedelta(seconds=config.PREFINISH_LEAD_SECONDS))
+
+
+def _cancel_deadline(giveaway_id: int) -> bool:
+    prepare_scheduler.cancel(giveaway_id)
+    _drop_snapshot(giveaway_id)
+    return expiry_scheduler.cancel(giveaway_id)
+
+
+def _as_utc(dt: datetime) -> datetime:
+    """Наивные даты из БД хранятся в UTC"""
+    if dt.tzinfo is None:
+        return pytz.UTC.localize(dt)
+    return dt.astimezone(pytz.UTC)
+
+
+async def setup_scheduler(bot):
+    """Настройка планировщика"""
+    global _bot
+    _bot = bot
+    # Задачи выполняются только у лидера: до избрания планировщик стоит на паузе
+    scheduler.start(paused=True)
+    leader.start()
+
+
+async def shutdown_scheduler():
+    """Остановка планировщика и освобождение роли лидера"""
+    await leader.stop()
+    if scheduler.running:
+        scheduler.shutdown(wait=False)
+
+
+async def _start_leader_duties():
+    """Экземпляр стал лидером: заполняет кучу дедлайнов и запускает служебные задачи"""
+    global _schedule_synced_at
+    _schedule_synced_at = datetime.utcnow()
+    
+    # Заполняем кучу дедлайнов: читаются только (id, end_time), без участников
+    expiry_scheduler.clear()
+    prepare_scheduler.clear()
+    overdue_before = datetime.utcnow() - timedelta(seconds=MISFIRE_GRACE_SECONDS)
+    for giveaway_id, end_time in await get_active_giveaway_schedule():
+        if end_time > overdue_before:
+            _schedule_deadline(giveaway_id, end_time)
+    expiry_scheduler.start()
+    prepare_scheduler.start()
+    
+    # Ежедневная авто-очистка завершенных старше 15 дней (только из базы)
+    scheduler.add_job(
+        cleanup_old_finished,
+        "interval",
+        days=1,
+        id="cleanup_finished",
+        name="Очистка завершенных розыгрышей старше 15 дней",
+        args=[15],
+        next_run_time=datetime.now(pytz.UTC) + CLEANUP_FIRST_RUN_DELAY,
+        replace_existing=True
+    )
     
-    # Удаляем существующую задачу, если есть
-    if scheduler.get_job(job_id):
-        scheduler.remove_job(job_id)
+    # Сверка дедлайнов с giveaways.status раз в час
+    scheduler.add_job(
+        reconcile_giveaway_jobs,
+        "interval",
+        hours=1,
+        id="reconcile_giveaway_jobs",
+        name="Сверка завершений с розыгрышами",
+        replace_existing=True
+    )
     
-    # Добавляем новую задачу
+    # Удаление брошенных состояний FSM (истекшие и так не читаются, задача только освобождает место)
     scheduler.add_job(
-        finish_giveaway_task,
-        DateTrigger(run_date=end_time),
-        args=[bot, giveaway_id],
-        id=job_id,
-        name=f"Завершение розыгрыша #{giveaway_id}"
+        cleanup_expired_fsm,
+        "interval",
+        hours=1,
+        id="cleanup_fsm",
+        name="Очистка истекших состояний FSM",
+        replace_existing=True
     )
+    scheduler.resume()
+    outbox_worker.start(_bot)
+    dm_worker.start(_bot)
+    broadcast_runner.start(_bot)
     
+    logging.info(f"Запланировано {len(expiry_scheduler)} активных розыгрышей")
+    
+    # Розыгрыши, закончившиеся за время простоя, завершаем в фоне, не задерживая polling
+    task = asyncio.create_task(catch_up_overdue_giveaways(_bot))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def _stop_leader_duties():
+    """Экземпляр потерял роль лидера: останавливает таймеры, уже начатые завершения защищены захватом"""
+    scheduler.pause()
+    await expiry_scheduler.stop()
+    await prepare_scheduler.stop()
+    await outbox_worker.stop()
+    await dm_worker.stop()
+    await broadcast_runner.stop()
+    expiry_scheduler.clear()
+    prepare_scheduler.clear()
+    for giveaway_id in list(_snapshots):
+        _drop_snapshot(giveaway_id)
+    logging.info("Планировщик остановлен: экземпляр больше не лидер")
+
+
+async def _sync_schedule_changes():
+    """
+    Подхватывает розыгрыши, созданные или измененные другими экземплярами, по giveaways.updated_at.
+    Вызывается лидером на каждом продлении аренды.
+    """
+    global _schedule_synced_at
+    synced_at = datetime.utcnow()
+    # Небольшое перекрытие окна: запись с updated_at чуть раньше синхронизации не потеряется
+    since = _schedule_synced_at - timedelta(seconds=config.LEADER_HEARTBEAT)
+    for giveaway_id, end_time, status in await get_giveaway_schedule_changes(since):
+        if status == "active":
+            if expiry_scheduler.get_deadline(giveaway_id) != _as_utc(end_time):
+                _schedule_deadline(giveaway_id, end_time)
+        else:
+            _cancel_deadline(giveaway_id)
+    _schedule_synced_at = synced_at
+
+
+# Роль лидера: планировщик, куча дедлайнов, догоняющий проход и очистка работают только у него
+leader = LeaderElector(
+    name="scheduler",
+    instance_id=config.INSTANCE_ID or default_instance_id(),
+    ttl=config.LEADER_LEASE_TTL,
+    heartbeat=config.LEADER_HEARTBEAT,
+    on_elected=_start_leader_duties,
+    on_demoted=_stop_leader_duties,
+    on_heartbeat=_sync_schedule_changes
+)
+_schedule_synced_at = datetime.utcnow()
+
+
+def schedule_giveaway_finish(bot, giveaway_id: int, end_time: datetime):
+    """Планирование (или перенос) завершения розыгрыша"""
+    if not leader.is_leader:
+        # Дедлайн подхватит лидер при следующем продлении аренды
+        logging.info(f"Завершение розыгрыша #{giveaway_id} запланирует экземпляр-лидер")
+        return
+    _schedule_deadline(giveaway_id, end_time)
     logging.info(f"Запланировано завершение розыгрыша #{giveaway_id} на {format_datetime(end_time)}")
 
 
 def cancel_giveaway_schedule(giveaway_id: int):
     """Отмена планирования завершения розыгрыша"""
-    job_id = f"finish_giveaway_{giveaway_id}"
-    if scheduler.get_job(job_id):
-        scheduler.remove_job(job_id)
+    if _cancel_deadline(giveaway_id):
         logging.info(f"Отменено автоматическое завершение розыгрыша #{giveaway_id}")
 
 
-async def finish_giveaway_task(bot, giveaway_id: int):
-    """Задача завершения розыгрыша"""
+async def reconcile_giveaway_jobs():
+    """Сверяет дедлайны в куче с giveaways.status: убирает лишние и добавляет недостающие"""
     try:
-        from database.database import get_giveaway
+        active = dict(await get_active_giveaway_schedule())
+        scheduled = set(expiry_scheduler.scheduled_ids())
         
-        # Получаем данные розыгрыша
-        giveaway = await get_giveaway(giveaway_id)
-        if not giveaway or giveaway.status != "active":
-            return
+        removed = 0
+        for giveaway_id in scheduled - active.keys():
+            _cancel_deadline(giveaway_id)
+            removed += 1
         
-        # Получаем участников
-        participants = await get_participants(giveaway_id)
+        added = 0
+        overdue_before = datetime.utcnow() - timedelta(seconds=MISFIRE_GRACE_SECONDS)
+        for giveaway_id, end_time in active.items():
+            if end_time <= overdue_before:
+                continue  # Такие завершает догоняющий проход ниже
+            if expiry_scheduler.get_deadline(giveaway_id) != _as_utc(end_time):
+                _schedule_deadline(giveaway_id, end_time)
+                added += 1
         
-        if not participants:
-            # Нет участников
-            await finish_giveaway(giveaway_id)
+        if removed or added:
+            logging.warning(f"Сверка завершений: удалено {removed}, добавлено/исправлено {added}")
+        
+        await catch_up_overdue_giveaways(_bot)
+    except Exception as e:
+        logging.error(f"Ошибка сверки завершений: {e}")
+
+
+async def catch_up_overdue_giveaways(bot):
+    """Завершает просроченные активные розыгрыши пулом из CATCHUP_CONCURRENCY воркеров (в общем лимите FINISH_CONCURRENCY)"""
+    if _catch_up_lock.locked():
+        return
+    async with _catch_up_lock:
+        try:
+            overdue_before = datetime.utcnow() - timedelta(seconds=MISFIRE_GRACE_SECONDS)
+            # Вместе с просроченными подбираем розыгрыши, чей захват завершения завис (упал процесс)
+            overdue_ids = await get_overdue_giveaway_ids(overdue_before, _stale_claim_before())
+            if not overdue_ids:
+                return
             
-            no_participants_message = "🎊 <b>РОЗЫГРЫШ ЗАВЕРШЕН!</b>\n\n😔 К сожалению, в розыгрыше не было участников."
+            logging.warning(f"Найдено {len(overdue_ids)} просроченных розыгрышей, завершаю")
+            queue = asyncio.Queue()
+            for giveaway_id in overdue_ids:
+                # Таймер больше не нужен - розыгрыш завершит воркер
+                _cancel_deadline(giveaway_id)
+                queue.put_nowait(giveaway_id)
             
-            try:
-                await bot.send_message(
-                    chat_id=giveaway.channel_id,
-                    text=no_participants_message,
-                    parse_mode="HTML",
-                    reply_to_message_id=giveaway.message_id if giveaway.message_id else None
-                )
-            except Exception as e:
-                logging.error(f"Ошибка отправки сообщения о завершении розыгрыша без участников: {e}")
+            async def worker():
+                while not queue.empty():
+                    giveaway_id = queue.get_nowait()
+                    async with _finish_semaphore:
+                        await finish_giveaway_task(bot, giveaway_id)
             
-            return
+            workers_count = max(1, min(config.CATCHUP_CONCURRENCY, len(overdue_ids)))
+            await asyncio.gather(*(worker() for _ in range(workers_count)))
+            logging.info(f"Догоняющее завершение окончено: {len(overdue_ids)} розыгрышей")
+        except Exception as e:
+            logging.error(f"Ошибка догоняющего завершения розыгрышей: {e}")
+
+
+def _stale_claim_before() -> datetime:
+    """Захваты завершения старше этого момента считаются зависшими"""
+    return datetime.utcnow() - timedelta(seconds=config.FINISH_CLAIM_TIMEOUT)
+
+
+def _winner_exclusion(bot, giveaway) -> Optional[ExcludeCallback]:
+    """Правила, по которым кандидат не может победить. Проверяются по порядку: сначала дешевые (БД), потом Bot API"""
+    checks = []
+    if config.WINNER_COOLDOWN_DAYS > 0:
+        since = datetime.utcnow() - timedelta(days=config.WINNER_COOLDOWN_DAYS)
         
-        # Проверяем, достаточно ли участников
-        winner_places = giveaway.winner_places
-        if len(participants) < winner_places:
-            winner_places = len(participants)
+        async def recent_winners(user_ids: List[int]):
+            return await get_recent_winner_user_ids(user_ids, since)
+        checks.append(recent_winners)
+    
+    if giveaway.require_subscription:
+        async def non_members(user_ids: List[int]):
+            return await membership_cache.find_non_members(bot, giveaway.channel_id, user_ids)
+        checks.append(non_members)
+    
+    if not checks:
+        return None
+    
+    async def exclude(candidates) -> set:
+        excluded = set()
+        for check in checks:
+            remaining = [candidate.user_id for candidate in candidates if candidate.user_id not in excluded]
+            if not remaining:
+                break
+            excluded |= await check(remaining)
+        return excluded
+    
+    return exclude
+
+
+async def finish_giveaway_task(bot, giveaway_id: int):
+    """Задача завершения розыгрыша"""
+    claim_token = None
+    snapshot_task = _snapshots.pop(giveaway_id, None)
+    try:
+        from database.database import get_giveaway
         
-        # Выбираем случайных победителей
-        winners = random.sample(participants, winner_places)
+        # Захватываем завершение (active -> finishing): при гонке таймера, догоняющего прохода
+        # или второго экземпляра бота победителей выбирает только один обработчик.
+        # После захвата новые участники не добавляются
+        claim_token = await claim_giveaway_finish(giveaway_id, stale_before=_stale_claim_before())
+        if not claim_token:
+            if snapshot_task:
+                snapshot_task.cancel()
+            return
         
-        # Подготавливаем данные победителей
-        winners_data = []
-        winners_list = []
+        snapshot = await _await_snapshot(snapshot_task)
         
-        for i, winner in enumerate(winners, 1):
-            winner_name = winner.first_name or "Пользователь"
-            if winner.username:
-                winner_name = f"@{winner.username}"
-            
-            # Если один победитель — пишем просто Победитель
-            if winner_places == 1:
-                winners_list.append(f"🏆 <b>Победитель:</b> {winner_name}")
-            else:
-                place_emoji = {1: "🥇", 2: "🥈", 3: "🥉"}.get(i, f"{i}️⃣")
-                winners_list.append(f"{place_emoji} <b>{i} место:</b> {winner_name}")
-            
-            winners_data.append({
-                "user_id": winner.user_id,
-                "username": winner.username,
-                "first_name": winner.first_name,
-                "place": i
-            })
+        # Получаем данные розыгрыша (участники не загружаются)
+        giveaway = await get_giveaway(giveaway_id, with_participants=False)
+        if not giveaway:
+            return
         
-        # Обновляем базу данных
-        await finish_giveaway(giveaway_id=giveaway_id, winners_data=winners_data)
+        # Недавние победители и отписавшиеся исключаются, вместо них выбираются другие
+        exclude = _winner_exclusion(bot, giveaway)
         
-        # Формируем сообщение о победителях
-        winner_message = (
-            "🎊 <b>РОЗЫГРЫШ ЗАВЕРШЕН!</b>\n\n" + "\n".join(winners_list) + "\n\n🎉 Поздравляем!"
+        # Выбираем случайных победителей прямо из БД (с учетом бонусных билетов)
+        winners, draw_seed = await draw_winners(
+            giveaway_id, giveaway.winner_places, snapshot=snapshot, exclude=exclude
         )
         
-        # Отправляем сообщение-ответ в канал на исходный пост
-        try:
-            await bot.send_message(
-                chat_id=giveaway.channel_id,
-                text=winner_message,
-                parse_mode="HTML",
-                reply_to_message_id=giveaway.message_id if giveaway.message_id else None
-            )
+        if not winners:
+            # Нет участников
+            announcement_text = "🎊 <b>РОЗЫГРЫШ ЗАВЕРШЕН!</b>\n\n😔 К сожалению, в розыгрыше не было участников."
+            winners_data = []
+        else:
+            # Если участников меньше, чем мест, победителей столько же, сколько участников
+            winner_places = len(winners)
             
-            # Не удаляем исходное сообщение розыгрыша
-            logging.info(f"Розыгрыш #{giveaway_id} завершен. Итоги опубликованы ответом на исходный пост.")
+            # Подготавливаем данные победителей
+            winners_data = []
+            winners_list = []
             
-        except Exception as e:
-            logging.error(f"Ошибка отправки сообщения о победителе: {e}")
+            for i, winner in enumerate(winners, 1):
+                winner_name = winner.first_name or "Пользователь"
+                if winner.username:
+                    winner_name = f"@{winner.username}"
+                
+                # Если один победитель — пишем просто Победитель
+                if winner_places == 1:
+                    winners_list.append(f"🏆 <b>Победитель:</b> {winner_name}")
+                else:
+                    place_emoji = {1: "🥇", 2: "🥈", 3: "🥉"}.get(i, f"{i}️⃣")
+                    winners_list.append(f"{place_emoji} <b>{i} место:</b> {winner_name}")
+                
+                winners_data.append({
+                    "user_id": winner.user_id,
+                    "username": winner.username,
+                    "first_name": winner.first_name,
+                    "place": i
+                })
             
+            # Формируем сообщение о победителях
+            announcement_text = (
+                "🎊 <b>РОЗЫГРЫШ ЗАВЕРШЕН!</b>\n\n" + "\n".join(winners_list) + "\n\n🎉 Поздравляем!"
+            )
+        
+        # Сообщение-ответ на исходный пост; если пост удален - публикуется без ответа
+        outbox_messages = [{
+            "kind": "send_message",
+            "chat_id": giveaway.channel_id,
+            "payload": {
+                "text": announcement_text,
+                "parse_mode": "HTML",
+                "reply_to_message_id": giveaway.message_id if giveaway.message_id else None,
+                "allow_sending_without_reply": True
+            }
+        }]
+        
+        # Личные уведомления победителям рассылает отдельный воркер уже после завершения
+        if config.WINNER_DM_ENABLED:
+            channel = f" в канале {giveaway.channel.channel_name}" if giveaway.channel else ""
+            for winner_data in winners_data:
+                winner_data["dm_status"] = WinnerDMStatus.PENDING.value
+                outbox_messages.append({
+                    "kind": "winner_dm",
+                    "chat_id": winner_data["user_id"],
+                    "payload": {
+                        "text": WINNER_DM_TEMPLATE.format(
+                            place=winner_data["place"],
+                            title=giveaway.title,
+                            channel=channel
+                        ),
+                        "parse_mode": "HTML"
+                    }
+                })
+        
+        # Итоги и задачи на их отправку сохраняются одной транзакцией
+        finished = await finish_giveaway(
+            giveaway_id=giveaway_id, winners_data=winners_data, draw_seed=draw_seed,
+            claim_token=claim_token, outbox_messages=outbox_messages
+        )
+        if not finished:
+            logging.warning(f"Захват завершения розыгрыша #{giveaway_id} перехвачен, итоги не публикуются")
+            return
+        
+        outbox_worker.wakeup()
+        dm_worker.wakeup()
+        giveaway_joins.remove(str(giveaway_id))  # Счетчик участий нужен только для активных розыгрышей
+        # Не удаляем исходное сообщение розыгрыша
+        logging.info(f"Розыгрыш #{giveaway_id} завершен. Итоги поставлены в очередь публикации.")
+    
     except Exception as e:
         logging.error(f"Ошибка при завершении розыгрыша #{giveaway_id}: {e}")
+        # Возвращаем розыгрыш в active, чтобы его завершил следующий проход сверки
+        if claim_token:
+            try:
+                await release_giveaway_claim(giveaway_id, claim_token)
+            except Exception as release_error:
+                logging.error(f"Не удалось снять захват завершения розыгрыша #{giveaway_id}: {release_error}")
 
 
 async def cleanup_old_finished(days: int):
     try:
-        deleted = await delete_finished_older_than(days)
+        # Победители нужны для WINNER_COOLDOWN_DAYS, пока не истек срок (+1 день на опоздавшие завершения)
+        giveaway_days = days
+        if config.WINNER_COOLDOWN_DAYS > 0:
+            giveaway_days = max(days, config.WINNER_COOLDOWN_DAYS + 1)
+        deleted = await delete_finished_older_than(giveaway_days)
         if deleted:
-            logging.info(f"Очищено завершенных розыгрышей: {deleted} (старше {days} дней)")
+            logging.info(f"Очищено завершенных розыгрышей: {deleted} (старше {giveaway_days} дней)")
+        deleted_outbox = await delete_sent_outbox_older_than(days)
+        if deleted_outbox:
+            logging.info(f"Очищено доставленных операций outbox: {deleted_outbox}")
     except Exception as e:
         logging.error(f"Ошибка очистки завершенных розыгрышей: {e}")
 
 
+async def cleanup_expired_fsm():
+    try:
+        deleted = await delete_expired_fsm_records()
+        if deleted:
+            logging.info(f"Очищено истекших состояний FSM: {deleted}")
+    except Exception as e:
+        logging.error(f"Ошибка очистки состояний FSM: {e}")
+
+
 def get_scheduler_status() -> dict:
     """Получение статуса планировщика"""
     jobs = scheduler.get_jobs()
@@ -180,5 +515,14 @@ def get_scheduler_status() -> dict:
                 "next_run_time": job.next_run_time
             }
             for job in jobs
-        ]
+        ],
+        "instance_id": leader.instance_id,
+        "is_leader": leader.is_leader,
+        "expiry_running": expiry_scheduler.running,
+        "expiry_pending": len(expiry_scheduler),
+        "expiry_next": expiry_scheduler.next_deadline(),
+        "prepared_snapshots": len(_snapshots),
+        "outbox_running": outbox_worker.running,
+        "dm_running": dm_worker.running,
+        "broadcast_running": broadcast_runner.running
     }
@@ -0,0 +1,139 @@
+"""
+Сводка для экрана статистики (/stats): планировщик, кэши, очереди отправки и недавние задержки.
+Почти все значения - счетчики в памяти, которые обновляются по ходу работы. Из БД читаются только
+два небольших агрегата по индексам статуса: розыгрыши и неотправленные операции outbox.
+"""
+import html
+import os
+from typing import List, Optional
+
+from aiogram.fsm.storage.base import BaseStorage
+
+from database.database import count_giveaways_by_status, count_pending_outbox, engine
+from database.models import GiveawayStatus
+from texts.messages import STATS_TEMPLATE, STATS_LATENCY_ITEM, STATS_JOB_ITEM
+from utils.broadcast import broadcast_runner
+from utils.datetime_utils import format_datetime
+from utils.fsm_storage import DatabaseStorage
+from utils.membership import membership_cache
+from utils.metrics import (
+    Histogram, handler_seconds, db_seconds, bot_api_seconds, scheduler_lag_seconds, joins_last_minute
+)
+from utils.outbox import outbox_worker, dm_worker, dm_limiter, DM_KINDS
+from utils.scheduler import get_scheduler_status
+
+# Сколько самых медленных действий и функций БД показывать
+_TOP_SLOWEST = 3
+_MAX_JOBS = 10
+
+
+def _format_size(size: Optional[int]) -> str:
+    if size is None:
+        return "—"
+    for unit in ("Б", "КБ", "МБ"):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} ГБ"
+
+
+def _format_seconds(value: Optional[float]) -> str:
+    if value is None:
+        return "—"
+    if value == float("inf"):
+        return "> 10 с"
+    return f"≤ {value * 1000:.0f} мс" if value < 1 else f"≤ {value:.1f} с"
+
+
+def _format_ratio(hits: int, misses: int) -> str:
+    total = hits + misses
+    if not total:
+        return "—"
+    return f"{hits * 100 / total:.1f}% ({hits}/{total})"
+
+
+def _database_sizes():
+    """Размер файла SQLite и его WAL; для других СУБД - (None, None)"""
+    if engine.url.get_backend_name() != "sqlite" or not engine.url.database:
+        return None, None
+    path = engine.url.database
+    sizes = []
+    for file_path in (path, path + "-wal"):
+        sizes.append(os.path.getsize(file_path) if os.path.exists(file_path) else None)
+    return sizes[0], sizes[1]
+
+
+def _latency_lines() -> List[str]:
+    lines = []
+
+    def add(name: str, histogram: Histogram, *labels: str):
+        count, p99 = histogram.recent(*labels)
+        if count:
+            lines.append(STATS_LATENCY_ITEM.format(name=html.escape(name), p99=_format_seconds(p99), count=count))
+
+    def slowest(histogram: Histogram):
+        ranked = []
+        for labels in list(histogram.series()):
+            count, p99 = histogram.recent(*labels)
+            if count:
+                ranked.append((p99, labels))
+        ranked.sort(key=lambda item: item[0], reverse=True)
+        return [labels for _, labels in ranked[:_TOP_SLOWEST]]
+
+    add("Хендлеры", handler_seconds)
+    for router, event, action in slowest(handler_seconds):
+        add(f"└ {router}:{action or event}", handler_seconds, router, event, action)
+    add("БД", db_seconds)
+    for (function,) in slowest(db_seconds):
+        add(f"└ {function}", db_seconds, function)
+    add("Bot API", bot_api_seconds)
+    add("Отставание таймера завершения", scheduler_lag_seconds)
+    return lines or ["—"]
+
+
+def _job_lines(jobs: List[dict]) -> List[str]:
+    jobs = sorted(jobs, key=lambda job: (job["next_run_time"] is None, str(job["next_run_time"])))
+    lines = [
+        STATS_JOB_ITEM.format(
+            name=html.escape(job["name"] or job["id"]),
+            next_run=format_datetime(job["next_run_time"]) if job["next_run_time"] else "на паузе"
+        )
+        for job in jobs[:_MAX_JOBS]
+    ]
+    return lines or ["—"]
+
+
+async def build_stats_text(fsm_storage: Optional[BaseStorage] = None) -> str:
+    status = get_scheduler_status()
+    giveaways = await count_giveaways_by_status()
+    pending = await count_pending_outbox()
+    db_size, wal_size = _database_sizes()
+
+    if isinstance(fsm_storage, DatabaseStorage):
+        fsm_ratio = _format_ratio(fsm_storage.hits, fsm_storage.misses)
+    else:
+        fsm_ratio = "—"
+
+    return STATS_TEMPLATE.format(
+        instance=status["instance_id"],
+        role="лидер" if status["is_leader"] else "резерв",
+        active=giveaways.get(GiveawayStatus.ACTIVE.value, 0),
+        finishing=giveaways.get(GiveawayStatus.FINISHING.value, 0),
+        finished=giveaways.get(GiveawayStatus.FINISHED.value, 0),
+        joins_per_minute=joins_last_minute.total(),
+        expiry_pending=status["expiry_pending"],
+        expiry_next=format_datetime(status["expiry_next"]) if status["expiry_next"] else "—",
+        db_size=_format_size(db_size),
+        wal_size=_format_size(wal_size),
+        membership_ratio=_format_ratio(membership_cache.hits, membership_cache.misses),
+        membership_size=len(membership_cache),
+        fsm_ratio=fsm_ratio,
+        outbox_pending=sum(count for kind, count in pending.items() if kind not in DM_KINDS),
+        outbox_in_flight=outbox_worker.in_flight,
+        dm_pending=sum(count for kind, count in pending.items() if kind in DM_KINDS),
+        dm_in_flight=dm_worker.in_flight,
+        dm_waiting=dm_limiter.waiting,
+        broadcast=f"#{broadcast_runner.current_id}" if broadcast_runner.current_id else "нет",
+        latencies="\n".join(_latency_lines()),
+        jobs="\n".join(_job_lines(status["jobs"]))
+    )
@@ -0,0 +1,262 @@
+"""
+Легкая трассировка апдейтов: спаны middleware, хендлеров, запросов к БД и Bot API.
+
+Контекстная переменная хранит текущий спан; корневой спан открывается на апдейт, и с
+вероятностью TRACE_SAMPLE_RATE трасса записывается. Если трасса не выбрана или трассировка
+выключена, span() сводится к одному чтению контекстной переменной.
+
+Трассы пишутся фоновым потоком в JSONL-файл с ротацией, по строке на трассу в формате OTLP/JSON
+(как у file exporter OpenTelemetry Collector), так что файл читается otlpjsonfile receiver'ом.
+"""
+import functools
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from config import config
+
+SERVICE_NAME = "giveaway-bot"
+
+# Виды спанов OTLP
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+
+_STATUS_ERROR = 2
+
+
+class Span:
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, trace: "_Trace", name: str, parent_id: str, kind: int, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.end_ns = 0
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        if self.error:
+            span["status"] = {"code": _STATUS_ERROR, "message": self.error}
+        return span
+
+
+class _Trace:
+    __slots__ = ("trace_id", "spans")
+
+    def __init__(self):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.spans: List[Span] = []
+
+
+def _otlp_attribute(key: str, value: Any) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+# Текущий спан выбранной трассы; None - трасса не пишется
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class _SpanContext:
+    """with span(...): открывает дочерний спан текущей трассы"""
+
+    __slots__ = ("name", "kind", "attributes", "_span", "_token")
+
+    def __init__(self, name: str, kind: int, attributes: Dict[str, Any]):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self._span = None
+        self._token = None
+
+    def __enter__(self) -> Optional[Span]:
+        parent = current_span.get()
+        if parent is None:
+            return None
+        self._span = Span(parent.trace, self.name, parent.span_id, self.kind, self.attributes)
+        self._token = current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is None:
+            return False
+        current_span.reset(self._token)
+        _finish(self._span, exc)
+        return False
+
+
+class _NoopSpanContext:
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP = _NoopSpanContext()
+
+
+def span(name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any):
+    """Дочерний спан текущей трассы; вне выбранной трассы - общий пустой контекст"""
+    if current_span.get() is None:
+        return _NOOP
+    return _SpanContext(name, kind, attributes)
+
+
+def traced(name: str, kind: int = SPAN_KIND_INTERNAL):
+    """Декоратор async-функции: вызов записывается спаном, если идет выбранная трасса"""
+
+    def decorator(func: Callable[..., Awaitable[Any]]):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            if current_span.get() is None:
+                return await func(*args, **kwargs)
+            with _SpanContext(name, kind, {}):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _finish(span_obj: Span, exc: Optional[BaseException]):
+    span_obj.end_ns = time.time_ns()
+    if exc is not None:
+        span_obj.error = f"{type(exc).__name__}: {exc}"[:200]
+    span_obj.trace.spans.append(span_obj)
+
+
+class TraceExporter:
+    """Фоновый поток, дописывающий трассы в JSONL-файл с ротацией по размеру"""
+
+    def __init__(self, path: str, max_bytes: int, backup_count: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.dropped = 0
+        self._queue: "queue.Queue[Optional[str]]" = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def export(self, trace: _Trace):
+        line = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": SERVICE_NAME},
+                    "spans": [span_obj.to_otlp() for span_obj in trace.spans],
+                }],
+            }]
+        }, ensure_ascii=False)
+        try:
+            self._queue.put_nowait(line)
+        except queue.Full:
+            self.dropped += 1  # Диск не успевает - лучше потерять трассу, чем задержать апдейт
+
+    def _run(self):
+        handler = logging.handlers.RotatingFileHandler(
+            self.path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8"
+        )
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        try:
+            while True:
+                line = self._queue.get()
+                if line is None:
+                    return
+                handler.emit(logging.makeLogRecord({"msg": line}))
+        finally:
+            handler.close()
+
+
+exporter = TraceExporter(config.TRACE_FILE, config.TRACE_FILE_MAX_BYTES, config.TRACE_FILE_BACKUPS)
+
+
+class TracingMiddleware(BaseMiddleware):
+    """Outer-middleware апдейтов: решает, пишется ли трасса, и открывает корневой спан"""
+
+    def __init__(self, sample_rate: float):
+        self.sample_rate = sample_rate
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any]
+    ) -> Any:
+        if self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return await handler(event, data)
+
+        from utils.metrics import event_action
+
+        trace = _Trace()
+        attributes: Dict[str, Any] = {}
+        if isinstance(event, Update):
+            event_type, action = event_action(event.event, {})
+            attributes = {"update.id": event.update_id, "update.type": event_type, "update.action": action}
+        root = Span(trace, "update", "", SPAN_KIND_SERVER, attributes)
+        token = current_span.set(root)
+        error = None
+        try:
+            return await handler(event, data)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            current_span.reset(token)
+            _finish(root, error)
+            exporter.export(trace)
+
+
+def setup_tracing(dp) -> bool:
+    """Подключает трассировку к диспетчеру, если TRACE_SAMPLE_RATE > 0"""
+    if config.TRACE_SAMPLE_RATE <= 0:
+        return False
+    exporter.start()
+    dp.update.outer_middleware(TracingMiddleware(config.TRACE_SAMPLE_RATE))
+    logging.info(f"Трассировка: доля {config.TRACE_SAMPLE_RATE}, файл {config.TRACE_FILE}")
+    return True